@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Benchmark build-time contouring against a straight Python port of the page's JS.
+
+Both paths must produce the same undirected unit segments per threshold; this
+is asserted for every layer before anything is timed, against the port's
+segments before stitching (its 4-decimal stitching key can snap two crossings
+near a grid corner onto one point). Chain counts differ:
+the port only walks forward from each unused segment, so a line entered
+mid-way is split in two, while the vectorized stitcher walks both directions
+(on the Florida data, 433 polylines / 8,367 points vs 330 / 8,264 for the
+first three scenarios). Each extra chain repeats one point, so the point
+counts differ by as much as the chain counts when --tolerance is 0.
+"""
+
+import argparse
+import os
+import time
+
+from columnar_format import decode_scenario, load_hazard_data
+from extract_all_ssp import florida_land_mask, is_florida_land
+from hazard_layers import CONTOUR_GRID, CONTOUR_THRESHOLDS, contour_lines, idw_grid
+
+
+# Straight port of contourInterpolate / buildSegments / stitchSegments from the page
+def contour_interpolate(t, v_a, v_b, x_a, y_a, x_b, y_b):
+    d = v_b - v_a
+    if abs(d) < 1e-12:
+        return [(x_a + x_b) / 2, (y_a + y_b) / 2]
+    s = (t - v_a) / d
+    return [x_a + s * (x_b - x_a), y_a + s * (y_b - y_a)]
+
+
+def build_segments(field, valid, nx, ny, t, lon_min, lat_min, dx, dy):
+    segs = []
+    for iy in range(ny - 1):
+        for ix in range(nx - 1):
+            if not (valid[iy * nx + ix] and valid[iy * nx + ix + 1] and
+                    valid[(iy + 1) * nx + ix] and valid[(iy + 1) * nx + ix + 1]):
+                continue
+            tl, tr = field[iy * nx + ix], field[iy * nx + ix + 1]
+            br, bl = field[(iy + 1) * nx + ix + 1], field[(iy + 1) * nx + ix]
+            idx = (tl >= t) * 1 | (tr >= t) * 2 | (br >= t) * 4 | (bl >= t) * 8
+            if idx == 0 or idx == 15:
+                continue
+            top = contour_interpolate(t, tl, tr, ix, iy, ix + 1, iy)
+            right = contour_interpolate(t, tr, br, ix + 1, iy, ix + 1, iy + 1)
+            bottom = contour_interpolate(t, bl, br, ix, iy + 1, ix + 1, iy + 1)
+            left = contour_interpolate(t, tl, bl, ix, iy, ix, iy + 1)
+            center = (tl + tr + br + bl) / 4
+            if idx in (1, 14):
+                segs.append([left, top])
+            elif idx in (2, 13):
+                segs.append([top, right])
+            elif idx in (3, 12):
+                segs.append([left, right])
+            elif idx in (4, 11):
+                segs.append([right, bottom])
+            elif idx in (6, 9):
+                segs.append([top, bottom])
+            elif idx in (7, 8):
+                segs.append([bottom, left])
+            elif idx == 5:
+                if center >= t:
+                    segs += [[top, right], [bottom, left]]
+                else:
+                    segs += [[left, top], [right, bottom]]
+            elif idx == 10:
+                if center >= t:
+                    segs += [[left, top], [right, bottom]]
+                else:
+                    segs += [[top, right], [bottom, left]]
+
+    result = []
+    for seg in segs:
+        lat1 = lat_min + seg[0][1] * dy
+        lon1 = lon_min + seg[0][0] * dx
+        lat2 = lat_min + seg[1][1] * dy
+        lon2 = lon_min + seg[1][0] * dx
+        if is_florida_land((lon1 + lon2) / 2, (lat1 + lat2) / 2):
+            result.append([[lat1, lon1], [lat2, lon2]])
+    return result
+
+
+def stitch_segments(segs):
+    def key(p):
+        return f"{p[0]:.4f},{p[1]:.4f}"
+
+    buckets = {}
+    for i, s in enumerate(segs):
+        buckets.setdefault(key(s[0]), []).append(i)
+        buckets.setdefault(key(s[1]), []).append(i)
+
+    used = [False] * len(segs)
+    polylines = []
+    for start in range(len(segs)):
+        if used[start]:
+            continue
+        used[start] = True
+        chain = [segs[start][0], segs[start][1]]
+        cur = segs[start][1]
+        while True:
+            k = key(cur)
+            next_idx, flip = -1, False
+            for j in buckets.get(k, []):
+                if used[j]:
+                    continue
+                if key(segs[j][0]) == k:
+                    next_idx, flip = j, False
+                    break
+                if key(segs[j][1]) == k:
+                    next_idx, flip = j, True
+                    break
+            if next_idx < 0:
+                break
+            used[next_idx] = True
+            cur = segs[next_idx][0] if flip else segs[next_idx][1]
+            chain.append(cur)
+            if key(cur) == key(chain[0]):
+                break
+        polylines.append(chain)
+    return polylines
+
+
+def unit_segments(polylines):
+    """Undirected segments between consecutive points, rounded off float noise."""
+    segments = set()
+    for line in polylines:
+        points = [(round(float(lat), 9), round(float(lon), 9)) for lat, lon in line]
+        segments.update(frozenset(pair) for pair in zip(points, points[1:]))
+    return segments
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--input', default=None,
+                        help='Extracted data: florida_all_ssp.col.json (columnar), florida_all_ssp.cube.json (hazard cube) '
+                             'or legacy florida_all_ssp.json')
+    parser.add_argument('--scenarios', type=int, default=3, help='Number of scenarios to time (default: 3)')
+    parser.add_argument('--tolerance', type=float, default=0.0, help='Simplification tolerance for the new stage')
+    args = parser.parse_args()
+    input_file = args.input or ('florida_all_ssp.col.json' if os.path.exists('florida_all_ssp.col.json')
+                                else 'florida_all_ssp.json')
+    doc = load_hazard_data(input_file)
+
+    # Pseudo-SSPs (<ssp>_delta) hold only the raw periods, so walk what each model has
+    scenarios = [(ssp, model, period) for ssp in doc['ssps'] for model in doc['data'][ssp]
+                 for period, entry in doc['data'][ssp][model].items() if entry['n']]
+    t_port = t_new = 0.0
+    lines_port = lines_new = points_port = points_new = 0
+    for ssp, model, period in scenarios[:args.scenarios]:
+        lats, lons, values = decode_scenario(doc, ssp, model, period)
+        g, raw, valid = idw_grid(lats, lons, values, CONTOUR_GRID, CONTOUR_GRID)
+        for k, rp in enumerate(doc['rp_keys']):
+            field, flags = raw[k].ravel().tolist(), valid.ravel().tolist()
+            for t in CONTOUR_THRESHOLDS:
+                segs = build_segments(field, flags, g['nx'], g['ny'], t,
+                                      g['lon_min'], g['lat_min'], g['dx'], g['dy'])
+                lines, _ = contour_lines(raw[k], valid, g, t, florida_land_mask)
+                assert unit_segments(segs) == unit_segments(lines), \
+                    f"{ssp}/{model}/{period} {rp} >= {t}: segments differ"
+
+            start = time.perf_counter()
+            for t in CONTOUR_THRESHOLDS:
+                polylines = stitch_segments(build_segments(field, flags, g['nx'], g['ny'], t,
+                                                           g['lon_min'], g['lat_min'], g['dx'], g['dy']))
+                lines_port += len(polylines)
+                points_port += sum(len(p) for p in polylines)
+            t_port += time.perf_counter() - start
+
+            start = time.perf_counter()
+            for t in CONTOUR_THRESHOLDS:
+                lines, _ = contour_lines(raw[k], valid, g, t, florida_land_mask, args.tolerance)
+                lines_new += len(lines)
+                points_new += sum(len(line) for line in lines)
+            t_new += time.perf_counter() - start
+        print(f"  {ssp}/{model}/{period} done")
+
+    layers = min(args.scenarios, len(scenarios)) * len(doc['rp_keys'])
+    print(f"\nContoured {layers} layers x {len(CONTOUR_THRESHOLDS)} thresholds, same segments on both paths")
+    print(f"JS port:    {t_port:.2f} s ({1000 * t_port / max(layers, 1):.1f} ms/layer), "
+          f"{lines_port:,} polylines, {points_port:,} points")
+    print(f"Vectorized: {t_new:.2f} s ({1000 * t_new / max(layers, 1):.1f} ms/layer), "
+          f"{lines_new:,} polylines, {points_new:,} points")
+    if t_new > 0:
+        print(f"Speedup: {t_port / t_new:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Benchmark hazard_query.lookup and check it against a straight port of the page's loops."""
+
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+
+from columnar_format import RP_KEYS
+from hazard_layers import IDW_EXACT_DIST, IDW_MAX_DIST, IDW_POWER
+from hazard_query import NEAREST_MAX_DIST2, lookup, open_hazard, scenario_table
+
+
+# Straight ports of the page's per-location loops over all points in order
+def page_idw(lat, lon, points, rp):
+    weight_sum = value_sum = 0.0
+    near_count = 0
+    for p_lat, p_lon, value in points:
+        d_lat, d_lon = lat - p_lat, lon - p_lon
+        dist = math.sqrt(d_lat * d_lat + d_lon * d_lon)
+        if dist < IDW_MAX_DIST:
+            near_count += 1
+            if dist < IDW_EXACT_DIST:
+                weight_sum, value_sum = 1, value[rp]
+                break
+            weight = 1 / dist ** IDW_POWER
+            weight_sum += weight
+            value_sum += weight * value[rp]
+    return value_sum / weight_sum if near_count >= 2 and weight_sum > 0 else math.nan
+
+
+def page_nearest(lat, lon, points, rp):
+    nearest, min_dist = None, math.inf
+    for p_lat, p_lon, value in points:
+        d_lat, d_lon = lat - p_lat, lon - p_lon
+        dist = d_lat * d_lat + d_lon * d_lon
+        if dist < min_dist:
+            min_dist, nearest = dist, value
+    return nearest[rp] if min_dist < NEAREST_MAX_DIST2 else math.nan
+
+
+def query_points(hazard, n, rng):
+    """Random locations over the data bounds; a tenth sit exactly on data points."""
+    lats = rng.uniform(hazard['lats'].min() - 0.1, hazard['lats'].max() + 0.1, n)
+    lons = rng.uniform(hazard['lons'].min() - 0.1, hazard['lons'].max() + 0.1, n)
+    on_grid = rng.random(n) < 0.1
+    ids = rng.integers(0, len(hazard['lats']), on_grid.sum())
+    lats[on_grid], lons[on_grid] = hazard['lats'][ids], hazard['lons'][ids]
+    return lats, lons
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--input', default=None,
+                        help='Extracted data: florida_all_ssp.col.json (columnar), florida_all_ssp.cube.json (hazard cube) '
+                             'or legacy florida_all_ssp.json')
+    parser.add_argument('--scenario', nargs=3, default=['ssp585', 'CESM2', 'base'], metavar=('SSP', 'MODEL', 'PERIOD'))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000],
+                        help='Query batch sizes to time (default: 1k, 100k, 1M)')
+    parser.add_argument('--check', type=int, default=500, help='Locations checked against the page port (default: 500)')
+    args = parser.parse_args()
+    input_file = args.input or ('florida_all_ssp.col.json' if os.path.exists('florida_all_ssp.col.json')
+                                else 'florida_all_ssp.json')
+    rng = np.random.default_rng(0)
+
+    start = time.perf_counter()
+    hazard = open_hazard(input_file)
+    scenario_table(hazard, *args.scenario)
+    print(f"Loaded and indexed {len(hazard['lats']):,} coordinates in {time.perf_counter() - start:.2f} s")
+
+    # Every return period at a sample of locations, against the page's loops
+    table = scenario_table(hazard, *args.scenario)
+    points = [(lat, lon, row) for lat, lon, row in zip(hazard['lats'].tolist(), hazard['lons'].tolist(),
+                                                        table.tolist()) if not math.isnan(row[0])]
+    lats, lons = query_points(hazard, args.check, rng)
+    for method, port in (('idw', page_idw), ('nearest', page_nearest)):
+        got = lookup(lats, lons, *args.scenario, method=method, hazard=hazard)
+        want = np.array([[port(lat, lon, points, k) for k in range(len(RP_KEYS))]
+                         for lat, lon in zip(lats.tolist(), lons.tolist())])
+        # Vectorized sums round differently from the loop's running sums in the last bits
+        same = np.allclose(got, want, rtol=1e-12, atol=0, equal_nan=True)
+        both = np.isfinite(got) & np.isfinite(want)
+        worst = np.abs(got - want)[both].max() if both.any() else 0.0
+        print(f"{method:<8} matches page port at {args.check} locations: {same} "
+              f"({np.isfinite(want[:, 0]).sum()} with data, max difference {worst:.1e})")
+
+    for n in args.sizes:
+        lats, lons = query_points(hazard, n, rng)
+        for method in ('idw', 'nearest'):
+            start = time.perf_counter()
+            lookup(lats, lons, *args.scenario, method=method, hazard=hazard)
+            elapsed = time.perf_counter() - start
+            print(f"{method:<8} {n:>9,} queries: {elapsed:7.3f} s ({n / elapsed:,.0f} queries/s)")
+
+
+if __name__ == '__main__':
+    main()
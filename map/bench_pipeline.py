@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""Benchmark the extraction pipeline on synthetic global CHAZ CSVs.
+
+Generates CSVs with the real lon,lat,rp_10..rp_1000 schema at the global
+0300as grid density, then times each stage separately: extract_model_data,
+the ensemble statistics (MultiModelMean and the rest), JSON serialization
+(legacy, columnar and the memory-mapped cube), opening the columnar
+file and the cube, and generate_index.py HTML generation. Wall time, CPU
+time, rows/s and peak memory per stage are written as JSON: for in-process
+stages the peak traced by tracemalloc during one extra, untimed run
+(peak_alloc_mb), for HTML generation the child process's peak RSS
+(peak_rss_mb). --compare flags regressions between two result files.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from columnar_format import load_hazard_data, write_columnar
+from extract_all_ssp import ensemble_statistics, extract_model_data, models
+from hazard_cube import open_cube, write_cube
+
+GRID_STEP = 300 / 3600  # 0300as
+CSV_HEADER = 'lon,lat,rp_10,rp_25,rp_50,rp_100,rp_250,rp_1000\n'
+# rp_25..rp_1000 as multiples of rp_10 in the synthetic field
+RP_FACTORS = np.array([1.0, 1.2, 1.35, 1.5, 1.7, 2.0])
+# Latitude rows generated and written per block
+BLOCK_LATS = 64
+RESULTS_FORMAT = 'chaz-pipeline-bench'
+# Slowdowns smaller than this many seconds are treated as noise
+NOISE_SECONDS = 0.05
+
+
+def synthetic_csv_path(data_dir, model, ssp, period):
+    return os.path.join(data_dir, f"TC_global_0300as_CHAZ_{model}_{period}_{ssp}_80ens_SD_H08_exceedance_intensity.csv")
+
+
+def write_synthetic_csv(path, seed, lat_min, lat_max):
+    """Write a global-width CSV on the 0300as grid between lat_min and lat_max.
+
+    Values are a smooth latitude/longitude field plus noise, so Florida
+    extracts, contours and heatmaps look like real data rather than static.
+    """
+    rng = np.random.default_rng(seed)
+    lons = (np.arange(round(360 / GRID_STEP)) + 0.5) * GRID_STEP - 180
+    lats = lat_min + (np.arange(round((lat_max - lat_min) / GRID_STEP)) + 0.5) * GRID_STEP
+    fmt = '%.6f,%.6f,' + ','.join(['%.4f'] * len(RP_FACTORS))
+    with open(path + '.tmp', 'w') as f:
+        f.write(CSV_HEADER)
+        for start in range(0, len(lats), BLOCK_LATS):
+            lat, lon = np.meshgrid(lats[start:start + BLOCK_LATS], lons, indexing='ij')
+            base = (25 + 20 * np.exp(-((lat - 22) / 10) ** 2) * (1 + 0.3 * np.sin(lon / 15 + seed))
+                    + rng.normal(0, 0.5, lat.shape))
+            block = np.column_stack([lon.ravel(), lat.ravel(), base.ravel()[:, None] * RP_FACTORS])
+            np.savetxt(f, block, fmt=fmt)
+    os.replace(path + '.tmp', path)
+    return len(lons) * len(lats)
+
+
+def timed(fn, repeat):
+    """Run fn once under tracemalloc, then repeat times untraced.
+
+    Returns (result of the fastest run, wall s, CPU s, peak MB allocated).
+    The traced run only measures memory: tracing slows allocation, so it is
+    kept out of the timings. Only allocations made by fn itself are traced.
+    """
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    best = None
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = fn()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        if best is None or wall < best[1]:
+            best = (result, wall, cpu)
+    return best + (peak / (1024 * 1024),)
+
+
+def stage_record(wall, cpu, alloc, rows=None):
+    record = {'seconds': wall, 'cpu_seconds': cpu, 'peak_alloc_mb': alloc}
+    if rows is not None:
+        record.update(rows=rows, rows_per_sec=rows / wall if wall > 0 else 0.0)
+    return record
+
+
+def run_generate_index(input_file, work_dir):
+    """Run generate_index.py in work_dir; return (wall s, CPU s, child peak RSS MB)."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generate_index.py')
+    # stderr goes to a file: an unread pipe would block the child once it fills, while wait4 waits
+    with tempfile.TemporaryFile() as stderr:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, script, '--input', input_file], cwd=work_dir,
+                                stdout=subprocess.DEVNULL, stderr=stderr)
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        if status != 0:
+            stderr.seek(0)
+            raise SystemExit(f"generate_index.py failed:\n{stderr.read().decode(errors='replace')}")
+    rss = usage.ru_maxrss / (1024 * 1024) if sys.platform == 'darwin' else usage.ru_maxrss / 1024
+    return wall, usage.ru_utime + usage.ru_stime, rss
+
+
+def run_benchmark(args):
+    data_dir = os.path.join(args.data_dir, f'lat{args.lat_min:g}_{args.lat_max:g}')
+    os.makedirs(data_dir, exist_ok=True)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='chaz_bench_')
+    os.makedirs(work_dir, exist_ok=True)
+    scenarios = [(ssp, model, period) for ssp in args.ssps for model in models for period in args.periods]
+
+    # Synthetic inputs are reused between runs with the same latitude band
+    for seed, (ssp, model, period) in enumerate(scenarios):
+        path = synthetic_csv_path(data_dir, model, ssp, period)
+        if not os.path.exists(path):
+            print(f"Generating {os.path.basename(path)}...", end=' ', flush=True)
+            rows = write_synthetic_csv(path, seed, args.lat_min, args.lat_max)
+            print(f"{rows:,} rows")
+
+    stages = {}
+
+    def extract():
+        all_data, rows = {}, 0
+        for ssp, model, period in scenarios:
+            stats = {}
+            points = extract_model_data(synthetic_csv_path(data_dir, model, ssp, period), stats=stats)
+            all_data.setdefault(ssp, {}).setdefault(model, {})[period] = points
+            rows += stats['rows']
+        return all_data, rows
+
+    (all_data, rows), wall, cpu, alloc = timed(extract, args.repeat)
+    stages['extract'] = stage_record(wall, cpu, alloc, rows)
+    stages['extract']['files'] = len(scenarios)
+    print(f"extract:   {wall:.2f} s ({rows / wall / 1e6:.2f}M rows/s)")
+
+    def ensemble():
+        results = {}
+        for ssp in args.ssps:
+            for period in args.periods:
+                results[(ssp, period)] = ensemble_statistics([all_data[ssp][model][period] for model in models])
+        return results
+
+    results, wall, cpu, alloc = timed(ensemble, args.repeat)
+    stages['ensemble'] = stage_record(wall, cpu, alloc)
+    for (ssp, period), stats in results.items():
+        for name, points in stats.items():
+            all_data[ssp].setdefault(name, {})[period] = points
+    print(f"ensemble:  {wall:.2f} s")
+
+    json_file = os.path.join(work_dir, 'florida_all_ssp.json')
+    columnar_file = os.path.join(work_dir, 'florida_all_ssp.col.json')
+    cube_file = os.path.join(work_dir, 'florida_all_ssp.cube.json')
+
+    def serialize_json():
+        with open(json_file, 'w') as f:
+            json.dump(all_data, f)
+
+    _, wall, cpu, alloc = timed(serialize_json, args.repeat)
+    stages['serialize_json'] = stage_record(wall, cpu, alloc)
+    stages['serialize_json']['bytes'] = os.path.getsize(json_file)
+    print(f"json:      {wall:.2f} s ({os.path.getsize(json_file) / 1e6:.1f} MB)")
+
+    _, wall, cpu, alloc = timed(lambda: write_columnar(columnar_file, all_data), args.repeat)
+    stages['serialize_columnar'] = stage_record(wall, cpu, alloc)
+    stages['serialize_columnar']['bytes'] = os.path.getsize(columnar_file)
+    print(f"columnar:  {wall:.2f} s ({os.path.getsize(columnar_file) / 1e6:.1f} MB)")
+
+    cube_paths, wall, cpu, alloc = timed(lambda: write_cube(cube_file, all_data), args.repeat)
+    stages['serialize_cube'] = stage_record(wall, cpu, alloc)
+    stages['serialize_cube']['bytes'] = sum(os.path.getsize(path) for path in cube_paths)
+    print(f"cube:      {wall:.2f} s ({stages['serialize_cube']['bytes'] / 1e6:.1f} MB)")
+
+    _, wall, cpu, alloc = timed(lambda: load_hazard_data(columnar_file), args.repeat)
+    stages['open_columnar'] = stage_record(wall, cpu, alloc)
+    print(f"open col:  {wall:.3f} s")
+
+    _, wall, cpu, alloc = timed(lambda: open_cube(cube_file), args.repeat)
+    stages['open_cube'] = stage_record(wall, cpu, alloc)
+    print(f"open cube: {wall:.3f} s")
+
+    runs = [run_generate_index(columnar_file, work_dir) for _ in range(args.repeat)]
+    wall, cpu, rss = min(runs)
+    stages['html'] = {'seconds': wall, 'cpu_seconds': cpu, 'peak_rss_mb': rss,
+                      'bytes': os.path.getsize(os.path.join(work_dir, 'index.html'))}
+    print(f"html:      {wall:.2f} s ({stages['html']['bytes'] / 1e6:.1f} MB)")
+
+    return {
+        'format': RESULTS_FORMAT,
+        'version': 2,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': {'platform': platform.platform(), 'python': platform.python_version(),
+                 'numpy': np.__version__, 'cpus': os.cpu_count()},
+        'params': {'lat_min': args.lat_min, 'lat_max': args.lat_max, 'ssps': args.ssps,
+                   'periods': args.periods},
+        'repeat': args.repeat,
+        'stages': stages,
+    }
+
+
+def compare_results(base_file, new_file, threshold):
+    """Print stage-by-stage changes; return the names of stages that regressed."""
+    with open(base_file, 'r') as f:
+        base = json.load(f)
+    with open(new_file, 'r') as f:
+        new = json.load(f)
+    if base.get('params') != new.get('params'):
+        print(f"Warning: runs used different parameters:\n  {base.get('params')}\n  {new.get('params')}")
+
+    if base.get('version') != new.get('version'):
+        # Version 1 recorded the process-wide peak RSS for every stage
+        print("Warning: runs come from different result versions; memory is not compared")
+
+    regressions = []
+    print(f"{'stage':<20}{'base s':>10}{'new s':>10}{'change':>9}{'base MB':>10}{'new MB':>10}")
+    for stage, b in base['stages'].items():
+        n = new['stages'].get(stage)
+        if n is None:
+            continue
+        change = n['seconds'] / b['seconds'] - 1 if b['seconds'] > 0 else 0.0
+        flags = []
+        if change > threshold and n['seconds'] - b['seconds'] > NOISE_SECONDS:
+            flags.append('SLOWER')
+        key = 'peak_alloc_mb' if 'peak_alloc_mb' in n else 'peak_rss_mb'
+        b_mb, n_mb = b.get(key, float('nan')), n[key]
+        if base.get('version') == new.get('version') and n_mb > b_mb * (1 + threshold):
+            flags.append('MORE MEMORY')
+        if flags:
+            regressions.append(stage)
+        print(f"{stage:<20}{b['seconds']:>10.3f}{n['seconds']:>10.3f}{change:>+9.1%}"
+              f"{b_mb:>10.1f}{n_mb:>10.1f}  {' '.join(flags)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='bench_results.json', help='Results file (default: bench_results.json)')
+    parser.add_argument('--data-dir', default='bench_data',
+                        help='Where synthetic CSVs are generated and reused (default: bench_data)')
+    parser.add_argument('--work-dir', default=None,
+                        help='Where JSON and index.html outputs are written (default: a temporary directory)')
+    parser.add_argument('--lat-min', type=float, default=10,
+                        help='Southern edge of the synthetic grid (default: 10; use -60 for the full CHAZ band)')
+    parser.add_argument('--lat-max', type=float, default=40,
+                        help='Northern edge of the synthetic grid (default: 40; use 60 for the full CHAZ band)')
+    parser.add_argument('--ssps', nargs='+', default=['ssp585'], help='SSPs to generate (default: ssp585)')
+    parser.add_argument('--periods', nargs='+', default=['base'], help='Periods to generate (default: base)')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per stage; the fastest is kept (default: 1)')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'),
+                        help='Compare two results files instead of running, exiting 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative slowdown or memory growth flagged as a regression (default: 0.10); '
+                             f'slowdowns under {NOISE_SECONDS} s are ignored')
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare_results(*args.compare, args.threshold)
+        if regressions:
+            print(f"\nRegressions: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions")
+        return
+
+    results = run_benchmark(args)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f"\nResults: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
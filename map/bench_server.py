@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Load-test an HTTP server of the map build: requests/s and latency percentiles.
+
+    python bench_server.py --serve .                          # start serve_map.py on the build and test it
+    python bench_server.py --url http://127.0.0.1:8000/ --paths / /shards/ssp585/CESM2/base.json
+
+Each connection is kept alive and sends GET requests back to back, cycling
+through --paths, until --duration runs out. --revalidate sends the ETag of
+a first response as If-None-Match (the 304 path); --range asks for a byte
+range instead of the whole file.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.parse
+
+import numpy as np
+
+NO_BODY = (204, 304)
+
+
+async def fetch(reader, writer, request):
+    """Send one request and read the body; returns (status, body length in bytes, header block)."""
+    writer.write(request)
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head[9:12])
+    length = 0
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    if status not in NO_BODY and length:
+        await reader.readexactly(length)
+    return status, length if status not in NO_BODY else 0, head
+
+
+def build_request(host, path, args, etag=None):
+    lines = [f'GET {path} HTTP/1.1', f'Host: {host}']
+    if args.accept_encoding:
+        lines.append(f'Accept-Encoding: {args.accept_encoding}')
+    if args.range:
+        lines.append(f'Range: bytes={args.range}')
+    if etag:
+        lines.append(f'If-None-Match: {etag}')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def first_responses(host, port, requests):
+    """One request per path before timing (warms server caches); returns the ETags seen."""
+    reader, writer = await asyncio.open_connection(host, port)
+    etags = []
+    try:
+        for request in requests:
+            status, size, head = await fetch(reader, writer, request)
+            etag = None
+            for line in head.split(b'\r\n')[1:]:
+                name, _, value = line.partition(b':')
+                if name.strip().lower() == b'etag':
+                    etag = value.strip().decode('latin-1')
+            print(f"  {request.split(b' ')[1].decode()}: {status}, {size:,} bytes, ETag {etag}")
+            etags.append(etag)
+    finally:
+        writer.close()
+    return etags
+
+
+async def connection(host, port, requests, deadline, results):
+    """Send requests back to back on one keep-alive connection until the deadline."""
+    reader = writer = None
+    i = 0
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            start = time.perf_counter()
+            status, size, _ = await fetch(reader, writer, requests[i % len(requests)])
+            results['latency'].append(time.perf_counter() - start)
+            results['statuses'][status] = results['statuses'].get(status, 0) + 1
+            results['bytes'] += size
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            results['errors'] += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+        i += 1
+    if writer is not None:
+        writer.close()
+
+
+async def run(host, port, args):
+    paths = args.paths
+    authority = f'{host}:{port}'
+    requests = [build_request(authority, path, args) for path in paths]
+    print(f"First responses ({args.accept_encoding or 'no Accept-Encoding'}):")
+    etags = await first_responses(host, port, requests)
+    if args.revalidate:
+        requests = [build_request(authority, path, args, etag) for path, etag in zip(paths, etags)]
+
+    results = {'latency': [], 'statuses': {}, 'bytes': 0, 'errors': 0}
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(connection(host, port, requests, deadline, results) for _ in range(args.connections)))
+    elapsed = time.perf_counter() - start
+
+    latency = np.array(results['latency']) * 1000
+    print(f"{len(latency):,} requests in {elapsed:.1f} s over {args.connections} connections: "
+          f"{len(latency) / elapsed:,.0f} requests/s, {results['bytes'] / elapsed / 1e6:,.1f} MB/s")
+    if len(latency):
+        p50, p90, p99 = np.percentile(latency, [50, 90, 99])
+        print(f"latency ms: p50 {p50:.2f}  p90 {p90:.2f}  p99 {p99:.2f}  max {latency.max():.2f}")
+    print(f"statuses: {dict(sorted(results['statuses'].items()))}, errors: {results['errors']}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(root, port):
+    """Start serve_map.py on root in a subprocess and wait until it accepts connections."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve_map.py')
+    process = subprocess.Popen([sys.executable, script, '--root', root, '--port', str(port)])
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"serve_map.py did not start on port {port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000/', help='Server to test (default: %(default)s)')
+    parser.add_argument('--serve', metavar='DIR', default=None,
+                        help='Start serve_map.py on DIR on a free local port and test that instead of --url')
+    parser.add_argument('--paths', nargs='+', default=['/'], help='Paths requested in turn (default: /)')
+    parser.add_argument('--connections', type=int, default=32, help='Concurrent connections (default: 32)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load (default: 10)')
+    parser.add_argument('--accept-encoding', default='gzip, br',
+                        help="Accept-Encoding sent (default: 'gzip, br'; '' for identity)")
+    parser.add_argument('--range', metavar='FIRST-LAST', default=None, help='Request bytes FIRST-LAST, e.g. 0-65535')
+    parser.add_argument('--revalidate', action='store_true',
+                        help='Send If-None-Match with the first ETag of each path (measures 304 responses)')
+    args = parser.parse_args()
+
+    process = None
+    if args.serve:
+        host, port = '127.0.0.1', free_port()
+        process = start_server(args.serve, port)
+    else:
+        url = urllib.parse.urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    try:
+        asyncio.run(run(host, port, args))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""Compact columnar storage for the extracted Florida hazard data.
+
+Layout (a single JSON document):
+
+    {
+      "format": "chaz-columnar", "version": 1,
+      "rp_keys": ["rp10", ..., "rp1000"],
+      "ssps": [...], "models": [...], "periods": [...],
+      "encoding": "int16" | "float32", "scale": 0.1 | 1,
+      "n_points": N,
+      "lat": <b64 int32, hundredths of a degree>,
+      "lon": <b64 int32, hundredths of a degree>,
+      "data": {ssp: {model: {period: {"n": n, "values": <b64>, "index": <b64 int32>}}}}
+    }
+
+Coordinates are stored once. Each scenario's values are the six return-period
+columns packed one after another (rp10 for all points, then rp25, ...). With
+the default int16 encoding values are stored as tenths of m/s, which is
+lossless for the 0.1 m/s rounding applied at extraction. "index" is only
+present when a scenario's points are not the shared coordinates in order.
+All arrays are little-endian.
+"""
+
+import base64
+import json
+
+import numpy as np
+
+FORMAT_NAME = 'chaz-columnar'
+FORMAT_VERSION = 1
+RP_KEYS = ['rp10', 'rp25', 'rp50', 'rp100', 'rp250', 'rp1000']
+ENCODINGS = {'int16': ('<i2', 0.1), 'float32': ('<f4', 1)}
+
+
+def _b64(array, dtype):
+    return base64.b64encode(np.ascontiguousarray(array, dtype=dtype).tobytes()).decode('ascii')
+
+
+def _unb64(text, dtype):
+    return np.frombuffer(base64.b64decode(text), dtype=dtype)
+
+
+def _hundredths(values):
+    return np.rint(np.asarray(values, dtype=np.float64) * 100).astype(np.int32)
+
+
+def encode_columnar(all_data, encoding='int16'):
+    """Convert all_data ({ssp: {model: {period: [point dicts]}}}) to the columnar document."""
+    dtype, scale = ENCODINGS[encoding]
+    ssps = list(all_data)
+    models = list(all_data[ssps[0]]) if ssps else []
+    periods = list(all_data[ssps[0]][models[0]]) if models else []
+
+    # Shared coordinate table: union of all scenario points, in first-seen order
+    coord_ids = {}
+    lat_q, lon_q = [], []
+    scenario_ids = {}
+    for ssp in ssps:
+        for model in all_data[ssp]:
+            for period, points in all_data[ssp][model].items():
+                lats = _hundredths([p['lat'] for p in points])
+                lons = _hundredths([p['lon'] for p in points])
+                ids = np.empty(len(points), dtype=np.int32)
+                for k, key in enumerate(zip(lats.tolist(), lons.tolist())):
+                    if key not in coord_ids:
+                        coord_ids[key] = len(coord_ids)
+                        lat_q.append(key[0])
+                        lon_q.append(key[1])
+                    ids[k] = coord_ids[key]
+                scenario_ids[(ssp, model, period)] = ids
+    n_points = len(coord_ids)
+
+    data = {}
+    for ssp in ssps:
+        data[ssp] = {}
+        for model in all_data[ssp]:
+            data[ssp][model] = {}
+            for period, points in all_data[ssp][model].items():
+                ids = scenario_ids[(ssp, model, period)]
+                columns = np.array([[p[rp] for p in points] for rp in RP_KEYS], dtype=np.float64)
+                if encoding == 'int16':
+                    columns = np.rint(columns * 10)
+                entry = {'n': len(points), 'values': _b64(columns, dtype)}
+                if len(ids) != n_points or not np.array_equal(ids, np.arange(n_points)):
+                    entry['index'] = _b64(ids, '<i4')
+                data[ssp][model][period] = entry
+
+    return {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'rp_keys': RP_KEYS,
+        'ssps': ssps,
+        'models': models,
+        'periods': periods,
+        'encoding': encoding,
+        'scale': scale,
+        'n_points': n_points,
+        'lat': _b64(lat_q, '<i4'),
+        'lon': _b64(lon_q, '<i4'),
+        'data': data,
+    }
+
+
+def is_columnar(doc):
+    return isinstance(doc, dict) and doc.get('format') == FORMAT_NAME
+
+
+def decode_coordinates(doc):
+    """Return the shared (lats, lons) coordinate arrays."""
+    return _unb64(doc['lat'], '<i4') / 100, _unb64(doc['lon'], '<i4') / 100
+
+
+def scenario_coordinate_ids(doc, ssp, model, period):
+    """Indices into the shared coordinates of one scenario's points, or None if it uses them all in order."""
+    entry = doc['data'][ssp][model][period]
+    return _unb64(entry['index'], '<i4') if 'index' in entry else None
+
+
+def decode_scenario(doc, ssp, model, period):
+    """Return (lats, lons, values) arrays for one scenario; values has shape (n, 6)."""
+    entry = doc['data'][ssp][model][period]
+    lats, lons = decode_coordinates(doc)
+    ids = scenario_coordinate_ids(doc, ssp, model, period)
+    if ids is not None:
+        lats, lons = lats[ids], lons[ids]
+    dtype, _ = ENCODINGS[doc['encoding']]
+    values = _unb64(entry['values'], dtype).reshape(len(RP_KEYS), entry['n']).T.astype(np.float64)
+    if doc['encoding'] == 'int16':
+        values = values / 10
+    else:
+        # Round to 0.1 m/s exactly as the page does (Math.round(v * 10) / 10)
+        values = np.floor(values * 10 + 0.5) / 10
+    return lats, lons, values
+
+
+def decode_columnar(doc):
+    """Expand a columnar document back into all_data's list-of-dicts form."""
+    all_data = {}
+    for ssp, by_model in doc['data'].items():
+        all_data[ssp] = {}
+        for model, by_period in by_model.items():
+            all_data[ssp][model] = {}
+            for period in by_period:
+                lats, lons, values = decode_scenario(doc, ssp, model, period)
+                points = []
+                for lat, lon, row in zip(lats.tolist(), lons.tolist(), values.tolist()):
+                    point = {'lat': lat, 'lon': lon}
+                    point.update(zip(RP_KEYS, row))
+                    points.append(point)
+                all_data[ssp][model][period] = points
+    return all_data
+
+
+def write_columnar(path, all_data, encoding='int16'):
+    with open(path, 'w') as f:
+        json.dump(encode_columnar(all_data, encoding), f, separators=(',', ':'))
+
+
+def load_hazard_data(path):
+    """Load the columnar document, a hazard cube (.cube.json) or the legacy list-of-dicts JSON.
+
+    Returns the columnar document; cubes and legacy files are converted on the fly.
+    """
+    if path.endswith('.cube.json'):
+        from hazard_cube import cube_to_columnar, open_cube  # hazard_cube imports this module
+        return cube_to_columnar(open_cube(path))
+    with open(path, 'r') as f:
+        doc = json.load(f)
+    return doc if is_columnar(doc) else encode_columnar(doc)
@@ -1,8 +1,29 @@
 #!/usr/bin/env python3
 """Extract Florida data for all SSP scenarios, all models, all time periods."""
 
+import argparse
+import contextlib
+import cProfile
+import hashlib
+import io
 import json
 import os
+import pstats
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from columnar_format import write_columnar
+from hazard_cube import write_cube
+from regions import classify_regions, load_regions, make_region, region_registry
+
+try:
+    import netCDF4
+except ImportError:  # optional: only needed for the nc / raster.nc inputs
+    netCDF4 = None
 
 # Florida land polygon for filtering (simplified)
 FLORIDA_POLYGON = [
@@ -40,111 +61,1062 @@ def point_in_polygon(x, y, polygon):
 def is_florida_land(lon, lat):
     return point_in_polygon(lon, lat, FLORIDA_POLYGON) or point_in_polygon(lon, lat, KEYS_POLYGON)
 
-def extract_model_data(csv_path):
-    """Extract Florida land points from a CSV file."""
-    points = []
-    with open(csv_path, 'r') as f:
+def points_in_polygon(xs, ys, polygon):
+    """Vectorized point_in_polygon: test arrays of points against every edge at once.
+
+    Mirrors the scalar ray casting exactly (same comparisons, same xinters
+    arithmetic), so membership is identical point for point.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    inside = np.zeros(xs.shape, dtype=bool)
+    n = len(polygon)
+    p1x, p1y = polygon[0]
+    for i in range(1, n + 1):
+        p2x, p2y = polygon[i % n]
+        # Horizontal edges can never satisfy min < y <= max, so they never toggle
+        if p1y != p2y:
+            crosses = (ys > min(p1y, p2y)) & (ys <= max(p1y, p2y)) & (xs <= max(p1x, p2x))
+            if p1x == p2x:
+                inside ^= crosses
+            else:
+                xinters = (ys - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
+                inside ^= crosses & (xs <= xinters)
+        p1x, p1y = p2x, p2y
+    return inside
+
+def florida_land_mask(lons, lats):
+    """Boolean mask of Florida land membership for arrays of lon/lat."""
+    return points_in_polygon(lons, lats, FLORIDA_POLYGON) | points_in_polygon(lons, lats, KEYS_POLYGON)
+
+# Florida bounding box (lat 24-31, lon -88 to -79.5)
+LAT_MIN, LAT_MAX = 24, 31
+LON_MIN, LON_MAX = -88, -79.5
+
+def florida_region():
+    """The built-in region: mainland and Keys polygons within the Florida bbox.
+
+    Prepared for regions.classify_regions; membership matches
+    bbox_mask & florida_land_mask.
+    """
+    return make_region('florida', [[FLORIDA_POLYGON], [KEYS_POLYGON]],
+                       bbox=(LON_MIN, LAT_MIN, LON_MAX, LAT_MAX))
+
+RP_KEYS = ['rp10', 'rp25', 'rp50', 'rp100', 'rp250', 'rp1000']
+
+# Bytes read per chunk by the streaming CSV reader
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# Opt-in instrumentation (--instrument): {'stages': {name: {wall, cpu, calls}},
+# 'counters': {name: n}} for the file being extracted, None when disabled
+_instrument = None
+
+def start_instrument():
+    global _instrument
+    _instrument = {'stages': {}, 'counters': {}}
+
+def stop_instrument():
+    global _instrument
+    report, _instrument = _instrument, None
+    return report
+
+@contextlib.contextmanager
+def timed_stage(name, report=None):
+    """Add the wall and CPU time of the block to a stage of report (default: the active one)."""
+    report = report if report is not None else _instrument
+    if report is None:
+        yield
+        return
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        entry = report['stages'].setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+        entry['wall'] += time.perf_counter() - wall
+        entry['cpu'] += time.process_time() - cpu
+        entry['calls'] += 1
+
+def count(name, n):
+    if _instrument is not None:
+        _instrument['counters'][name] = _instrument['counters'].get(name, 0) + int(n)
+
+def bbox_mask(lons, lats):
+    return (lats >= LAT_MIN) & (lats <= LAT_MAX) & (lons >= LON_MIN) & (lons <= LON_MAX)
+
+def parse_csv_rows(data):
+    """Parse a block of complete CSV lines (bytes) into a float64 (n, 8) array.
+
+    Rows with fewer than 8 fields are dropped, as in the line-by-line reader.
+    """
+    try:
+        rows = np.loadtxt(io.BytesIO(data), delimiter=',', usecols=range(8),
+                          dtype=np.float64, ndmin=2)
+    except ValueError:
+        # Ragged block: fall back to per-line parsing for this chunk only
+        rows = [[float(v) for v in parts[:8]]
+                for parts in (line.split(b',') for line in data.splitlines())
+                if len(parts) >= 8]
+        rows = np.array(rows, dtype=np.float64).reshape(-1, 8)
+    return rows
+
+def parse_csv_coords(data):
+    """Parse the lon/lat columns of a block of complete CSV lines, deferring the values.
+
+    Returns (coords, values_of): coords is a float64 (n, 2) array of lon, lat
+    and values_of(ids) parses rp10..rp1000 of just those rows into an
+    (len(ids), 6) array, so rows dropped by the bbox and land tests never have
+    their values converted. Blocks without 7 commas per line (ragged or extra
+    columns) are parsed whole by parse_csv_rows instead.
+    """
+    if not data.endswith(b'\n'):
+        data += b'\n'
+    n = data.count(b'\n')
+    coords = None
+    if data.count(b',') == 7 * n:
+        try:
+            coords = np.loadtxt(io.BytesIO(data), delimiter=',', usecols=(0, 1), dtype=np.float64, ndmin=2)
+        except ValueError:
+            coords = None
+    if coords is None or len(coords) != n:
+        rows = parse_csv_rows(data)
+        return rows[:, :2], lambda ids: rows[ids, 2:8]
+
+    line_ends = []
+
+    def values_of(ids):
+        if not len(ids):
+            return np.empty((0, 6))
+        with timed_stage('parse'):
+            if not line_ends:
+                line_ends.append(np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n')))
+            ends = line_ends[0]
+            starts = np.concatenate([[0], ends[:-1] + 1])
+            lines = [data[start:end] for start, end in zip(starts[ids].tolist(), ends[ids].tolist())]
+            return np.loadtxt(lines, delimiter=',', usecols=range(2, 8), dtype=np.float64, ndmin=2)
+
+    return coords, values_of
+
+def iter_csv_blocks(csv_path, chunk_size=CHUNK_SIZE, hasher=None):
+    """Yield blocks of complete lines (bytes) read in fixed-size binary chunks of a CSV.
+
+    The header line is skipped and a partial trailing line is carried over to
+    the next chunk, so memory stays bounded by chunk_size whatever the file size.
+    If hasher is given, every byte read (header included) is fed to it, so once
+    the generator is exhausted it holds the content hash of the whole file.
+    """
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        if hasher is not None:
+            hasher.update(header)
+        tail = b''
+        while True:
+            with timed_stage('read'):
+                chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            if hasher is not None:
+                with timed_stage('digest'):
+                    hasher.update(chunk)
+            chunk = tail + chunk
+            cut = chunk.rfind(b'\n') + 1
+            tail = chunk[cut:]
+            if cut:
+                yield chunk[:cut]
+        if tail.strip():
+            yield tail
+
+def iter_csv_chunks(csv_path, chunk_size=CHUNK_SIZE, hasher=None):
+    """Yield (coords, values_of) per block of a CSV (see parse_csv_coords and iter_csv_blocks)."""
+    for block in iter_csv_blocks(csv_path, chunk_size, hasher):
+        with timed_stage('parse'):
+            coords, values_of = parse_csv_coords(block)
+        count('rows', len(coords))
+        yield coords, values_of
+
+def chunk_rows(coords, values_of, ids):
+    """(len(ids), 8) rows of lon, lat and the six values for the given rows of a chunk."""
+    return np.column_stack([coords[ids], values_of(ids)])
+
+def land_mask(lons, lats, vectorized=True):
+    """Florida land test over bbox candidates, vectorized or per row."""
+    if vectorized:
+        return florida_land_mask(lons, lats)
+    return np.array([is_florida_land(lon, lat) for lon, lat in zip(lons.tolist(), lats.tolist())], dtype=bool)
+
+def _gather_cached_rows(csv_path, grid_index, chunk_size, file_hasher=None):
+    """Parse only the lines listed in grid_index, found by line number.
+
+    Returns (region, lines_scanned); region is None when the file does not
+    match the index (a different line count, or listed lines whose lon/lat
+    differ from the cached ones), and the caller falls back to the geometry
+    path. Other lines are only counted, never parsed. file_hasher, if given,
+    receives the file's bytes (see iter_csv_blocks).
+    """
+    indices = grid_index['indices']
+    offset = 0
+    kept = []
+    for block in iter_csv_blocks(csv_path, chunk_size, hasher=file_hasher):
+        with timed_stage('gather'):
+            n = block.count(b'\n') + (not block.endswith(b'\n'))
+            lo, hi = np.searchsorted(indices, [offset, offset + n])
+            if hi > lo:
+                ends = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+                ends = np.append(ends, len(block))[:n]
+                starts = np.concatenate([[0], ends[:-1] + 1])
+                ids = indices[lo:hi] - offset
+                lines = b'\n'.join(block[start:end] for start, end in zip(starts[ids].tolist(), ends[ids].tolist()))
+        if hi > lo:
+            with timed_stage('parse'):
+                kept.append(parse_csv_rows(lines))
+        offset += n
+    region = np.concatenate(kept) if kept else np.empty((0, 8))
+    if (offset != grid_index['rows'] or len(region) != len(indices)
+            or not np.array_equal(region[:, :2], grid_index['coords'])):
+        return None, offset
+    count('rows', offset)
+    return region, offset
+
+def _classify_rows(csv_path, vectorized, chunk_size, file_hasher=None):
+    """Run the bbox and land tests over every chunk, recording member row indices.
+
+    file_hasher, if given, receives the file's bytes (see iter_csv_chunks).
+    """
+    offset = 0
+    kept = []
+    member_rows = []
+    for coords, values_of in iter_csv_chunks(csv_path, chunk_size, hasher=file_hasher):
+        with timed_stage('bbox'):
+            candidates = np.flatnonzero(bbox_mask(coords[:, 0], coords[:, 1]))
+        count('bbox_rejects', len(coords) - len(candidates))
+        count('polygon_tests', len(candidates))
+        with timed_stage('land'):
+            keep = land_mask(coords[candidates, 0], coords[candidates, 1], vectorized)
+        kept.append(chunk_rows(coords, values_of, candidates[keep]))
+        member_rows.append(candidates[keep] + offset)
+        offset += len(coords)
+    region = np.concatenate(kept) if kept else np.empty((0, 8))
+    grid_index = {
+        'rows': offset,
+        'indices': np.concatenate(member_rows) if member_rows else np.empty(0, dtype=np.int64),
+        'coords': region[:, :2].copy(),
+    }
+    return region, offset, grid_index
+
+def read_region_arrays(csv_path, vectorized=True, chunk_size=CHUNK_SIZE, grid_index=None, digest=False):
+    """Stream a global CSV and keep only Florida land rows.
+
+    The bbox filter and land test run on each chunk's lon/lat before any
+    per-row Python objects exist, and only the rows they keep have their value
+    columns parsed. Returns (lons, lats, values, stats) where values is
+    an (n, 6) array of rp10..rp1000 and stats holds rows scanned and seconds.
+
+    If grid_index (see load_grid_index) is given, only its cached row indices
+    are parsed, with no geometry work. It holds the line count and the member
+    rows' lon/lat; when the file does not match either, it is re-read through
+    the geometry path and the rebuilt index is returned in stats['membership']
+    for the caller to save. Lines outside the index are not checked, as every
+    CHAZ file of a product shares one grid.
+    With digest=True the file's content hash (file_digest) is taken from the
+    same read and returned in stats['digest'].
+    """
+    start = time.perf_counter()
+    region = None
+    file_hasher = hashlib.blake2b(digest_size=16) if digest else None
+    if grid_index is not None:
+        region, rows_scanned = _gather_cached_rows(csv_path, grid_index, chunk_size, file_hasher)
+        status = 'hit'
+    stats = {}
+    if region is None:
+        # After a gather pass file_hasher already holds the whole file
+        region, rows_scanned, membership = _classify_rows(csv_path, vectorized, chunk_size,
+                                                          file_hasher if grid_index is None else None)
+        status = 'built'
+        stats['membership'] = membership
+    if digest:
+        stats['digest'] = file_hasher.hexdigest()
+    elapsed = time.perf_counter() - start
+    stats.update(rows=rows_scanned, seconds=elapsed,
+                 rows_per_sec=rows_scanned / elapsed if elapsed > 0 else 0.0,
+                 grid_index=status)
+    return region[:, 0], region[:, 1], region[:, 2:8], stats
+
+def read_regions_arrays(csv_path, registry, chunk_size=CHUNK_SIZE, digest=False):
+    """Stream a global CSV once, splitting its rows between all registry regions.
+
+    Returns ({name: (lons, lats, values)}, stats), each region's rows in
+    file order, as read_region_arrays would give for that region alone.
+    With digest=True stats['digest'] holds the file's content hash.
+    """
+    start = time.perf_counter()
+    kept = [[] for _ in registry['regions']]
+    rows_scanned = 0
+    file_hasher = hashlib.blake2b(digest_size=16) if digest else None
+    for coords, values_of in iter_csv_chunks(csv_path, chunk_size, hasher=file_hasher):
+        with timed_stage('land'):
+            members = classify_regions(coords[:, 0], coords[:, 1], registry)
+        for parts, members in zip(kept, members):
+            parts.append(chunk_rows(coords, values_of, members))
+        rows_scanned += len(coords)
+    arrays = {}
+    for region, parts in zip(registry['regions'], kept):
+        region_rows = np.concatenate(parts) if parts else np.empty((0, 8))
+        arrays[region['name']] = (region_rows[:, 0], region_rows[:, 1], region_rows[:, 2:8])
+    elapsed = time.perf_counter() - start
+    stats = {'rows': rows_scanned, 'seconds': elapsed,
+             'rows_per_sec': rows_scanned / elapsed if elapsed > 0 else 0.0}
+    if digest:
+        stats['digest'] = file_hasher.hexdigest()
+    return arrays, stats
+
+def load_grid_index(path):
+    """Load a cached grid membership index, or None if absent or unreadable."""
+    try:
+        with np.load(path) as cached:
+            return {
+                'rows': int(cached['rows']),
+                'indices': cached['indices'].astype(np.int64),
+                'coords': cached['coords'].astype(np.float64),
+            }
+    except (OSError, KeyError, ValueError):
+        return None
+
+def save_grid_index(path, grid_index):
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, rows=grid_index['rows'], indices=grid_index['indices'], coords=grid_index['coords'])
+    os.replace(tmp_path, path)
+
+# NetCDF variable names (README: rp_10 ... rp_1000, same in every format)
+NC_VALUE_VARS = ['rp_10', 'rp_25', 'rp_50', 'rp_100', 'rp_250', 'rp_1000']
+NC_LAT_NAMES = ['lat', 'latitude']
+NC_LON_NAMES = ['lon', 'longitude']
+# Coordinates read per block when scanning a point file
+NC_BLOCK_POINTS = 1 << 20
+
+def _nc_variable(ds, names):
+    for name in names:
+        if name in ds.variables:
+            return ds.variables[name]
+    raise KeyError(f"{ds.filepath()}: none of {names} found")
+
+def _nc_read(var, index, hasher=None):
+    """Read var[index] as float64 with fill values as NaN, feeding the array to hasher if given."""
+    values = np.ma.filled(np.ma.asarray(var[index]).astype(np.float64), np.nan)
+    if hasher is not None:
+        with timed_stage('digest'):
+            hasher.update(var.name.encode())
+            hasher.update(np.ascontiguousarray(values).tobytes())
+    return values
+
+def _wrap_lon(lons):
+    """Map 0..360 longitudes onto -180..180 so the Florida bbox applies."""
+    return np.where(lons > 180, lons - 360, lons)
+
+def _nc_points_region(lat_var, lon_var, value_vars, vectorized, block, hasher=None):
+    """Scan the coordinates of a point file in blocks; read values only over member spans."""
+    n = len(lat_var)
+    kept = []
+    for offset in range(0, n, block):
+        window = slice(offset, min(offset + block, n))
+        with timed_stage('read'):
+            lats = _nc_read(lat_var, window, hasher)
+            lons = _wrap_lon(_nc_read(lon_var, window, hasher))
+        count('rows', len(lats))
+        with timed_stage('bbox'):
+            candidates = np.flatnonzero(bbox_mask(lons, lats))
+        count('bbox_rejects', len(lats) - len(candidates))
+        count('polygon_tests', len(candidates))
+        with timed_stage('land'):
+            rows = candidates[land_mask(lons[candidates], lats[candidates], vectorized)]
+        if not len(rows):
+            continue
+        # One contiguous read per variable spanning this block's members
+        lo, hi = offset + rows[0], offset + rows[-1] + 1
+        with timed_stage('read'):
+            values = np.column_stack([_nc_read(var, slice(lo, hi), hasher)[rows + offset - lo]
+                                      for var in value_vars])
+        kept.append(np.column_stack([lons[rows], lats[rows], values]))
+    return (np.concatenate(kept) if kept else np.empty((0, 8))), n
+
+def _nc_raster_region(lat_var, lon_var, value_vars, vectorized, hasher=None):
+    """Read only the row/column slab of a raster that covers the Florida bbox."""
+    with timed_stage('read'):
+        lat_axis = _nc_read(lat_var, slice(None), hasher)
+        lon_axis = _wrap_lon(_nc_read(lon_var, slice(None), hasher))
+    rows = np.flatnonzero((lat_axis >= LAT_MIN) & (lat_axis <= LAT_MAX))
+    cols = np.flatnonzero((lon_axis >= LON_MIN) & (lon_axis <= LON_MAX))
+    if not len(rows) or not len(cols):
+        return np.empty((0, 8)), 0
+    row_slab = slice(rows.min(), rows.max() + 1)
+    col_slab = slice(cols.min(), cols.max() + 1)
+    lats, lons = np.meshgrid(lat_axis[row_slab], lon_axis[col_slab], indexing='ij')
+    lats, lons = lats.ravel(), lons.ravel()
+    count('rows', lats.size)
+    # The slab can be wider than the bbox if an axis is not monotonic
+    with timed_stage('bbox'):
+        keep = bbox_mask(lons, lats)
+    count('bbox_rejects', lats.size - keep.sum())
+    count('polygon_tests', keep.sum())
+    with timed_stage('land'):
+        keep[keep] = land_mask(lons[keep], lats[keep], vectorized)
+
+    lat_dim, lon_dim = lat_var.dimensions[0], lon_var.dimensions[0]
+    columns = []
+    for var in value_vars:
+        # Index by dimension name; any extra singleton dimension (e.g. time) takes 0
+        index = tuple(row_slab if dim == lat_dim else col_slab if dim == lon_dim else 0
+                      for dim in var.dimensions)
+        with timed_stage('read'):
+            slab = _nc_read(var, index, hasher)
+        if var.dimensions.index(lat_dim) > var.dimensions.index(lon_dim):
+            slab = slab.T
+        columns.append(slab.ravel()[keep])
+    region = np.column_stack([lons[keep], lats[keep]] + columns)
+    return region, lats.size
+
+def read_netcdf_arrays(nc_path, vectorized=True, block=NC_BLOCK_POINTS, digest=False):
+    """Read Florida land points from an nc point file or a raster.nc grid.
+
+    Point files are scanned in blocks of coordinates, and values are read
+    only over the span of each block's Florida members. For rasters (value
+    variables on lat/lon dimensions) only the row/column slab over the bbox
+    is read. Either way the global value arrays are never decoded. Cells
+    whose values are fill (ocean) are dropped. Returns (lons, lats, values,
+    stats) like read_region_arrays. With digest=True stats['digest'] is a
+    hash of the arrays actually read (not of the whole file).
+    """
+    if netCDF4 is None:
+        raise ImportError("NetCDF input requires the netCDF4 package (pip install netCDF4)")
+    start = time.perf_counter()
+    with netCDF4.Dataset(nc_path, 'r') as ds:
+        lat_var = _nc_variable(ds, NC_LAT_NAMES)
+        lon_var = _nc_variable(ds, NC_LON_NAMES)
+        value_vars = [ds.variables[name] for name in NC_VALUE_VARS]
+        hasher = hashlib.blake2b(digest_size=16) if digest else None
+        if value_vars[0].ndim >= 2:
+            region, scanned = _nc_raster_region(lat_var, lon_var, value_vars, vectorized, hasher)
+        else:
+            region, scanned = _nc_points_region(lat_var, lon_var, value_vars, vectorized, block, hasher)
+    region = region[~np.isnan(region).any(axis=1)]
+    elapsed = time.perf_counter() - start
+    stats = {'rows': scanned, 'seconds': elapsed,
+             'rows_per_sec': scanned / elapsed if elapsed > 0 else 0.0}
+    if digest:
+        stats['digest'] = hasher.hexdigest()
+    return region[:, 0], region[:, 1], region[:, 2:8], stats
+
+def file_digest(path, block_size=CHUNK_SIZE):
+    """Content hash of a file, read in CHUNK_SIZE blocks."""
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+def points_to_arrays(points):
+    """Inverse of region_points: (lons, lats, values) arrays from point dicts."""
+    table = np.array([[p['lon'], p['lat']] + [p[rp] for rp in RP_KEYS] for p in points]).reshape(-1, 8)
+    return table[:, 0], table[:, 1], table[:, 2:]
+
+def load_manifest(cache_dir):
+    """Load the extraction cache manifest ({'files': {...}, 'ensembles': {...}})."""
+    try:
+        with open(os.path.join(cache_dir, 'manifest.json'), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'files': {}, 'ensembles': {}}
+
+def save_manifest(cache_dir, manifest):
+    path = os.path.join(cache_dir, 'manifest.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+def _save_points(path, **named_points):
+    arrays = {}
+    for name, points in named_points.items():
+        lons, lats, values = points_to_arrays(points)
+        arrays.update({f'{name}_lon': lons, f'{name}_lat': lats, f'{name}_values': values})
+    np.savez(path + '.tmp.npz', **arrays)
+    os.replace(path + '.tmp.npz', path)
+
+def _load_points(path, names):
+    try:
+        with np.load(path) as cached:
+            return {name: region_points(cached[f'{name}_lon'], cached[f'{name}_lat'], cached[f'{name}_values'])
+                    for name in names}
+    except (OSError, KeyError, ValueError):
+        return None
+
+def cached_file_points(manifest, cache_dir, csv_file, region_digests):
+    """{region: points} cached for csv_file if the file is unchanged since extraction, else None.
+
+    The entry must have been extracted for the same regions (region_digests,
+    {name: digest}). Size and mtime are checked next; if only the mtime of
+    a CSV moved, the content digest decides and the manifest entry is
+    refreshed. NetCDF digests only cover the arrays read during extraction,
+    so any size or mtime change re-extracts those files.
+    """
+    entry = manifest['files'].get(csv_file)
+    if entry is None or entry.get('regions') != region_digests:
+        return None
+    st = os.stat(csv_file)
+    if (st.st_size, st.st_mtime_ns) != (entry['size'], entry['mtime_ns']):
+        if csv_file.endswith('.nc') or st.st_size != entry['size'] or file_digest(csv_file) != entry['digest']:
+            return None
+        entry['mtime_ns'] = st.st_mtime_ns
+    return _load_points(os.path.join(cache_dir, entry['cache']), list(region_digests))
+
+def store_file_points(manifest, cache_dir, csv_file, found, digest, st, region_digests):
+    """Cache a file's extracted {region: points} and record its signature in the manifest."""
+    cache_name = os.path.basename(csv_file) + '.npz'
+    _save_points(os.path.join(cache_dir, cache_name), **found)
+    manifest['files'][csv_file] = {
+        'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'digest': digest,
+        'cache': cache_name, 'regions': region_digests,
+        'points': {name: len(points) for name, points in found.items()},
+    }
+
+def ensemble_cache_key(manifest, csv_files, region_digest):
+    """Key for a region's SSP/period ensemble: its inputs' digests (None if missing) and the region's."""
+    digests = [manifest['files'][f]['digest'] if f in manifest['files'] else None for f in csv_files]
+    return hashlib.blake2b(json.dumps([digests, region_digest]).encode(), digest_size=16).hexdigest()
+
+def extract_model_data_lines(csv_path, vectorized=True):
+    """Extract Florida land points from a CSV file, reading it line by line.
+
+    With vectorized=True the land test runs once over all bbox candidates via
+    florida_land_mask; vectorized=False keeps the per-row is_florida_land path.
+    """
+    candidates = []
+    rows = in_bbox = 0
+    # Reading and parsing are interleaved here, so both count as 'parse'
+    with timed_stage('parse'), open(csv_path, 'r') as f:
         header = f.readline().strip().split(',')
         for line in f:
             parts = line.strip().split(',')
             if len(parts) >= 8:
+                rows += 1
                 lon = float(parts[0])  # CSV has lon first
                 lat = float(parts[1])  # then lat
                 # Bounding box check first
                 if 24 <= lat <= 31 and -88 <= lon <= -79.5:
-                    # Land check
-                    if is_florida_land(lon, lat):
-                        points.append({
-                            'lat': round(lat, 2),
-                            'lon': round(lon, 2),
-                            'rp10': round(float(parts[2]), 1),
-                            'rp25': round(float(parts[3]), 1),
-                            'rp50': round(float(parts[4]), 1),
-                            'rp100': round(float(parts[5]), 1),
-                            'rp250': round(float(parts[6]), 1),
-                            'rp1000': round(float(parts[7]), 1)
-                        })
+                    in_bbox += 1
+                    if vectorized or is_florida_land(lon, lat):
+                        candidates.append((lon, lat, parts))
+    count('rows', rows)
+    count('bbox_rejects', rows - in_bbox)
+    count('polygon_tests', in_bbox)
+
+    if vectorized and candidates:
+        with timed_stage('land'):
+            lons = np.array([c[0] for c in candidates])
+            lats = np.array([c[1] for c in candidates])
+            keep = florida_land_mask(lons, lats)
+        candidates = [c for c, k in zip(candidates, keep) if k]
+
+    points = []
+    for lon, lat, parts in candidates:
+        points.append({
+            'lat': round(lat, 2),
+            'lon': round(lon, 2),
+            'rp10': round(float(parts[2]), 1),
+            'rp25': round(float(parts[3]), 1),
+            'rp50': round(float(parts[4]), 1),
+            'rp100': round(float(parts[5]), 1),
+            'rp250': round(float(parts[6]), 1),
+            'rp1000': round(float(parts[7]), 1)
+        })
+    return points
+
+def region_points(lons, lats, values):
+    """Build the per-point dicts written to florida_all_ssp.json from region arrays."""
+    points = []
+    for lon, lat, row in zip(lons.tolist(), lats.tolist(), values.tolist()):
+        point = {'lat': round(lat, 2), 'lon': round(lon, 2)}
+        for rp, v in zip(RP_KEYS, row):
+            point[rp] = round(v, 1)
+        points.append(point)
     return points
 
+def extract_model_data(csv_path, vectorized=True, reader='chunked', stats=None, grid_index=None, digest=False):
+    """Extract Florida land points from a CSV file, or an nc / raster.nc file.
+
+    NetCDF paths (ending in .nc) go through read_netcdf_arrays and ignore
+    reader and grid_index. For CSV, reader='chunked' streams the file through
+    read_region_arrays (optionally reusing a cached grid_index);
+    reader='lines' uses the original line-by-line parser. If a stats dict is
+    given it is filled with rows scanned, seconds and rows/sec, plus the
+    input's digest (see read_region_arrays / read_netcdf_arrays) with
+    digest=True.
+    """
+    start = time.perf_counter()
+    if reader == 'lines':
+        points = extract_model_data_lines(csv_path, vectorized)
+        if stats is not None and digest:
+            stats['digest'] = file_digest(csv_path)
+        if stats is not None:
+            with open(csv_path, 'rb') as f:
+                rows = sum(1 for _ in f) - 1
+            elapsed = time.perf_counter() - start
+            stats.update(rows=rows, seconds=elapsed,
+                         rows_per_sec=rows / elapsed if elapsed > 0 else 0.0)
+        return points
+
+    if csv_path.endswith('.nc'):
+        lons, lats, values, read_stats = read_netcdf_arrays(csv_path, vectorized, digest=digest)
+    else:
+        lons, lats, values, read_stats = read_region_arrays(csv_path, vectorized, grid_index=grid_index,
+                                                            digest=digest)
+    if stats is not None:
+        stats.update(read_stats)
+    with timed_stage('points'):
+        return region_points(lons, lats, values)
+
 # Configuration
-base_path = '/Volumes/Fish/CHAZ/map/exceedance_intensity/csv/per-GCM'
+data_root = '/Volumes/Fish/CHAZ/map/exceedance_intensity'
+grid_index_file = '/Volumes/Fish/CHAZ/map/grid_index.npz'
+cache_dir = '/Volumes/Fish/CHAZ/map/extract_cache'
+json_output_file = '/Volumes/Fish/CHAZ/map/florida_all_ssp.json'
+columnar_output_file = '/Volumes/Fish/CHAZ/map/florida_all_ssp.col.json'
+cube_output_file = '/Volumes/Fish/CHAZ/map/florida_all_ssp.cube.json'
 models = ['CESM2', 'CNRM-CM6-1', 'EC-Earth3', 'IPSL-CM6A-LR', 'MIROC6', 'UKESM1-0-LL']
 ssps = ['ssp245', 'ssp370', 'ssp585']
 periods = ['base', 'fut1', 'fut2']
 
-# Extract all data
-all_data = {}
+# Pseudo-models computed across the GCMs for every SSP and period
+ENSEMBLE_STATS = ['MultiModelMean', 'MultiModelMedian', 'MultiModelMin', 'MultiModelMax',
+                  'MultiModelStd', 'MultiModelSpread']
 
-for ssp in ssps:
-    print(f"\nProcessing {ssp}...")
-    all_data[ssp] = {}
+def points_cube(point_lists):
+    """Join lists of point dicts on (lat, lon) into one array.
 
-    for model in models:
-        print(f"  {model}...", end=' ')
-        all_data[ssp][model] = {}
+    Returns (coords, cube): coords is the (n, 2) lat/lon union of all points
+    in first-seen order and cube is (len(point_lists), n, 6) with NaN where a
+    list has no point at a coordinate.
+    """
+    # Integer coordinate keys (hundredths of a degree) for an exact join
+    tables = [np.array([[p['lat'], p['lon']] + [p[rp] for rp in RP_KEYS] for p in points],
+                       dtype=np.float64).reshape(-1, 2 + len(RP_KEYS))
+              for points in point_lists]
+    keys = [np.rint(t[:, 0] * 100).astype(np.int64) * 100000 + np.rint(t[:, 1] * 100).astype(np.int64)
+            for t in tables]
+    all_keys = np.concatenate(keys)
+    unique_keys, first = np.unique(all_keys, return_index=True)
+    order = np.argsort(first)  # union in first-seen order
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    coords = np.concatenate(tables)[first[order], :2]
 
-        for period in periods:
-            # Actual filename format: TC_global_0300as_CHAZ_CESM2_base_ssp585_80ens_SD_H08_exceedance_intensity.csv
-            csv_file = f"{base_path}/{model}/{ssp}/TC_global_0300as_CHAZ_{model}_{period}_{ssp}_80ens_SD_H08_exceedance_intensity.csv"
-            if os.path.exists(csv_file):
-                points = extract_model_data(csv_file)
-                all_data[ssp][model][period] = points
-                print(f"{period}:{len(points)}", end=' ')
-            else:
-                print(f"{period}:MISSING ({csv_file})", end=' ')
-                all_data[ssp][model][period] = []
-        print()
+    cube = np.full((len(tables), len(order), len(RP_KEYS)), np.nan)
+    for m, (table, key) in enumerate(zip(tables, keys)):
+        cube[m, rank[np.searchsorted(unique_keys, key)]] = table[:, 2:]
+    return coords, cube
+
+def ensemble_statistics(model_points):
+    """Ensemble statistics across models, joined on (lat, lon).
+
+    model_points holds one list of point dicts per model (empty if missing).
+    Points are matched by coordinate rather than list position, so a missing
+    or reordered row never mixes values from different locations. The output
+    covers the union of coordinates in first-seen order; each statistic uses
+    the models that have that point. All statistics come from one pass over a
+    (model, point, rp) cube with NaN for absent points. Std is the population
+    standard deviation; Spread is max - min.
+    """
+    present = [points for points in model_points if points]
+    if not present:
+        return {name: [] for name in ENSEMBLE_STATS}
+    coords, cube = points_cube(present)
+
+    with np.errstate(invalid='ignore'):
+        n_models = np.sum(~np.isnan(cube), axis=0)
+        low, high = np.nanmin(cube, axis=0), np.nanmax(cube, axis=0)
+        results = {
+            'MultiModelMean': np.nansum(cube, axis=0) / n_models,
+            'MultiModelMedian': np.nanmedian(cube, axis=0),
+            'MultiModelMin': low,
+            'MultiModelMax': high,
+            'MultiModelStd': np.nanstd(cube, axis=0),
+            'MultiModelSpread': high - low,
+        }
+    return {name: region_points(coords[:, 1], coords[:, 0], results[name]) for name in ENSEMBLE_STATS}
+
+# Percent changes are capped so they stay within the int16 columnar encoding
+PCT_LIMIT = 1000.0
+
+def derived_layers(region_data):
+    """Add change layers to region_data ({ssp: {model: {period: points}}}) in place.
+
+    For every SSP and model (ensemble statistics included) each future
+    period gets '<period>_delta' (future - base, m/s) and '<period>_pct'
+    (percent change from base, capped at PCT_LIMIT; points with a zero base
+    are left out). Every SSP after the first also gets a pseudo-SSP
+    '<ssp>_delta' holding, for each model and raw period, that SSP minus the
+    first. Points are joined on coordinates and all layers come from one
+    pass over the (ssp, model, period, point, rp) cube; a layer only has the
+    points present on both sides. Returns the names of the added periods and
+    pseudo-SSPs.
+    """
+    ssp_names = list(region_data)
+    if not ssp_names:
+        return [], []
+    model_names = list(region_data[ssp_names[0]])
+    period_names = list(region_data[ssp_names[0]][model_names[0]])
+    base, futures = period_names[0], period_names[1:]
+    coords, cube = points_cube([region_data[ssp].get(model, {}).get(period, [])
+                                for ssp in ssp_names for model in model_names for period in period_names])
+    cube = cube.reshape(len(ssp_names), len(model_names), len(period_names), len(coords), len(RP_KEYS))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = cube[:, :, 1:] - cube[:, :, :1]
+        pct = np.clip(100 * (cube[:, :, 1:] / cube[:, :, :1] - 1), -PCT_LIMIT, PCT_LIMIT)
+        pct[np.broadcast_to(cube[:, :, :1] == 0, pct.shape)] = np.nan
+        ssp_delta = cube[1:] - cube[:1]
+
+    def layer_points(values):
+        keep = np.isfinite(values).all(axis=1)
+        return region_points(coords[keep, 1], coords[keep, 0], values[keep])
+
+    for s, ssp in enumerate(ssp_names):
+        for m, model in enumerate(model_names):
+            for f, period in enumerate(futures):
+                region_data[ssp][model][f'{period}_delta'] = layer_points(delta[s, m, f])
+                region_data[ssp][model][f'{period}_pct'] = layer_points(pct[s, m, f])
+    for s, ssp in enumerate(ssp_names[1:]):
+        region_data[f'{ssp}_delta'] = {
+            model: {period: layer_points(ssp_delta[s, m, p]) for p, period in enumerate(period_names)}
+            for m, model in enumerate(model_names)
+        }
+    return ([f'{period}_{kind}' for period in futures for kind in ('delta', 'pct')],
+            [f'{ssp}_delta' for ssp in ssp_names[1:]])
+
+# Input flavours: folder, resolution tag and extension of each product
+SOURCES = {
+    'csv': ('csv', '0300as', 'csv'),
+    'nc': ('nc', '0300as', 'nc'),
+    'raster': ('raster.nc', '0180as', 'raster.nc'),
+}
+
+def region_output_path(path, region):
+    """Output path for a region: florida_all_ssp.* becomes <region>_all_ssp.*."""
+    if region == 'florida':
+        return path
+    return os.path.join(os.path.dirname(path), os.path.basename(path).replace('florida', region, 1))
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak resident set size in MB (ru_maxrss is bytes on macOS, KB on Linux)."""
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+def counts_text(found, region_names):
+    return '/'.join(str(len(found[name])) for name in region_names)
 
-    # Compute multi-model mean for this SSP
-    print(f"  Computing Multi-Model Mean...", end=' ')
-    all_data[ssp]['MultiModelMean'] = {}
+def write_instrument_report(path, args, file_reports, run_report, wall):
+    """Write the --instrument JSON report and print the per-stage totals."""
+    totals = merge_reports(list(file_reports.values()) + [run_report])
+    report = {
+        'source': args.source, 'reader': args.reader, 'workers': args.workers,
+        'wall': wall, 'peak_rss_mb': peak_rss_mb(),
+        'workers_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN),
+        'totals': totals, 'run': run_report, 'files': file_reports,
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=1)
+
+    print(f"\nStage totals ({len(file_reports)} files extracted):")
+    for name, entry in sorted(totals['stages'].items(), key=lambda item: -item[1]['wall']):
+        print(f"  {name:<12}{entry['wall']:>9.2f} s wall {entry['cpu']:>9.2f} s CPU {entry['calls']:>8,} calls")
+    for name, n in totals['counters'].items():
+        print(f"  {name:<16}{n:>14,}")
+    print(f"Report: {path}")
+
+def csv_path_for(ssp, model, period, source='csv'):
+    # Actual filename format: TC_global_0300as_CHAZ_CESM2_base_ssp585_80ens_SD_H08_exceedance_intensity.csv
+    folder, res, ext = SOURCES[source]
+    return (f"{data_root}/{folder}/per-GCM/{model}/{ssp}/"
+            f"TC_global_{res}_CHAZ_{model}_{period}_{ssp}_80ens_SD_H08_exceedance_intensity.{ext}")
+
+def merge_reports(reports):
+    """Sum instrumentation reports (stages and counters) into one."""
+    total = {'stages': {}, 'counters': {}}
+    for report in reports:
+        for name, entry in report['stages'].items():
+            into = total['stages'].setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            for key in into:
+                into[key] += entry[key]
+        for name, n in report['counters'].items():
+            total['counters'][name] = total['counters'].get(name, 0) + n
+    return total
+
+def extract_file(csv_file, vectorized=True, reader='chunked', grid_index=None, digest=False, registry=None,
+                 instrument=False):
+    """Extract one (ssp, model, period) file; the unit of work for --workers.
+
+    Returns ({region: points}, stats): Florida only, or every region of
+    registry from a single pass over the file. With digest=True the file's
+    stat and digest (taken during the same read) are added to stats for the
+    extraction cache; with
+    instrument=True its stage timers and counters go to stats['instrument'].
+    """
+    stats = {}
+    if instrument:
+        start_instrument()
+    try:
+        if digest:
+            stats['stat'] = os.stat(csv_file)
+        if registry is not None:
+            arrays, read_stats = read_regions_arrays(csv_file, registry, digest=digest)
+            stats.update(read_stats)
+            with timed_stage('points'):
+                found = {name: region_points(*region_arrays) for name, region_arrays in arrays.items()}
+            for name, points in found.items():
+                count(f'kept_{name}', len(points))
+        else:
+            found = {'florida': extract_model_data(csv_file, vectorized=vectorized, reader=reader, stats=stats,
+                                                   grid_index=grid_index, digest=digest)}
+        count('kept', sum(len(points) for points in found.values()))
+    finally:
+        report = stop_instrument() if instrument else None
+    if report is not None:
+        stats['instrument'] = report
+    return found, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scalar-landmask', action='store_true',
+                        help='Use the per-row point_in_polygon land test instead of the vectorized mask')
+    parser.add_argument('--source', choices=sorted(SOURCES), default='csv',
+                        help='Input product: csv (default), nc point files or raster.nc grids (needs netCDF4)')
+    parser.add_argument('--reader', choices=['chunked', 'lines'], default='chunked',
+                        help='CSV ingest engine: streaming binary chunks (default) or the line-by-line parser')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Extract files in a process pool of this many workers (default: 1, serial)')
+    parser.add_argument('--grid-index', default=grid_index_file,
+                        help='Cached row indices of Florida points on the shared CHAZ grid')
+    parser.add_argument('--no-grid-index', action='store_true',
+                        help='Always run the bbox and land tests instead of reusing the cached grid index')
+    parser.add_argument('--regions', nargs='+', metavar='PATH',
+                        help='Also extract these regions (GeoJSON files or directories of them) in the same '
+                             'pass over each CSV; each region gets its own <region>_all_ssp output')
+    parser.add_argument('--format', choices=['columnar', 'json'], default='columnar',
+                        help='Output florida_all_ssp.col.json (default) or the legacy list-of-dicts florida_all_ssp.json')
+    parser.add_argument('--encoding', choices=['int16', 'float32'], default='int16',
+                        help='Columnar value encoding: int16 tenths of m/s (default, lossless) or float32')
+    parser.add_argument('--no-cube', action='store_true',
+                        help='Skip the memory-mapped hazard cube (florida_all_ssp.cube.json plus .npy arrays) '
+                             'written next to the output')
+    parser.add_argument('--derived', action='store_true',
+                        help='Add change layers (future - base, percent change, SSP differences) for every model '
+                             'and ensemble statistic; off by default as they add about four times the scenarios')
+    parser.add_argument('--cache-dir', default=cache_dir,
+                        help='Extraction cache: manifest of input size/mtime/hash plus extracted points per file')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Re-extract every file and recompute every ensemble, ignoring the cache')
+    parser.add_argument('--instrument', metavar='REPORT',
+                        help='Write per-file stage timers (wall/CPU) and counters to this JSON report; '
+                             'with --workers, stage times are summed over the workers')
+    parser.add_argument('--profile', nargs=3, metavar=('SSP', 'MODEL', 'PERIOD'),
+                        help='Run cProfile on the extraction of this one file, print the hot spots and exit')
+    parser.add_argument('--profile-out', metavar='PATH',
+                        help='With --profile, also save the raw profile (for pstats/snakeviz)')
+    args = parser.parse_args()
+    vectorized = not args.scalar_landmask
+    run_start = time.perf_counter()
+
+    # Florida alone keeps the grid-index path; extra regions share one prepared pass
+    regions = [florida_region()]
+    registry = None
+    if args.regions:
+        if args.source != 'csv' or args.reader != 'chunked' or args.scalar_landmask:
+            parser.error('--regions needs --source csv, the chunked reader and the vectorized land mask')
+        regions += load_regions(args.regions)
+        names = [region['name'] for region in regions]
+        if len(set(names)) != len(names):
+            parser.error(f'duplicate region names: {names}')
+        registry = region_registry(regions)
+        print(f"Regions: {', '.join(names)}")
+    region_names = [region['name'] for region in regions]
+    region_digests = {region['name']: region['digest'] for region in regions}
+
+    use_grid_index = args.source == 'csv' and args.reader == 'chunked' and not args.no_grid_index and not registry
+    grid_index = load_grid_index(args.grid_index) if use_grid_index else None
+
+    if args.profile:
+        csv_file = csv_path_for(*args.profile, args.source)
+        if not os.path.exists(csv_file):
+            parser.error(f'no such file: {csv_file}')
+        profiler = cProfile.Profile()
+        found, stats = profiler.runcall(extract_file, csv_file, vectorized, args.reader, grid_index,
+                                        registry=registry)
+        print(f"{csv_file}: {counts_text(found, region_names)} points, {stats['rows']:,} rows "
+              f"in {stats['seconds']:.2f} s")
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(30)
+        if args.profile_out:
+            profiler.dump_stats(args.profile_out)
+            print(f"Profile: {args.profile_out}")
+        return
+
+    use_cache = not args.no_cache
+    if use_cache:
+        os.makedirs(args.cache_dir, exist_ok=True)
+    manifest = load_manifest(args.cache_dir) if use_cache else {'files': {}, 'ensembles': {}}
+
+    # Unchanged files are served from the cache; only the rest are extracted
+    cached = {}
+    if use_cache:
+        for ssp in ssps:
+            for model in models:
+                for period in periods:
+                    csv_file = csv_path_for(ssp, model, period, args.source)
+                    if os.path.exists(csv_file):
+                        found = cached_file_points(manifest, args.cache_dir, csv_file, region_digests)
+                        if found is not None:
+                            cached[(ssp, model, period)] = found
+
+    # In parallel mode every file to extract is queued up front; results are
+    # still consumed in ssp/model/period order so the report and all_data
+    # match a serial run, and each SSP's mean waits for its own models only.
+    instrument = bool(args.instrument)
+    run_report = {'stages': {}, 'counters': {}} if instrument else None
+    file_reports = {}
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    jobs = {}
+    if executor:
+        for ssp in ssps:
+            for model in models:
+                for period in periods:
+                    csv_file = csv_path_for(ssp, model, period, args.source)
+                    if os.path.exists(csv_file) and (ssp, model, period) not in cached:
+                        jobs[(ssp, model, period)] = executor.submit(
+                            extract_file, csv_file, vectorized, args.reader, grid_index, use_cache, registry,
+                            instrument)
+
+    # Extract all data, one all_data structure per region
+    all_data = {name: {} for name in region_names}
+
+    def counts(found):
+        return counts_text(found, region_names)
+
+    for ssp in ssps:
+        print(f"\nProcessing {ssp}...")
+        for name in region_names:
+            all_data[name][ssp] = {}
 
-    for period in periods:
-        # Get reference points from first model with data
-        ref_points = None
         for model in models:
-            if all_data[ssp][model][period]:
-                ref_points = all_data[ssp][model][period]
-                break
+            print(f"  {model}...", end=' ')
+            for name in region_names:
+                all_data[name][ssp][model] = {}
 
-        if ref_points:
-            mean_points = []
-            for i, ref_pt in enumerate(ref_points):
-                mean_pt = {
-                    'lat': ref_pt['lat'],
-                    'lon': ref_pt['lon']
-                }
-                for rp in ['rp10', 'rp25', 'rp50', 'rp100', 'rp250', 'rp1000']:
-                    values = []
-                    for model in models:
-                        if all_data[ssp][model][period] and i < len(all_data[ssp][model][period]):
-                            values.append(all_data[ssp][model][period][i][rp])
-                    if values:
-                        mean_pt[rp] = round(sum(values) / len(values), 1)
+            for period in periods:
+                csv_file = csv_path_for(ssp, model, period, args.source)
+                if (ssp, model, period) in cached:
+                    found = cached[(ssp, model, period)]
+                    print(f"{period}:{counts(found)} (cached)", end=' ')
+                elif os.path.exists(csv_file):
+                    if executor:
+                        found, stats = jobs[(ssp, model, period)].result()
                     else:
-                        mean_pt[rp] = 0
-                mean_points.append(mean_pt)
-            all_data[ssp]['MultiModelMean'][period] = mean_points
-            print(f"{period}:{len(mean_points)}", end=' ')
+                        found, stats = extract_file(csv_file, vectorized, args.reader, grid_index, use_cache,
+                                                    registry, instrument)
+                    if instrument:
+                        file_reports[csv_file] = dict(stats.pop('instrument'), seconds=stats['seconds'])
+                    if use_cache:
+                        store_file_points(manifest, args.cache_dir, csv_file, found,
+                                          stats['digest'], stats['stat'], region_digests)
+                    membership = stats.pop('membership', None)
+                    if membership is not None and use_grid_index:
+                        # Grid changed or first run: later files reuse the rebuilt index
+                        grid_index = membership
+                        save_grid_index(args.grid_index, grid_index)
+                    print(f"{period}:{counts(found)} ({stats['rows_per_sec'] / 1e6:.2f}M rows/s)", end=' ')
+                else:
+                    print(f"{period}:MISSING ({csv_file})", end=' ')
+                    found = {name: [] for name in region_names}
+                    manifest['files'].pop(csv_file, None)
+                for name in region_names:
+                    all_data[name][ssp][model][period] = found[name]
+            print()
+
+        # Ensemble statistics for this SSP, joined on coordinates
+        print(f"  Computing ensemble statistics...", end=' ')
+        for name in region_names:
+            for stat in ENSEMBLE_STATS:
+                all_data[name][ssp][stat] = {}
+
+        for period in periods:
+            csv_files = [csv_path_for(ssp, model, period, args.source) for model in models]
+            notes = []
+            for name in region_names:
+                # Reuse the cached statistics unless one of this SSP/period's inputs changed
+                key = ensemble_cache_key(manifest, csv_files, region_digests[name])
+                entry = manifest['ensembles'].get(f'{name}/{ssp}/{period}')
+                stats = None
+                if use_cache and entry and entry['key'] == key:
+                    stats = _load_points(os.path.join(args.cache_dir, entry['cache']), ENSEMBLE_STATS)
+                notes.append(stats is not None)
+                if stats is None:
+                    with timed_stage('mean', run_report):
+                        stats = ensemble_statistics([all_data[name][ssp][model][period] for model in models])
+                    if use_cache:
+                        cache_name = f'ensemble_{name}_{ssp}_{period}.npz'
+                        _save_points(os.path.join(args.cache_dir, cache_name), **stats)
+                        manifest['ensembles'][f'{name}/{ssp}/{period}'] = {'key': key, 'cache': cache_name}
+                for stat in ENSEMBLE_STATS:
+                    all_data[name][ssp][stat][period] = stats[stat]
+            means = {name: all_data[name][ssp]['MultiModelMean'][period] for name in region_names}
+            note = ' (cached)' if all(notes) else ''
+            print(f"{period}:{counts(means)}{note}", end=' ')
+        print()
+
+    if executor:
+        executor.shutdown()
+    if use_cache:
+        save_manifest(args.cache_dir, manifest)
+    print(f"\nExtraction ({args.source}): {time.perf_counter() - run_start:.1f} s wall, "
+          f"peak RSS {peak_rss_mb():.0f} MB (workers {peak_rss_mb(resource.RUSAGE_CHILDREN):.0f} MB)")
+
+    for name in region_names:
+        region_data = all_data[name]
+        if args.derived:
+            with timed_stage('derived', run_report):
+                derived_periods, derived_ssps = derived_layers(region_data)
+            print(f"\nChange layers ({name}): {', '.join(derived_periods + derived_ssps)}")
+
+        # Save: columnar by default, or the legacy list-of-dicts JSON
+        if args.format == 'columnar':
+            output_file = region_output_path(columnar_output_file, name)
+            with timed_stage('serialize', run_report):
+                write_columnar(output_file, region_data, encoding=args.encoding)
         else:
-            all_data[ssp]['MultiModelMean'][period] = []
-            print(f"{period}:0", end=' ')
-    print()
-
-# Save to JSON
-output_file = '/Volumes/Fish/CHAZ/map/florida_all_ssp.json'
-with open(output_file, 'w') as f:
-    json.dump(all_data, f)
-
-# Report size
-file_size = os.path.getsize(output_file) / (1024 * 1024)
-print(f"\nOutput: {output_file}")
-print(f"Size: {file_size:.1f} MB")
-
-# Count total points
-total_points = 0
-for ssp in all_data:
-    for model in all_data[ssp]:
-        for period in all_data[ssp][model]:
-            total_points += len(all_data[ssp][model][period])
-print(f"Total data points: {total_points:,}")
+            output_file = region_output_path(json_output_file, name)
+            with timed_stage('serialize', run_report), open(output_file, 'w') as f:
+                json.dump(region_data, f)
+
+        # Report size
+        file_size = os.path.getsize(output_file) / (1024 * 1024)
+        print(f"\nOutput: {output_file}")
+        print(f"Size: {file_size:.1f} MB")
+
+        # The same data as one float32 (ssp, model, period, point, rp) cube for memory-mapped reads
+        if not args.no_cube:
+            cube_file = region_output_path(cube_output_file, name)
+            with timed_stage('cube', run_report):
+                cube_paths = write_cube(cube_file, region_data)
+            print(f"Cube: {cube_file} ({sum(os.path.getsize(p) for p in cube_paths) / (1024 * 1024):.1f} MB)")
+
+        # Count total points
+        total_points = 0
+        for ssp in region_data:
+            for model in region_data[ssp]:
+                for period in region_data[ssp][model]:
+                    total_points += len(region_data[ssp][model][period])
+        print(f"Total data points: {total_points:,}")
+
+    if instrument:
+        write_instrument_report(args.instrument, args, file_reports, run_report,
+                                time.perf_counter() - run_start)
+
+
+if __name__ == '__main__':
+    main()
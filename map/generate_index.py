@@ -1,16 +1,554 @@
 #!/usr/bin/env python3
 """Generate index.html with SSP scenario dropdown and tooltips."""
 
+import argparse
+import base64
+import functools
+import itertools
 import json
+import os
 
-# Load the data
-with open('florida_all_ssp.json', 'r') as f:
-    all_data = json.load(f)
+import numpy as np
+
+from columnar_format import decode_coordinates, decode_scenario, load_hazard_data
+from extract_all_ssp import florida_land_mask
+from hazard_curves import CURVE_METHODS, fit_curves, return_period_of, wind_at
+from hazard_layers import (LAYER_SCALES, RP_LAYER_LIMIT, contour_layers, heatmap_layers, layer_scale, lod_pyramid,
+                           spatial_index)
+from page_output import brotli, iter_json, write_streamed
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--input', default=None,
+                    help='Extracted data: florida_all_ssp.col.json (columnar), florida_all_ssp.cube.json (hazard cube) '
+                         'or legacy florida_all_ssp.json')
+parser.add_argument('--shards', metavar='DIR', default=None,
+                    help='Write one data file per (ssp, model, period) under DIR, next to index.html, '
+                         'and fetch them on demand instead of embedding all data (serve over HTTP)')
+parser.add_argument('--client-layers', action='store_true',
+                    help='Skip build-time heatmap and contour layers and let the page compute them (smaller output)')
+parser.add_argument('--no-lod', action='store_true',
+                    help='Skip the circle view\'s zoom-level point pyramid and draw every point at every zoom')
+parser.add_argument('--inline-contours', action='store_true',
+                    help='Embed build-time contour layers in index.html when not sharding (by default they only '
+                         'go into --shards files, fetched with their scenario, and embedded pages compute them)')
+parser.add_argument('--no-precompress', action='store_true',
+                    help='Skip the .gz / .br siblings written next to index.html and each shard')
+parser.add_argument('--best-compression', action='store_true',
+                    help='Write the .gz / .br siblings at maximum levels (gzip 9, brotli 11): smallest files, '
+                         'several times slower')
+parser.add_argument('--curve-rps', type=float, nargs='*', default=[], metavar='YEARS',
+                    help='Extra return periods read off fitted hazard curves, e.g. 200 500 (default: none)')
+parser.add_argument('--curve-winds', type=float, nargs='*', default=[], metavar='MS',
+                    help='Wind speeds (m/s) whose return period is read off the curves, e.g. 50 (default: none)')
+parser.add_argument('--curve-method', choices=CURVE_METHODS, default='loglinear',
+                    help='Hazard curve fit for wind scenarios (default: loglinear); change layers always '
+                         'use loglinear')
+parser.add_argument('--contour-tolerance', type=float, default=0.0,
+                    help='Douglas-Peucker tolerance in degrees for build-time contours (default: 0, no simplification)')
+args = parser.parse_args()
+input_file = args.input or ('florida_all_ssp.col.json' if os.path.exists('florida_all_ssp.col.json')
+                            else 'florida_all_ssp.json')
+
+# Load the data (legacy list-of-dicts files are converted to columnar)
+hazard_data = load_hazard_data(input_file)
 
 # Count points (use ssp585/CESM2/base as reference)
-num_points = len(all_data['ssp585']['CESM2']['base'])
+num_points = hazard_data['data']['ssp585']['CESM2']['base']['n']
+
+# Hazard-curve columns (see hazard_curves): winds at the extra return periods
+# for every scenario, then return periods of the wind speeds for wind
+# scenarios. Stored as int16 per entry, after the six columns: winds in tenths
+# of m/s like the values, return periods as CURVE_RP_STEPS steps per decade
+# of log10(years), NaN as CURVE_MISSING. The page offers them as extra return
+# periods.
+CURVE_RP_STEPS = 5000
+CURVE_MISSING = -32768
+
+
+def quantize_curves(columns, forward):
+    """int16 codes of curve columns: the first `forward` are winds, the rest return periods."""
+    codes = np.empty(columns.shape)
+    codes[:, :forward] = columns[:, :forward] * 10
+    with np.errstate(divide='ignore', invalid='ignore'):
+        codes[:, forward:] = np.log10(columns[:, forward:]) * CURVE_RP_STEPS
+    codes = np.clip(np.rint(codes), CURVE_MISSING + 1, 32767)
+    return np.where(np.isnan(codes), CURVE_MISSING, codes)
+
+
+if args.curve_rps or args.curve_winds:
+    curve_keys = [f'rp{years:g}' for years in args.curve_rps] + [f'rp_of_{wind:g}' for wind in args.curve_winds]
+    hazard_data['curves'] = {'method': args.curve_method, 'rps': args.curve_rps, 'winds': args.curve_winds,
+                             'keys': curve_keys, 'rp_limit': RP_LAYER_LIMIT, 'rp_steps': CURVE_RP_STEPS,
+                             'missing': CURVE_MISSING}
+
+# Contours are the largest build-time layer. They travel with their scenario's
+# shard; an embedded page would carry them for every scenario up front, so it
+# computes them in the browser instead unless --inline-contours asks for them.
+build_contours = bool(args.shards) or args.inline_contours
+
+
+def scenario_entry(ssp, model, period):
+    """A scenario's data entry with its curve columns and build-time layers added.
+
+    Called while the page or the scenario's shard is being written, so only
+    one scenario's layers are held at a time. Layers cover the six return
+    periods, then any curve columns, change layers and return periods on
+    their own colour scales.
+    """
+    entry = dict(hazard_data['data'][ssp][model][period])
+    lats, lons, values = decode_scenario(hazard_data, ssp, model, period)
+    scale = layer_scale(ssp, period)
+    groups = [(hazard_data['rp_keys'], values, scale)]
+
+    if 'curves' in hazard_data:
+        wind = scale == 'wind'
+        curves = fit_curves(values, args.curve_method if wind else 'loglinear')
+        columns = [wind_at(curves, args.curve_rps)]
+        if wind:
+            columns.append(np.minimum(return_period_of(curves, args.curve_winds), RP_LAYER_LIMIT))
+        columns = np.hstack(columns)
+        forward = len(args.curve_rps)
+        codes = quantize_curves(columns, forward)
+        entry['curves'] = base64.b64encode(codes.T.astype('<i2').tobytes()).decode('ascii')
+        groups.append((curve_keys[:forward], columns[:, :forward], scale))
+        if columns.shape[1] > forward:
+            groups.append((curve_keys[forward:], columns[:, forward:], 'rp'))
+    groups = [group for group in groups if group[0]]
+
+    # Heatmap overlays and contour lines
+    if not args.client_layers:
+        for keys, values, scale in groups:
+            layers = heatmap_layers(lats, lons, values, keys, scale=scale)
+            if layers:
+                entry.setdefault('heatmap', {'bounds': layers['bounds'], 'images': {}})
+                entry['heatmap']['images'].update(layers['images'])
+            if not build_contours:
+                continue
+            layers = contour_layers(lats, lons, values, keys,
+                                    land_mask=florida_land_mask, tolerance=args.contour_tolerance,
+                                    thresholds=LAYER_SCALES[scale]['contours'])
+            if layers:
+                entry.setdefault('contours', {}).update(layers)
+
+    # Zoom-level point pyramid for the circle view; the strongest change is the
+    # largest either way, and the strongest return period the shortest. Its
+    # levels are small next to the values, so embedded pages carry it too.
+    if not args.no_lod:
+        for keys, values, scale in groups:
+            pyramid = lod_pyramid(lats, lons, -values if scale == 'rp' else values, keys,
+                                  magnitude=scale in ('delta', 'pct'))
+            if not pyramid:
+                continue
+            if 'lod' not in entry:
+                entry['lod'] = pyramid
+                continue
+            # Same points, so the same levels
+            for level, extra in zip(entry['lod']['levels'], pyramid['levels']):
+                level['points'].update(extra['points'])
+    return entry
+
+
+# Bucket index over the shared coordinates for the page's IDW and hover lookups
+hazard_data['spatial_index'] = spatial_index(*decode_coordinates(hazard_data))
+
+# Sharded mode: the page embeds only the header and coordinates, and each
+# scenario's entry is built, written and dropped in turn
+if args.shards:
+    page_data = {key: value for key, value in hazard_data.items() if key != 'data'}
+    page_data['shard_base'] = args.shards.rstrip('/')
+    for ssp, by_model in hazard_data['data'].items():
+        for model, by_period in by_model.items():
+            shard_dir = os.path.join(args.shards, ssp, model)
+            os.makedirs(shard_dir, exist_ok=True)
+            for period in by_period:
+                entry = scenario_entry(ssp, model, period)
+                write_streamed(os.path.join(shard_dir, f'{period}.json'), iter_json(entry),
+                               precompress=not args.no_precompress, best=args.best_compression)
+else:
+    # Entries are built as iter_json reaches them while index.html is written
+    page_data = dict(hazard_data, data={
+        ssp: {model: {period: functools.partial(scenario_entry, ssp, model, period) for period in by_period}
+              for model, by_period in by_model.items()}
+        for ssp, by_model in hazard_data['data'].items()})
+
+# Heatmap and contour computation for pages without build-time layers; the
+# page starts it as a Web Worker from the script element holding this text
+layer_worker_js = '''
+        // Client-side heatmap grids and contours, computed off the page's main
+        // thread (see requestLayer). The page sends {type: 'init'} with the shared
+        // coordinates and spatial index once, then one {type: 'heatmap' | 'contour'}
+        // job at a time with the scenario's values for a return period and its
+        // colour scale; results come back as transferable typed arrays.
+        let coordLat = null;
+        let coordLon = null;
+        let spatialIndex = null;
+        let bucketOffsets = null;
+        let bucketIds = null;
+
+        // The job's LAYER_SCALES entry: colour bins and contour thresholds
+        let scale = null;
+
+        // The job's scenario: one value per point, the shared coordinate of each
+        // point (null when they are the same) and the point at each coordinate
+        let pointValues = null;
+        let coordOfPoint = null;
+        let pointOfCoord = null;
+
+        // Florida land polygon for boundary checking
+        const FLORIDA_POLYGON = [
+            [-87.5, 30.95], [-87.5, 30.1], [-86.5, 30.1], [-85.5, 29.7],
+            [-85.0, 29.1], [-84.0, 29.6], [-83.5, 29.0], [-82.8, 28.0],
+            [-82.7, 27.5], [-82.1, 26.5], [-81.5, 25.9], [-80.9, 25.1],
+            [-80.1, 25.1], [-80.1, 26.0], [-80.1, 27.0], [-80.3, 28.0],
+            [-80.6, 28.5], [-81.2, 29.5], [-81.3, 30.1], [-81.5, 30.7],
+            [-82.0, 30.6], [-82.5, 30.4], [-83.0, 30.5], [-84.0, 30.5],
+            [-85.0, 30.95], [-87.5, 30.95]
+        ];
+        const KEYS_POLYGON = [
+            [-82.0, 24.5], [-81.5, 24.5], [-80.3, 25.0], [-80.0, 25.2],
+            [-80.5, 25.5], [-81.0, 25.2], [-81.8, 24.7], [-82.0, 24.5]
+        ];
+
+        // Point-in-polygon test
+        function pointInPolygon(lon, lat, polygon) {
+            let inside = false;
+            const n = polygon.length;
+            let p1x = polygon[0][0], p1y = polygon[0][1];
+            for (let i = 1; i <= n; i++) {
+                const p2x = polygon[i % n][0], p2y = polygon[i % n][1];
+                if (lat > Math.min(p1y, p2y)) {
+                    if (lat <= Math.max(p1y, p2y)) {
+                        if (lon <= Math.max(p1x, p2x)) {
+                            if (p1y !== p2y) {
+                                const xinters = (lat - p1y) * (p2x - p1x) / (p2y - p1y) + p1x;
+                                if (p1x === p2x || lon <= xinters) {
+                                    inside = !inside;
+                                }
+                            }
+                        }
+                    }
+                }
+                p1x = p2x; p1y = p2y;
+            }
+            return inside;
+        }
+
+        function isFloridaLand(lon, lat) {
+            return pointInPolygon(lon, lat, FLORIDA_POLYGON) || pointInPolygon(lon, lat, KEYS_POLYGON);
+        }
+
+        function pointLat(i) {
+            return coordLat[coordOfPoint ? coordOfPoint[i] : i];
+        }
+
+        function pointLon(i) {
+            return coordLon[coordOfPoint ? coordOfPoint[i] : i];
+        }
+
+        // Indices of the points in the 3x3 buckets around (lat, lon), ascending, as
+        // the page's nearbyPoints()
+        function nearbyPoints(lat, lon, out) {
+            out.length = 0;
+            if (!spatialIndex) {
+                for (let i = 0; i < pointValues.length; i++) out.push(i);
+                return out;
+            }
+            const S = spatialIndex;
+            const bx = Math.floor((lon - S.lon0) / S.cell);
+            const by = Math.floor((lat - S.lat0) / S.cell);
+            for (let y = Math.max(by - 1, 0); y <= Math.min(by + 1, S.ny - 1); y++) {
+                for (let x = Math.max(bx - 1, 0); x <= Math.min(bx + 1, S.nx - 1); x++) {
+                    const b = y * S.nx + x;
+                    for (let k = bucketOffsets[b]; k < bucketOffsets[b + 1]; k++) {
+                        const p = pointOfCoord ? pointOfCoord[bucketIds[k]] : bucketIds[k];
+                        if (p >= 0) out.push(p);
+                    }
+                }
+            }
+            return out.sort((a, b) => a - b);
+        }
+
+        // Compute data bounds from the points
+        function getDataBounds() {
+            let latMin = Infinity, latMax = -Infinity, lonMin = Infinity, lonMax = -Infinity;
+            for (let i = 0; i < pointValues.length; i++) {
+                const lat = pointLat(i), lon = pointLon(i);
+                if (lat < latMin) latMin = lat;
+                if (lat > latMax) latMax = lat;
+                if (lon < lonMin) lonMin = lon;
+                if (lon > lonMax) lonMax = lon;
+            }
+            return { latMin, latMax, lonMin, lonMax };
+        }
+
+        // IDW grid generation (similar to KDE approach but for scalar values)
+        function idwGrid(NX = 150, NY = 150) {
+            const bounds = getDataBounds();
+            const padding = 0.05; // Small padding in degrees
+            const latMin = bounds.latMin - padding;
+            const latMax = bounds.latMax + padding;
+            const lonMin = bounds.lonMin - padding;
+            const lonMax = bounds.lonMax + padding;
+
+            const dx = (lonMax - lonMin) / (NX - 1);
+            const dy = (latMax - latMin) / (NY - 1);
+
+            const power = 2;
+            const maxDist = 0.15; // degrees - tight constraint to data
+
+            const raw = new Float64Array(NX * NY);
+            const valid = new Uint8Array(NX * NY);
+            const candidates = [];
+
+            for (let iy = 0; iy < NY; iy++) {
+                const lat = latMin + iy * dy;
+                for (let ix = 0; ix < NX; ix++) {
+                    const lon = lonMin + ix * dx;
+
+                    let weightSum = 0;
+                    let valueSum = 0;
+                    let nearCount = 0;
+
+                    for (const i of nearbyPoints(lat, lon, candidates)) {
+                        const dLat = lat - pointLat(i);
+                        const dLon = lon - pointLon(i);
+                        const dist = Math.sqrt(dLat * dLat + dLon * dLon);
+
+                        if (dist < maxDist) {
+                            nearCount++;
+                            if (dist < 0.001) {
+                                weightSum = 1;
+                                valueSum = pointValues[i];
+                                break;
+                            }
+                            const weight = 1 / Math.pow(dist, power);
+                            weightSum += weight;
+                            valueSum += weight * pointValues[i];
+                        }
+                    }
+
+                    const idx = iy * NX + ix;
+                    if (nearCount >= 2 && weightSum > 0) {
+                        raw[idx] = valueSum / weightSum;
+                        valid[idx] = 1;
+                    } else {
+                        raw[idx] = 0;
+                        valid[idx] = 0;
+                    }
+                }
+            }
+
+            return { raw, valid, NX, NY, lonMin, latMin, dx, dy };
+        }
+
+        // Color function: the bin above the highest threshold reached
+        function getColorRGB(value) {
+            const thresholds = scale.thresholds;
+            let bin = thresholds.length;
+            while (bin > 0 && !(value >= thresholds[bin - 1])) bin--;
+            return scale.rgb[bin];
+        }
+
+        // RGBA pixels of a grid (flip Y for canvas coordinates)
+        function heatmapPixels(G) {
+            const data = new Uint8ClampedArray(G.NX * G.NY * 4);
+            for (let iy = 0; iy < G.NY; iy++) {
+                for (let ix = 0; ix < G.NX; ix++) {
+                    const srcIdx = iy * G.NX + ix;
+                    const dstIdx = ((G.NY - 1 - iy) * G.NX + ix) * 4;
+
+                    if (G.valid[srcIdx]) {
+                        const [r, g, b] = getColorRGB(G.raw[srcIdx]);
+                        data[dstIdx] = r;
+                        data[dstIdx + 1] = g;
+                        data[dstIdx + 2] = b;
+                        data[dstIdx + 3] = 180;
+                    }
+                }
+            }
+            return data;
+        }
+
+        // Linear interpolation for contour edge crossing (from genesis-codex)
+        function contourInterpolate(t, vA, vB, xA, yA, xB, yB) {
+            const d = vB - vA;
+            if (Math.abs(d) < 1e-12) return [(xA + xB) / 2, (yA + yB) / 2];
+            const s = (t - vA) / d;
+            return [xA + s * (xB - xA), yA + s * (yB - yA)];
+        }
+
+        // Marching squares segment extraction (from genesis-codex)
+        function buildSegments(field, valid, NX, NY, t, lonMin, latMin, dx, dy) {
+            const get = (ix, iy) => field[iy * NX + ix];
+            const isValid = (ix, iy) => valid[iy * NX + ix];
+            const segs = [];
+
+            for (let iy = 0; iy < NY - 1; iy++) {
+                for (let ix = 0; ix < NX - 1; ix++) {
+                    // Skip if any corner is invalid
+                    if (!isValid(ix, iy) || !isValid(ix + 1, iy) ||
+                        !isValid(ix, iy + 1) || !isValid(ix + 1, iy + 1)) continue;
+
+                    const tl = get(ix, iy), tr = get(ix + 1, iy);
+                    const br = get(ix + 1, iy + 1), bl = get(ix, iy + 1);
+
+                    let idx = 0;
+                    if (tl >= t) idx |= 1;
+                    if (tr >= t) idx |= 2;
+                    if (br >= t) idx |= 4;
+                    if (bl >= t) idx |= 8;
+
+                    if (idx === 0 || idx === 15) continue;
+
+                    const top = contourInterpolate(t, tl, tr, ix, iy, ix + 1, iy);
+                    const right = contourInterpolate(t, tr, br, ix + 1, iy, ix + 1, iy + 1);
+                    const bottom = contourInterpolate(t, bl, br, ix, iy + 1, ix + 1, iy + 1);
+                    const left = contourInterpolate(t, tl, bl, ix, iy, ix, iy + 1);
+
+                    const center = (tl + tr + br + bl) / 4;
+
+                    switch (idx) {
+                        case 1: case 14: segs.push([left, top]); break;
+                        case 2: case 13: segs.push([top, right]); break;
+                        case 3: case 12: segs.push([left, right]); break;
+                        case 4: case 11: segs.push([right, bottom]); break;
+                        case 6: case 9: segs.push([top, bottom]); break;
+                        case 7: case 8: segs.push([bottom, left]); break;
+                        case 5:
+                            if (center >= t) { segs.push([top, right]); segs.push([bottom, left]); }
+                            else { segs.push([left, top]); segs.push([right, bottom]); }
+                            break;
+                        case 10:
+                            if (center >= t) { segs.push([left, top]); segs.push([right, bottom]); }
+                            else { segs.push([top, right]); segs.push([bottom, left]); }
+                            break;
+                    }
+                }
+            }
+
+            // Convert grid coordinates to lat/lon and filter to Florida land
+            const result = [];
+            for (const seg of segs) {
+                const lat1 = latMin + seg[0][1] * dy;
+                const lon1 = lonMin + seg[0][0] * dx;
+                const lat2 = latMin + seg[1][1] * dy;
+                const lon2 = lonMin + seg[1][0] * dx;
+                // Check midpoint is on Florida land
+                const midLat = (lat1 + lat2) / 2;
+                const midLon = (lon1 + lon2) / 2;
+                if (isFloridaLand(midLon, midLat)) {
+                    result.push([[lat1, lon1], [lat2, lon2]]);
+                }
+            }
+            return result;
+        }
+
+        // Stitch segments into continuous polylines (from genesis-codex)
+        function stitchSegments(segs) {
+            const key = (p) => p[0].toFixed(4) + "," + p[1].toFixed(4);
+            const buckets = new Map();
+
+            segs.forEach((s, i) => {
+                const k1 = key(s[0]), k2 = key(s[1]);
+                if (!buckets.has(k1)) buckets.set(k1, []);
+                if (!buckets.has(k2)) buckets.set(k2, []);
+                buckets.get(k1).push(i);
+                buckets.get(k2).push(i);
+            });
+
+            const used = new Array(segs.length).fill(false);
+            const polylines = [];
+
+            function takeChain(startIdx) {
+                const chain = [];
+                used[startIdx] = true;
+                let a = segs[startIdx][0], b = segs[startIdx][1];
+                chain.push(a, b);
+                let cur = b;
+
+                while (true) {
+                    const k = key(cur);
+                    const cand = buckets.get(k) || [];
+                    let nextIdx = -1, flip = false;
+
+                    for (let j of cand) {
+                        if (used[j]) continue;
+                        const s = segs[j];
+                        const k0 = key(s[0]), k1 = key(s[1]);
+                        if (k0 === k) { nextIdx = j; flip = false; break; }
+                        if (k1 === k) { nextIdx = j; flip = true; break; }
+                    }
+
+                    if (nextIdx < 0) break;
+                    used[nextIdx] = true;
+                    const s = segs[nextIdx];
+                    const nextPoint = flip ? s[0] : s[1];
+                    chain.push(nextPoint);
+                    cur = nextPoint;
+                    if (key(cur) === key(chain[0])) break; // closed loop
+                }
+                return chain;
+            }
+
+            for (let i = 0; i < segs.length; i++) {
+                if (used[i]) continue;
+                polylines.push(takeChain(i));
+            }
+            return polylines;
+        }
 
-html_content = f'''<!DOCTYPE html>
+
+        // Contour polylines per threshold: [lat, lon] pairs of every chain packed
+        // into one array, plus the number of points in each chain
+        function contourLines(G) {
+            const lines = [];
+            scale.contours.forEach(threshold => {
+                const segments = buildSegments(G.raw, G.valid, G.NX, G.NY, threshold,
+                    G.lonMin, G.latMin, G.dx, G.dy);
+                if (segments.length === 0) return;
+                const polylines = stitchSegments(segments);
+                const points = new Float64Array(2 * polylines.reduce((sum, chain) => sum + chain.length, 0));
+                const lengths = new Int32Array(polylines.length);
+                let k = 0;
+                polylines.forEach((chain, c) => {
+                    lengths[c] = chain.length;
+                    chain.forEach(p => { points[k++] = p[0]; points[k++] = p[1]; });
+                });
+                lines.push({ threshold, points, lengths });
+            });
+            return lines;
+        }
+
+        self.onmessage = e => {
+            const msg = e.data;
+            if (msg.type === 'init') {
+                coordLat = msg.lat;
+                coordLon = msg.lon;
+                spatialIndex = msg.index;
+                bucketOffsets = msg.offsets;
+                bucketIds = msg.ids;
+                return;
+            }
+            scale = msg.scale;
+            pointValues = msg.values;
+            coordOfPoint = msg.coordOfPoint;
+            pointOfCoord = msg.pointOfCoord;
+            const G = idwGrid(msg.NX, msg.NY);
+            if (msg.type === 'heatmap') {
+                const pixels = heatmapPixels(G);
+                const bounds = [[G.latMin, G.lonMin], [G.latMin + G.NY * G.dy, G.lonMin + G.NX * G.dx]];
+                self.postMessage({ id: msg.id, NX: G.NX, NY: G.NY, pixels, bounds }, [pixels.buffer]);
+            } else {
+                const lines = contourLines(G);
+                const buffers = [];
+                lines.forEach(line => buffers.push(line.points.buffer, line.lengths.buffer));
+                self.postMessage({ id: msg.id, lines }, buffers);
+            }
+        };
+'''
+
+# The page is streamed as prefix, data and suffix; the data JSON is never held whole
+html_prefix = f'''<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -137,19 +675,24 @@ html_content = f'''<!DOCTYPE html>
                 <strong>SSP Scenarios</strong> (Shared Socioeconomic Pathways) represent different future emissions trajectories:<br><br>
                 <strong>SSP245:</strong> Moderate mitigation, ~2.7°C warming by 2100<br>
                 <strong>SSP370:</strong> Medium-high emissions, ~3.6°C warming<br>
-                <strong>SSP585:</strong> High emissions (fossil-fueled), ~4.4°C warming
+                <strong>SSP585:</strong> High emissions (fossil-fueled), ~4.4°C warming<br><br>
+                <strong>Differences:</strong> one SSP minus SSP245 for the same model and period (m/s)
             </div>
             <select id="futureScenario">
                 <option value="ssp245">SSP245 (Moderate)</option>
                 <option value="ssp370">SSP370 (Medium-High)</option>
                 <option value="ssp585" selected>SSP585 (High Emissions)</option>
+                <optgroup label="Difference between SSPs">
+                    <option value="ssp370_delta">SSP370 minus SSP245</option>
+                    <option value="ssp585_delta">SSP585 minus SSP245</option>
+                </optgroup>
             </select>
         </div>
 
         <div class="control-group">
             <label for="climateModel">Climate Model &#9432;</label>
             <div class="tooltip-text">
-                <strong>CMIP6 Climate Models</strong> used to drive CHAZ hurricane simulations. Different models have different assumptions about physical processes. Multi-Model Mean averages all 6 models to reduce individual model biases.
+                <strong>CMIP6 Climate Models</strong> used to drive CHAZ hurricane simulations. Different models have different assumptions about physical processes. Multi-Model Mean averages all 6 models to reduce individual model biases; the ensemble statistics show the median, range and disagreement between models.
             </div>
             <select id="climateModel">
                 <option value="CESM2" selected>CESM2 (USA)</option>
@@ -159,6 +702,13 @@ html_content = f'''<!DOCTYPE html>
                 <option value="MIROC6">MIROC6 (Japan)</option>
                 <option value="UKESM1-0-LL">UKESM1-0-LL (UK)</option>
                 <option value="MultiModelMean">Multi-Model Mean (6 models)</option>
+                <optgroup label="Ensemble statistics">
+                    <option value="MultiModelMedian">Multi-Model Median</option>
+                    <option value="MultiModelMin">Multi-Model Minimum</option>
+                    <option value="MultiModelMax">Multi-Model Maximum</option>
+                    <option value="MultiModelStd">Inter-Model Std. Dev.</option>
+                    <option value="MultiModelSpread">Inter-Model Spread (max - min)</option>
+                </optgroup>
             </select>
         </div>
 
@@ -167,19 +717,27 @@ html_content = f'''<!DOCTYPE html>
             <div class="tooltip-text">
                 <strong>Historical:</strong> Baseline conditions (1995-2014)<br>
                 <strong>Mid-Century:</strong> Near-future projection (2041-2060)<br>
-                <strong>Late-Century:</strong> End-of-century projection (2081-2100)
+                <strong>Late-Century:</strong> End-of-century projection (2081-2100)<br><br>
+                <strong>Change:</strong> a future period minus Historical, in m/s or as a percent of Historical
             </div>
             <select id="timePeriod">
                 <option value="base" selected>Historical (1995-2014)</option>
                 <option value="fut1">Mid-Century (2041-2060)</option>
                 <option value="fut2">Late-Century (2081-2100)</option>
+                <optgroup label="Change from Historical">
+                    <option value="fut1_delta">Mid-Century minus Historical (m/s)</option>
+                    <option value="fut2_delta">Late-Century minus Historical (m/s)</option>
+                    <option value="fut1_pct">Mid-Century vs Historical (%)</option>
+                    <option value="fut2_pct">Late-Century vs Historical (%)</option>
+                </optgroup>
             </select>
         </div>
 
         <div class="control-group">
             <label for="returnPeriod">Return Period &#9432;</label>
             <div class="tooltip-text">
-                <strong>Return Period</strong> is the average time between events of this intensity. A 100-year wind speed has a 1% chance of being exceeded in any given year. Higher return periods show rarer, more extreme events.
+                <strong>Return Period</strong> is the average time between events of this intensity. A 100-year wind speed has a 1% chance of being exceeded in any given year. Higher return periods show rarer, more extreme events.<br><br>
+                <strong>Fitted</strong> return periods are read off a hazard curve through the six above; <strong>Return period of a wind speed</strong> shows how often that wind is reached at each point (years).
             </div>
             <select id="returnPeriod">
                 <option value="rp10">10-year</option>
@@ -194,7 +752,7 @@ html_content = f'''<!DOCTYPE html>
         <div class="control-group">
             <label for="displayMode">Display &#9432;</label>
             <div class="tooltip-text">
-                <strong>Circle:</strong> Individual data points as colored circles<br>
+                <strong>Circle:</strong> Individual data points as colored circles; zoomed out, the strongest point in each area<br>
                 <strong>Heatmap:</strong> Continuous heat visualization showing intensity density<br>
                 <strong>Contour:</strong> Isolines connecting points of equal wind speed
             </div>
@@ -210,8 +768,8 @@ html_content = f'''<!DOCTYPE html>
     </div>
 
     <div class="legend">
-        <h4>Wind Speed</h4>
-        <table style="font-size:10px; border-collapse:separate; border-spacing:6px 2px;">
+        <h4 id="legendTitle">Wind Speed</h4>
+        <table id="windLegend" style="font-size:10px; border-collapse:separate; border-spacing:6px 2px;">
             <tr style="color:#666"><td></td><td>m/s</td><td>km/h</td><td>mph</td></tr>
             <tr><td><div class="legend-color" style="background:#313695"></div></td><td>0-20</td><td>0-72</td><td>0-45</td></tr>
             <tr><td><div class="legend-color" style="background:#4575b4"></div></td><td>20-30</td><td>72-108</td><td>45-67</td></tr>
@@ -224,6 +782,7 @@ html_content = f'''<!DOCTYPE html>
             <tr><td><div class="legend-color" style="background:#d73027"></div></td><td>70-80</td><td>252-288</td><td>157-179</td></tr>
             <tr><td><div class="legend-color" style="background:#a50026"></div></td><td>80+</td><td>288+</td><td>179+</td></tr>
         </table>
+        <table id="changeLegend" style="display:none; font-size:10px; border-collapse:separate; border-spacing:6px 2px;"></table>
     </div>
 
     <div class="info-box">
@@ -234,6 +793,7 @@ html_content = f'''<!DOCTYPE html>
         <a href="https://github.com/metaphorz/CHAZHazard/blob/main/map/docs/chaz_map_report.pdf" target="_blank">Visualization Doc</a>: Paul Fishwick & Claude Code
     </div>
 
+    <script id="layer-worker" type="javascript/worker">{layer_worker_js}    </script>
     <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
     <script>
         // Initialize map centered on Florida
@@ -245,18 +805,41 @@ html_content = f'''<!DOCTYPE html>
             maxZoom: 19
         }}).addTo(map);
 
-        // Color scale for wind speeds (m/s)
-        function getColor(speed) {{
-            return speed >= 80 ? '#a50026' :
-                   speed >= 70 ? '#d73027' :
-                   speed >= 60 ? '#f46d43' :
-                   speed >= 55 ? '#fdae61' :
-                   speed >= 50 ? '#fee090' :
-                   speed >= 45 ? '#ffffbf' :
-                   speed >= 40 ? '#abd9e9' :
-                   speed >= 30 ? '#74add1' :
-                   speed >= 20 ? '#4575b4' :
-                                 '#313695';
+        // Colour and contour scales by layer kind (see hazard_layers.LAYER_SCALES):
+        // wind speeds, and changes in m/s or percent for the derived layers
+        const LAYER_SCALES = {json.dumps(LAYER_SCALES)};
+        const rgbHex = rgb => '#' + rgb.map(v => v.toString(16).padStart(2, '0')).join('');
+        Object.values(LAYER_SCALES).forEach(S => {{
+            S.colors = S.rgb.map(rgbHex);
+            S.contourColors = S.contour_rgb.map(rgbHex);
+        }});
+        let currentScale = 'wind';
+
+        // LAYER_SCALES key of a scenario, as in hazard_layers.layer_scale()
+        function layerScale(ssp, period, rp) {{
+            if (rp && rp.startsWith('rp_of_')) return 'rp';
+            if (period.endsWith('_pct')) return 'pct';
+            if (period.endsWith('_delta') || ssp.endsWith('_delta')) return 'delta';
+            return 'wind';
+        }}
+
+        // Color of a value on the current scale
+        function getColor(value) {{
+            const S = LAYER_SCALES[currentScale];
+            let bin = S.thresholds.length;
+            while (bin > 0 && !(value >= S.thresholds[bin - 1])) bin--;
+            return S.colors[bin];
+        }}
+
+        // Signed change, e.g. +2.5 or -1
+        function formatChange(value, digits) {{
+            const text = digits === undefined ? String(value) : value.toFixed(digits);
+            return value > 0 ? '+' + text : text;
+        }}
+
+        // Legend and contour levels: return periods as they are, changes signed
+        function formatLevel(value) {{
+            return currentScale === 'rp' ? String(value) : formatChange(value);
         }}
 
         // Hurricane category based on wind speed (m/s)
@@ -271,10 +854,160 @@ html_content = f'''<!DOCTYPE html>
             return 'Tropical Depression';
         }}
 
-        // All model data embedded
-        const allModelData = {json.dumps(all_data)};
+        // Model data in columnar form (see columnar_format.py): coordinates
+        // once, six packed return-period columns per scenario. Sharded builds
+        // leave out "data" and fetch one file per scenario from shard_base.
+        const hazardData = '''
+
+html_suffix = f''';
+        const RP_KEYS = hazardData.rp_keys;
+
+        function decodeBase64(text, ArrayType) {{
+            const bin = atob(text);
+            const bytes = new Uint8Array(bin.length);
+            for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+            return new ArrayType(bytes.buffer);
+        }}
+
+        const coordLat = decodeBase64(hazardData.lat, Int32Array);
+        const coordLon = decodeBase64(hazardData.lon, Int32Array);
+        const scenarioCache = new Map();
+
+        // Expand one scenario entry into point objects ({{lat, lon, rp10, ...}}),
+        // one typed column per return period for restyling, plus any layers
+        // precomputed at build time
+        function decodeScenario(entry) {{
+            const n = entry.n;
+            const quantized = hazardData.encoding === 'int16';
+            const values = decodeBase64(entry.values, quantized ? Int16Array : Float32Array);
+            const index = entry.index ? decodeBase64(entry.index, Int32Array) : null;
+            const points = new Array(n);
+            const columns = {{}};
+            RP_KEYS.forEach(rp => {{ columns[rp] = new Float64Array(n); }});
+            for (let i = 0; i < n; i++) {{
+                const c = index ? index[i] : i;
+                const point = {{ lat: coordLat[c] / 100, lon: coordLon[c] / 100 }};
+                for (let k = 0; k < RP_KEYS.length; k++) {{
+                    const v = values[k * n + i];
+                    point[RP_KEYS[k]] = columns[RP_KEYS[k]][i] = quantized ? v / 10 : Math.round(v * 10) / 10;
+                }}
+                points[i] = point;
+            }}
+            // Position of each shared coordinate in this scenario (-1 if absent)
+            let pointOfCoord = null;
+            if (index) {{
+                pointOfCoord = new Int32Array(coordLat.length).fill(-1);
+                for (let i = 0; i < n; i++) pointOfCoord[index[i]] = i;
+            }}
+            // Hazard-curve columns (see hazard_curves): winds at the extra return
+            // periods, then, for wind scenarios, return periods of wind speeds
+            // (int16: winds in tenths, return periods in log10 steps)
+            if (entry.curves) {{
+                const C = hazardData.curves;
+                const extra = decodeBase64(entry.curves, Int16Array);
+                C.keys.slice(0, n ? extra.length / n : 0).forEach((key, k) => {{
+                    const column = columns[key] = new Float64Array(n);
+                    const forward = k < C.rps.length;
+                    for (let i = 0; i < n; i++) {{
+                        const q = extra[k * n + i];
+                        const v = q === C.missing ? NaN : forward ? q / 10 : Math.pow(10, q / C.rp_steps);
+                        points[i][key] = column[i] = forward ? v : Math.round(v * 10) / 10;
+                    }}
+                }});
+            }}
+            return {{ points, columns, coordOfPoint: index, pointOfCoord,
+                      heatmap: entry.heatmap || null, contours: entry.contours || null,
+                      lod: entry.lod || null, lodCache: new Map() }};
+        }}
+
+        // Uniform-bucket spatial index over the shared coordinates (see
+        // hazard_layers.spatial_index): coordinate ids sorted by bucket plus offsets
+        const spatialIndex = hazardData.spatial_index;
+        const bucketOffsets = spatialIndex ? decodeBase64(spatialIndex.offsets, Int32Array) : null;
+        const bucketIds = spatialIndex ? decodeBase64(spatialIndex.ids, Int32Array) : null;
+
+        // Indices into floridaData of the points in the 3x3 buckets around
+        // (lat, lon), which hold every point within 0.15 degrees. Ascending, so
+        // callers see points in data order exactly as a full scan would.
+        function nearbyPoints(lat, lon, out) {{
+            out.length = 0;
+            if (!spatialIndex) {{
+                for (let i = 0; i < floridaData.length; i++) out.push(i);
+                return out;
+            }}
+            const S = spatialIndex;
+            const bx = Math.floor((lon - S.lon0) / S.cell);
+            const by = Math.floor((lat - S.lat0) / S.cell);
+            for (let y = Math.max(by - 1, 0); y <= Math.min(by + 1, S.ny - 1); y++) {{
+                for (let x = Math.max(bx - 1, 0); x <= Math.min(bx + 1, S.nx - 1); x++) {{
+                    const b = y * S.nx + x;
+                    for (let k = bucketOffsets[b]; k < bucketOffsets[b + 1]; k++) {{
+                        const p = pointOfCoord ? pointOfCoord[bucketIds[k]] : bucketIds[k];
+                        if (p >= 0) out.push(p);
+                    }}
+                }}
+            }}
+            return out.sort((a, b) => a - b);
+        }}
+
+        // Promise of one decoded scenario; fetched shards stay cached in memory
+        function loadScenario(ssp, model, period) {{
+            const key = `${{ssp}}/${{model}}/${{period}}`;
+            if (!scenarioCache.has(key)) {{
+                const entry = hazardData.shard_base
+                    ? fetch(`${{hazardData.shard_base}}/${{key}}.json`).then(r => {{
+                          if (!r.ok) throw new Error(`Failed to load ${{key}}: ${{r.status}}`);
+                          return r.json();
+                      }})
+                    : Promise.resolve(hazardData.data[ssp][model][period]);
+                const scenario = entry.then(decodeScenario);
+                scenario.catch(() => scenarioCache.delete(key)); // allow a retry
+                scenarioCache.set(key, scenario);
+            }}
+            return scenarioCache.get(key);
+        }}
+
+        // Warm the cache with the scenarios a user is most likely to pick next:
+        // the other periods of this model, then this period under the other SSPs
+        function prefetchNeighbours(ssp, model, period) {{
+            if (!hazardData.shard_base) return;
+            const next = [];
+            hazardData.periods.forEach(p => {{ if (p !== period && hasScenario(ssp, p)) next.push([ssp, model, p]); }});
+            hazardData.ssps.forEach(s => {{ if (s !== ssp && hasScenario(s, period)) next.push([s, model, period]); }});
+            const idle = window.requestIdleCallback || (cb => setTimeout(cb, 200));
+            idle(() => next.forEach(([s, m, p]) => loadScenario(s, m, p).catch(() => {{}})));
+        }}
+
+        // Load the selected scenario, then render it unless the selection moved on
+        function selectScenario() {{
+            const ssp = currentSSP, model = currentModel, period = currentPeriod;
+            loadScenario(ssp, model, period).then(scenario => {{
+                if (ssp !== currentSSP || model !== currentModel || period !== currentPeriod) return;
+                floridaData = scenario.points;
+                valueColumns = scenario.columns;
+                coordOfPoint = scenario.coordOfPoint;
+                pointOfCoord = scenario.pointOfCoord;
+                heatmapLayers = scenario.heatmap;
+                contourLayers = scenario.contours;
+                lodPyramid = scenario.lod;
+                lodCache = scenario.lodCache;
+                loadedSSP = ssp;
+                loadedModel = model;
+                loadedPeriod = period;
+                updateScale();
+                renderVisualization();
+                prefetchNeighbours(ssp, model, period);
+            }}).catch(err => console.error(err));
+        }}
 
         let floridaData = [];
+        let valueColumns = null;
+        let coordOfPoint = null;
+        let pointOfCoord = null;
+        let heatmapLayers = null;
+        let contourLayers = null;
+        let lodPyramid = null;
+        let lodCache = null;
         let markers = L.layerGroup().addTo(map);
         let heatLayer = null;
         let contourLayer = L.layerGroup();
@@ -283,13 +1016,112 @@ html_content = f'''<!DOCTYPE html>
         let currentModel = 'CESM2';
         let currentSSP = 'ssp585';
         let currentDisplay = 'circle';
+        // The scenario whose data is shown; the selection runs ahead of it
+        // while a shard loads
+        let loadedSSP = currentSSP;
+        let loadedModel = currentModel;
+        let loadedPeriod = currentPeriod;
+
+        // Hide models, SSPs and periods that are not in this data file (e.g.
+        // older extractions, or ones made without change layers)
+        [['climateModel', hazardData.models], ['futureScenario', hazardData.ssps],
+         ['timePeriod', hazardData.periods]].forEach(([id, available]) => {{
+            const select = document.getElementById(id);
+            Array.from(select.querySelectorAll('option')).forEach(option => {{
+                if (!available.includes(option.value)) option.remove();
+            }});
+            Array.from(select.querySelectorAll('optgroup')).forEach(group => {{
+                if (!group.children.length) group.remove();
+            }});
+        }});
+
+        // Extra return periods and wind speeds answered by the hazard curves
+        if (hazardData.curves) {{
+            const C = hazardData.curves;
+            const select = document.getElementById('returnPeriod');
+            C.rps.forEach((years, k) => {{
+                const next = Array.from(select.options).find(option => Number(option.value.slice(2)) > years);
+                select.insertBefore(new Option(`${{years}}-year (fitted)`, C.keys[k]), next || null);
+            }});
+            if (C.winds.length) {{
+                const group = document.createElement('optgroup');
+                group.label = 'Return period of a wind speed';
+                C.winds.forEach((wind, k) => {{
+                    group.appendChild(new Option(`${{wind}} m/s (${{Math.round(wind * 2.237)}} mph)`,
+                                                 C.keys[C.rps.length + k]));
+                }});
+                select.appendChild(group);
+            }}
+        }}
+
+        // Return periods of wind speeds are fitted for wind scenarios only
+        function syncRPOptions() {{
+            const wind = layerScale(currentSSP, currentPeriod) === 'wind';
+            const select = document.getElementById('returnPeriod');
+            Array.from(select.querySelectorAll('option')).forEach(option => {{
+                if (option.value.startsWith('rp_of_')) option.disabled = !wind;
+            }});
+            if (!wind && currentRP.startsWith('rp_of_')) {{
+                currentRP = 'rp250';
+                select.value = currentRP;
+                updateScale();
+            }}
+        }}
+
+        // SSP differences (extract_all_ssp.derived_layers) hold the raw periods
+        // only, so their change periods are disabled
+        function hasScenario(ssp, period) {{
+            return !ssp.endsWith('_delta') || !period.includes('_');
+        }}
+
+        function syncPeriodOptions() {{
+            const select = document.getElementById('timePeriod');
+            Array.from(select.querySelectorAll('option')).forEach(option => {{
+                option.disabled = !hasScenario(currentSSP, option.value);
+            }});
+            if (!hasScenario(currentSSP, currentPeriod)) {{
+                currentPeriod = currentPeriod.split('_')[0];
+                select.value = currentPeriod;
+            }}
+        }}
+
+        // Scale of what is drawn: the loaded scenario's, or return periods
+        function updateScale() {{
+            currentScale = layerScale(loadedSSP, loadedPeriod, currentRP);
+            updateLegend();
+        }}
+
+        // Legend heading of the current scale
+        function scaleTitle() {{
+            if (currentScale === 'wind') return 'Wind Speed';
+            const unit = LAYER_SCALES[currentScale].unit;
+            if (currentScale === 'rp') return `Return Period of ${{currentRP.slice(6)}} m/s (${{unit}})`;
+            if (loadedSSP.endsWith('_delta')) return `Difference from ${{hazardData.ssps[0].toUpperCase()}} (${{unit}})`;
+            return `Change from Historical (${{unit}})`;
+        }}
+
+        // Wind speed table, or the colour bins of a change scale
+        function updateLegend() {{
+            const wind = currentScale === 'wind';
+            const S = LAYER_SCALES[currentScale];
+            document.getElementById('legendTitle').textContent = scaleTitle();
+            document.getElementById('contourNote').textContent = `Contour values in ${{wind ? 'mph' : S.unit}}`;
+            document.getElementById('windLegend').style.display = wind ? '' : 'none';
+            const table = document.getElementById('changeLegend');
+            table.style.display = wind ? 'none' : '';
+            if (wind) return;
+            const t = S.thresholds.map(formatLevel);
+            table.innerHTML = `<tr style="color:#666"><td></td><td>${{S.unit}}</td></tr>` + S.colors.map((color, i) => {{
+                const range = i === 0 ? `below ${{t[0]}}` : i === t.length ? `${{t[i - 1]}} and up` : `${{t[i - 1]}} to ${{t[i]}}`;
+                return `<tr><td><div class="legend-color" style="background:${{color}}"></div></td><td>${{range}}</td></tr>`;
+            }}).join('');
+        }}
 
         // Initialize data
-        floridaData = allModelData[currentSSP][currentModel][currentPeriod];
-        renderVisualization();
+        selectScenario();
 
         function clearAllLayers() {{
-            markers.clearLayers();
+            if (currentDisplay !== 'circle') hideCircles();
             if (heatLayer) {{
                 map.removeLayer(heatLayer);
                 heatLayer = null;
@@ -310,43 +1142,93 @@ html_content = f'''<!DOCTYPE html>
             }}
         }}
 
-        function renderCircles() {{
-            floridaData.forEach(point => {{
-                const windSpeed = point[currentRP];
-                const color = getColor(windSpeed);
-
-                const marker = L.circleMarker([point.lat, point.lon], {{
+        // Circle markers live on one canvas and are made once per shared
+        // coordinate, the first time it is drawn. Scenario, return period, zoom
+        // and pan changes only add, remove and restyle them; tooltips are
+        // formatted when hovered.
+        const circleRenderer = L.canvas({{ padding: 0.2 }});
+        const coordMarkers = new Array(coordLat.length);
+        const coordShownAt = new Int32Array(coordLat.length);
+        let shownCoords = [];
+        let circleRender = 0;
+
+        function coordMarker(c) {{
+            if (!coordMarkers[c]) {{
+                const marker = L.circleMarker([coordLat[c] / 100, coordLon[c] / 100], {{
+                    renderer: circleRenderer,
                     radius: 5,
-                    fillColor: color,
-                    color: color,
                     weight: 1,
                     opacity: 0.8,
                     fillOpacity: 0.7
                 }});
+                marker.point = -1;
+                marker.bindTooltip(() => formatPointTooltip(floridaData[marker.point]),
+                                   {{ direction: 'bottom', offset: [0, 10] }});
+                coordMarkers[c] = marker;
+            }}
+            return coordMarkers[c];
+        }}
 
-                const kmh = (windSpeed * 3.6).toFixed(0);
-                const mph = (windSpeed * 2.237).toFixed(0);
-                const category = getCategory(windSpeed);
+        // Indices of the points drawn as circles at the current zoom: the
+        // strongest point per cell from the build-time pyramid (see
+        // hazard_layers.lod_pyramid), or null for every point once zoomed in past it
+        function circlePointIds() {{
+            const zoom = Math.max(Math.floor(map.getZoom()), 0);
+            if (!lodPyramid || zoom >= lodPyramid.full_zoom) return null;
+            const key = `${{zoom}}/${{currentRP}}`;
+            if (!lodCache.has(key)) {{
+                lodCache.set(key, decodeBase64(lodPyramid.levels[zoom].points[currentRP],
+                                               lodPyramid.dtype === 'uint16' ? Uint16Array : Int32Array));
+            }}
+            return lodCache.get(key);
+        }}
 
-                marker.bindTooltip(
-                    `<strong>${{point.lat.toFixed(2)}}°N, ${{Math.abs(point.lon).toFixed(2)}}°W</strong><br>` +
-                    `<strong>${{windSpeed.toFixed(1)}} m/s</strong> (${{kmh}} km/h, ${{mph}} mph)<br>` +
-                    `${{category}}<br><hr style="margin:4px 0">` +
-                    `<span style="font-size:10px">` +
-                    `10yr: ${{point.rp10}} | 25yr: ${{point.rp25}} | 50yr: ${{point.rp50}}<br>` +
-                    `100yr: ${{point.rp100}} | 250yr: ${{point.rp250}} | 1000yr: ${{point.rp1000}}</span>`,
-                    {{ direction: 'bottom', offset: [0, 10] }}
-                );
-
-                markers.addLayer(marker);
+        // Show the circles in (and just around) the view, coloured by the
+        // current return period, so the marker count follows the screen rather
+        // than the data
+        function renderCircles() {{
+            const view = map.getBounds().pad(0.2);
+            const south = view.getSouth(), north = view.getNorth(), west = view.getWest(), east = view.getEast();
+            const ids = circlePointIds();
+            const count = ids ? ids.length : floridaData.length;
+            const column = valueColumns ? valueColumns[currentRP] : null;
+            const render = ++circleRender;
+            const shown = [];
+            for (let j = 0; j < count; j++) {{
+                const i = ids ? ids[j] : j;
+                const c = coordOfPoint ? coordOfPoint[i] : i;
+                const lat = coordLat[c] / 100, lon = coordLon[c] / 100;
+                if (lat < south || lat > north || lon < west || lon > east) continue;
+                const marker = coordMarker(c);
+                marker.point = i;
+                const color = getColor(column[i]);
+                if (marker.options.fillColor !== color) marker.setStyle({{ fillColor: color, color: color }});
+                if (!coordShownAt[c]) markers.addLayer(marker);
+                coordShownAt[c] = render;
+                shown.push(c);
+            }}
+            shownCoords.forEach(c => {{
+                if (coordShownAt[c] !== render) {{
+                    markers.removeLayer(coordMarkers[c]);
+                    coordShownAt[c] = 0;
+                }}
             }});
+            shownCoords = shown;
+        }}
+
+        function hideCircles() {{
+            markers.clearLayers();
+            shownCoords.forEach(c => {{ coordShownAt[c] = 0; }});
+            shownCoords = [];
         }}
 
         // Find nearest data point to a given lat/lon
+        const hoverCandidates = [];
         function findNearestPoint(lat, lon) {{
             let nearest = null;
             let minDist = Infinity;
-            for (const point of floridaData) {{
+            for (const i of nearbyPoints(lat, lon, hoverCandidates)) {{
+                const point = floridaData[i];
                 const dLat = lat - point.lat;
                 const dLon = lon - point.lon;
                 const dist = dLat * dLat + dLon * dLon;
@@ -362,17 +1244,40 @@ html_content = f'''<!DOCTYPE html>
         // Create a popup for heatmap/contour tooltips
         let hoverPopup = L.popup({{ closeButton: false, offset: [0, -5] }});
 
+        // Return periods in years; those at the cap read "over <cap>"
+        function formatYears(years) {{
+            const limit = hazardData.curves.rp_limit;
+            return years >= limit ? `over ${{limit.toLocaleString()}}` : Math.round(years).toLocaleString();
+        }}
+
         function formatPointTooltip(point) {{
-            const windSpeed = point[currentRP];
-            const kmh = (windSpeed * 3.6).toFixed(0);
-            const mph = (windSpeed * 2.237).toFixed(0);
-            const category = getCategory(windSpeed);
+            const change = currentScale === 'delta' || currentScale === 'pct';
+            const format = change ? value => formatChange(value) : value => value;
+            let heading;
+            if (change) {{
+                heading = `<strong>${{formatChange(point[currentRP], 1)}} ${{LAYER_SCALES[currentScale].unit}}</strong><br>` +
+                    scaleTitle();
+            }} else if (currentScale === 'rp') {{
+                const wind = Number(currentRP.slice(6));
+                heading = `<strong>${{formatYears(point[currentRP])}} years</strong><br>` +
+                    `Return period of ${{wind}} m/s (${{Math.round(wind * 2.237)}} mph)`;
+            }} else {{
+                const windSpeed = point[currentRP];
+                const kmh = (windSpeed * 3.6).toFixed(0);
+                const mph = (windSpeed * 2.237).toFixed(0);
+                const category = getCategory(windSpeed);
+                heading = `<strong>${{windSpeed.toFixed(1)}} m/s</strong> (${{kmh}} km/h, ${{mph}} mph)<br>${{category}}`;
+            }}
+            // The six return periods, then the fitted ones
+            let values = `10yr: ${{format(point.rp10)}} | 25yr: ${{format(point.rp25)}} | 50yr: ${{format(point.rp50)}}<br>` +
+                `100yr: ${{format(point.rp100)}} | 250yr: ${{format(point.rp250)}} | 1000yr: ${{format(point.rp1000)}}`;
+            const C = hazardData.curves;
+            if (C && C.rps.length && point[C.keys[0]] !== undefined) {{
+                values += '<br>' + C.rps.map((years, k) => `${{years}}yr: ${{format(point[C.keys[k]])}}`).join(' | ');
+            }}
             return `<strong>${{point.lat.toFixed(2)}}°N, ${{Math.abs(point.lon).toFixed(2)}}°W</strong><br>` +
-                `<strong>${{windSpeed.toFixed(1)}} m/s</strong> (${{kmh}} km/h, ${{mph}} mph)<br>` +
-                `${{category}}<br><hr style="margin:4px 0">` +
-                `<span style="font-size:10px">` +
-                `10yr: ${{point.rp10}} | 25yr: ${{point.rp25}} | 50yr: ${{point.rp50}}<br>` +
-                `100yr: ${{point.rp100}} | 250yr: ${{point.rp250}} | 1000yr: ${{point.rp1000}}</span>`;
+                `${{heading}}<br><hr style="margin:4px 0">` +
+                `<span style="font-size:10px">${{values}}</span>`;
         }}
 
         function onMapMouseMove(e) {{
@@ -393,417 +1298,259 @@ html_content = f'''<!DOCTYPE html>
         }}
 
         map.on('mousemove', onMapMouseMove);
+        // Circles follow the view and the zoom level
+        map.on('moveend', () => {{
+            if (currentDisplay === 'circle') renderCircles();
+        }});
         map.on('mouseout', onMapMouseOut);
 
-        // Florida land polygon for boundary checking
-        const FLORIDA_POLYGON = [
-            [-87.5, 30.95], [-87.5, 30.1], [-86.5, 30.1], [-85.5, 29.7],
-            [-85.0, 29.1], [-84.0, 29.6], [-83.5, 29.0], [-82.8, 28.0],
-            [-82.7, 27.5], [-82.1, 26.5], [-81.5, 25.9], [-80.9, 25.1],
-            [-80.1, 25.1], [-80.1, 26.0], [-80.1, 27.0], [-80.3, 28.0],
-            [-80.6, 28.5], [-81.2, 29.5], [-81.3, 30.1], [-81.5, 30.7],
-            [-82.0, 30.6], [-82.5, 30.4], [-83.0, 30.5], [-84.0, 30.5],
-            [-85.0, 30.95], [-87.5, 30.95]
-        ];
-        const KEYS_POLYGON = [
-            [-82.0, 24.5], [-81.5, 24.5], [-80.3, 25.0], [-80.0, 25.2],
-            [-80.5, 25.5], [-81.0, 25.2], [-81.8, 24.7], [-82.0, 24.5]
-        ];
-
-        // Point-in-polygon test
-        function pointInPolygon(lon, lat, polygon) {{
-            let inside = false;
-            const n = polygon.length;
-            let p1x = polygon[0][0], p1y = polygon[0][1];
-            for (let i = 1; i <= n; i++) {{
-                const p2x = polygon[i % n][0], p2y = polygon[i % n][1];
-                if (lat > Math.min(p1y, p2y)) {{
-                    if (lat <= Math.max(p1y, p2y)) {{
-                        if (lon <= Math.max(p1x, p2x)) {{
-                            if (p1y !== p2y) {{
-                                const xinters = (lat - p1y) * (p2x - p1x) / (p2y - p1y) + p1x;
-                                if (p1x === p2x || lon <= xinters) {{
-                                    inside = !inside;
-                                }}
-                            }}
-                        }}
-                    }}
-                }}
-                p1x = p2x; p1y = p2y;
-            }}
-            return inside;
+        // Heatmap grids and contours without build-time layers are computed in
+        // a Web Worker (the layer-worker script), one job at a time. Results
+        // are kept in a small LRU keyed by scenario, return period and display,
+        // so going back to a recent view redraws at once. A job replaced by a
+        // newer request is cancelled by restarting the worker.
+        const LAYER_CACHE_SIZE = 32;
+        const layerCache = new Map();
+        const layerWorkerUrl = URL.createObjectURL(new Blob(
+            [document.getElementById('layer-worker').textContent], {{ type: 'text/javascript' }}));
+        let layerWorker = null;
+        let layerJob = null;
+        let layerJobCount = 0;
+
+        function startLayerWorker() {{
+            layerWorker = new Worker(layerWorkerUrl);
+            layerWorker.onmessage = e => finishLayerJob(e.data);
+            layerWorker.onerror = e => {{
+                console.error(e.message);
+                layerWorker.terminate();
+                layerWorker = null;
+                layerJob = null;
+            }};
+            const S = spatialIndex;
+            layerWorker.postMessage({{
+                type: 'init',
+                lat: Float64Array.from(coordLat, v => v / 100),
+                lon: Float64Array.from(coordLon, v => v / 100),
+                index: S ? {{ cell: S.cell, lat0: S.lat0, lon0: S.lon0, nx: S.nx, ny: S.ny }} : null,
+                offsets: bucketOffsets,
+                ids: bucketIds
+            }});
         }}
 
-        function isFloridaLand(lon, lat) {{
-            return pointInPolygon(lon, lat, FLORIDA_POLYGON) || pointInPolygon(lon, lat, KEYS_POLYGON);
+        // Layers are computed from the loaded scenario's values, so they are
+        // keyed by it rather than by the selection
+        function layerKey(display) {{
+            return `${{loadedSSP}}/${{loadedModel}}/${{loadedPeriod}}/${{currentRP}}/${{display}}`;
         }}
 
-        // Compute data bounds from Florida points
-        function getDataBounds() {{
-            const lats = floridaData.map(p => p.lat);
-            const lons = floridaData.map(p => p.lon);
-            return {{
-                latMin: Math.min(...lats),
-                latMax: Math.max(...lats),
-                lonMin: Math.min(...lons),
-                lonMax: Math.max(...lons)
-            }};
+        function cachedLayer(key) {{
+            const layer = layerCache.get(key);
+            if (layer !== undefined) {{
+                layerCache.delete(key); // most recently used last
+                layerCache.set(key, layer);
+            }}
+            return layer;
         }}
 
-        // IDW grid generation (similar to KDE approach but for scalar values)
-        function idwGrid(NX = 150, NY = 150) {{
-            const bounds = getDataBounds();
-            const padding = 0.05; // Small padding in degrees
-            const latMin = bounds.latMin - padding;
-            const latMax = bounds.latMax + padding;
-            const lonMin = bounds.lonMin - padding;
-            const lonMax = bounds.lonMax + padding;
-
-            const dx = (lonMax - lonMin) / (NX - 1);
-            const dy = (latMax - latMin) / (NY - 1);
-
-            const power = 2;
-            const maxDist = 0.15; // degrees - tight constraint to data
-
-            const raw = new Float64Array(NX * NY);
-            const valid = new Uint8Array(NX * NY);
-
-            for (let iy = 0; iy < NY; iy++) {{
-                const lat = latMin + iy * dy;
-                for (let ix = 0; ix < NX; ix++) {{
-                    const lon = lonMin + ix * dx;
-
-                    let weightSum = 0;
-                    let valueSum = 0;
-                    let nearCount = 0;
-
-                    for (const point of floridaData) {{
-                        const dLat = lat - point.lat;
-                        const dLon = lon - point.lon;
-                        const dist = Math.sqrt(dLat * dLat + dLon * dLon);
-
-                        if (dist < maxDist) {{
-                            nearCount++;
-                            if (dist < 0.001) {{
-                                weightSum = 1;
-                                valueSum = point[currentRP];
-                                break;
-                            }}
-                            const weight = 1 / Math.pow(dist, power);
-                            weightSum += weight;
-                            valueSum += weight * point[currentRP];
-                        }}
-                    }}
+        function cacheLayer(key, layer) {{
+            layerCache.set(key, layer);
+            if (layerCache.size > LAYER_CACHE_SIZE) layerCache.delete(layerCache.keys().next().value);
+        }}
 
-                    const idx = iy * NX + ix;
-                    if (nearCount >= 2 && weightSum > 0) {{
-                        raw[idx] = valueSum / weightSum;
-                        valid[idx] = 1;
-                    }} else {{
-                        raw[idx] = 0;
-                        valid[idx] = 0;
-                    }}
-                }}
+        // Call draw with the current scenario's layer for display, from the
+        // cache or once the worker has computed it
+        function requestLayer(display, NX, NY, draw) {{
+            const key = layerKey(display);
+            const cached = cachedLayer(key);
+            if (cached !== undefined) {{
+                draw(cached);
+                return;
             }}
-
-            let gmin = Infinity, gmax = -Infinity;
-            for (let i = 0; i < raw.length; i++) {{
-                if (valid[i]) {{
-                    if (raw[i] < gmin) gmin = raw[i];
-                    if (raw[i] > gmax) gmax = raw[i];
-                }}
+            if (layerJob && layerJob.key === key) {{
+                layerJob.draw = draw;
+                return;
             }}
-
-            return {{ raw, valid, NX, NY, lonMin, latMin, dx, dy, gmin, gmax }};
+            if (layerJob) {{
+                layerWorker.terminate();
+                layerWorker = null;
+            }}
+            if (!layerWorker) startLayerWorker();
+            layerJob = {{ id: ++layerJobCount, key, display, draw }};
+            const values = valueColumns[currentRP].slice();
+            const coords = coordOfPoint ? coordOfPoint.slice() : null;
+            const positions = pointOfCoord ? pointOfCoord.slice() : null;
+            const transfer = [values.buffer];
+            if (coords) transfer.push(coords.buffer);
+            if (positions) transfer.push(positions.buffer);
+            layerWorker.postMessage({{ type: display, id: layerJob.id, NX, NY, values, scale: LAYER_SCALES[currentScale],
+                                       coordOfPoint: coords, pointOfCoord: positions }}, transfer);
         }}
 
-        function renderHeatmap() {{
-            // Generate IDW grid
-            const G = idwGrid(150, 150);
-            if (!G) return;
+        function finishLayerJob(msg) {{
+            if (!layerJob || msg.id !== layerJob.id) return;
+            const job = layerJob;
+            layerJob = null;
+            const layer = job.display === 'heatmap' ? heatmapImage(msg) : msg.lines;
+            cacheLayer(job.key, layer);
+            if (layerKey(currentDisplay) === job.key) job.draw(layer);
+        }}
 
-            // Create canvas for the grid area
+        // Turn the worker's RGBA pixels into an image overlay source
+        function heatmapImage(msg) {{
             const canvas = document.createElement('canvas');
-            canvas.width = G.NX;
-            canvas.height = G.NY;
+            canvas.width = msg.NX;
+            canvas.height = msg.NY;
             const ctx = canvas.getContext('2d');
-            const imageData = ctx.createImageData(G.NX, G.NY);
-            const data = imageData.data;
-
-            // Color function
-            function getColorRGB(speed) {{
-                if (speed >= 80) return [165, 0, 38];
-                if (speed >= 70) return [215, 48, 39];
-                if (speed >= 60) return [244, 109, 67];
-                if (speed >= 55) return [253, 174, 97];
-                if (speed >= 50) return [254, 224, 144];
-                if (speed >= 45) return [255, 255, 191];
-                if (speed >= 40) return [171, 217, 233];
-                if (speed >= 30) return [116, 173, 209];
-                if (speed >= 20) return [69, 117, 180];
-                return [49, 54, 149];
-            }}
-
-            // Fill image data (flip Y for canvas coordinates)
-            for (let iy = 0; iy < G.NY; iy++) {{
-                for (let ix = 0; ix < G.NX; ix++) {{
-                    const srcIdx = iy * G.NX + ix;
-                    const dstIdx = ((G.NY - 1 - iy) * G.NX + ix) * 4;
-
-                    if (G.valid[srcIdx]) {{
-                        const [r, g, b] = getColorRGB(G.raw[srcIdx]);
-                        data[dstIdx] = r;
-                        data[dstIdx + 1] = g;
-                        data[dstIdx + 2] = b;
-                        data[dstIdx + 3] = 180;
-                    }} else {{
-                        data[dstIdx + 3] = 0;
-                    }}
-                }}
-            }}
-
+            const imageData = ctx.createImageData(msg.NX, msg.NY);
+            imageData.data.set(msg.pixels);
             ctx.putImageData(imageData, 0, 0);
-
-            // Create bounds for overlay
-            const imageBounds = [
-                [G.latMin, G.lonMin],
-                [G.latMin + G.NY * G.dy, G.lonMin + G.NX * G.dx]
-            ];
-
-            heatLayer = L.imageOverlay(canvas.toDataURL(), imageBounds, {{
-                opacity: 0.85
-            }}).addTo(map);
-
-            map.off('moveend', onMapMove);
-            map.on('moveend', onMapMove);
+            return {{ url: canvas.toDataURL(), bounds: msg.bounds }};
         }}
 
-        function onMapMove() {{
-            if (currentDisplay === 'heatmap') {{
-                if (heatLayer) {{
-                    map.removeLayer(heatLayer);
-                    heatLayer = null;
-                }}
-                renderHeatmap();
+        function renderHeatmap() {{
+            // Use the overlay precomputed at build time when there is one
+            if (heatmapLayers) {{
+                heatLayer = L.imageOverlay('data:image/png;base64,' + heatmapLayers.images[currentRP],
+                    heatmapLayers.bounds, {{ opacity: 0.85 }}).addTo(map);
+                return;
             }}
-        }}
+            if (floridaData.length === 0) return;
 
-        // Linear interpolation for contour edge crossing (from genesis-codex)
-        function contourInterpolate(t, vA, vB, xA, yA, xB, yB) {{
-            const d = vB - vA;
-            if (Math.abs(d) < 1e-12) return [(xA + xB) / 2, (yA + yB) / 2];
-            const s = (t - vA) / d;
-            return [xA + s * (xB - xA), yA + s * (yB - yA)];
+            // The grid depends only on the data, so pans never need a re-render
+            requestLayer('heatmap', 150, 150, layer => {{
+                heatLayer = L.imageOverlay(layer.url, layer.bounds, {{
+                    opacity: 0.85
+                }}).addTo(map);
+            }});
         }}
 
-        // Marching squares segment extraction (from genesis-codex)
-        function buildSegments(field, valid, NX, NY, t, lonMin, latMin, dx, dy) {{
-            const get = (ix, iy) => field[iy * NX + ix];
-            const isValid = (ix, iy) => valid[iy * NX + ix];
-            const segs = [];
-
-            for (let iy = 0; iy < NY - 1; iy++) {{
-                for (let ix = 0; ix < NX - 1; ix++) {{
-                    // Skip if any corner is invalid
-                    if (!isValid(ix, iy) || !isValid(ix + 1, iy) ||
-                        !isValid(ix, iy + 1) || !isValid(ix + 1, iy + 1)) continue;
-
-                    const tl = get(ix, iy), tr = get(ix + 1, iy);
-                    const br = get(ix + 1, iy + 1), bl = get(ix, iy + 1);
-
-                    let idx = 0;
-                    if (tl >= t) idx |= 1;
-                    if (tr >= t) idx |= 2;
-                    if (br >= t) idx |= 4;
-                    if (bl >= t) idx |= 8;
-
-                    if (idx === 0 || idx === 15) continue;
-
-                    const top = contourInterpolate(t, tl, tr, ix, iy, ix + 1, iy);
-                    const right = contourInterpolate(t, tr, br, ix + 1, iy, ix + 1, iy + 1);
-                    const bottom = contourInterpolate(t, bl, br, ix, iy + 1, ix + 1, iy + 1);
-                    const left = contourInterpolate(t, tl, bl, ix, iy, ix, iy + 1);
-
-                    const center = (tl + tr + br + bl) / 4;
-
-                    switch (idx) {{
-                        case 1: case 14: segs.push([left, top]); break;
-                        case 2: case 13: segs.push([top, right]); break;
-                        case 3: case 12: segs.push([left, right]); break;
-                        case 4: case 11: segs.push([right, bottom]); break;
-                        case 6: case 9: segs.push([top, bottom]); break;
-                        case 7: case 8: segs.push([bottom, left]); break;
-                        case 5:
-                            if (center >= t) {{ segs.push([top, right]); segs.push([bottom, left]); }}
-                            else {{ segs.push([left, top]); segs.push([right, bottom]); }}
-                            break;
-                        case 10:
-                            if (center >= t) {{ segs.push([left, top]); segs.push([right, bottom]); }}
-                            else {{ segs.push([top, right]); segs.push([bottom, left]); }}
-                            break;
-                    }}
-                }}
-            }}
-
-            // Convert grid coordinates to lat/lon and filter to Florida land
-            const result = [];
-            for (const seg of segs) {{
-                const lat1 = latMin + seg[0][1] * dy;
-                const lon1 = lonMin + seg[0][0] * dx;
-                const lat2 = latMin + seg[1][1] * dy;
-                const lon2 = lonMin + seg[1][0] * dx;
-                // Check midpoint is on Florida land
-                const midLat = (lat1 + lat2) / 2;
-                const midLon = (lon1 + lon2) / 2;
-                if (isFloridaLand(midLon, midLat)) {{
-                    result.push([[lat1, lon1], [lat2, lon2]]);
-                }}
-            }}
-            return result;
+        // Contour colour of a threshold on the current scale
+        function contourColor(threshold) {{
+            const S = LAYER_SCALES[currentScale];
+            return S.contourColors[S.contours.indexOf(threshold)];
         }}
 
-        // Stitch segments into continuous polylines (from genesis-codex)
-        function stitchSegments(segs) {{
-            const key = (p) => p[0].toFixed(4) + "," + p[1].toFixed(4);
-            const buckets = new Map();
-
-            segs.forEach((s, i) => {{
-                const k1 = key(s[0]), k2 = key(s[1]);
-                if (!buckets.has(k1)) buckets.set(k1, []);
-                if (!buckets.has(k2)) buckets.set(k2, []);
-                buckets.get(k1).push(i);
-                buckets.get(k2).push(i);
+        function addContourLine(latlngs, threshold, color) {{
+            const mphValue = Math.round(threshold * 2.237); // Convert m/s to mph
+            const line = L.polyline(latlngs, {{
+                color: color,
+                weight: 2.5,
+                opacity: 0.9
             }});
+            line.bindTooltip(currentScale === 'wind' ? `${{mphValue}} mph (${{threshold}} m/s)`
+                             : `${{formatLevel(threshold)}} ${{LAYER_SCALES[currentScale].unit}}`, {{ sticky: true }});
+            contourLayer.addLayer(line);
+        }}
 
-            const used = new Array(segs.length).fill(false);
-            const polylines = [];
-
-            function takeChain(startIdx) {{
-                const chain = [];
-                used[startIdx] = true;
-                let a = segs[startIdx][0], b = segs[startIdx][1];
-                chain.push(a, b);
-                let cur = b;
+        function addContourLabel(latlng, threshold, color) {{
+            const text = currentScale === 'wind' ? Math.round(threshold * 2.237) : formatLevel(threshold);
+            const label = L.marker(latlng, {{
+                icon: L.divIcon({{
+                    className: 'contour-label',
+                    html: `<span style="background:${{color}};color:white;padding:2px 4px;border-radius:3px;font-size:10px;font-weight:bold;">${{text}}</span>`,
+                    iconSize: [30, 15]
+                }})
+            }});
+            contourLayer.addLayer(label);
+        }}
 
-                while (true) {{
-                    const k = key(cur);
-                    const cand = buckets.get(k) || [];
-                    let nextIdx = -1, flip = false;
+        // [[lat, lon], ...] chains from packed lat/lon pairs and points per chain
+        function unpackChains(points, lengths) {{
+            const chains = [];
+            let k = 0;
+            lengths.forEach(length => {{
+                const chain = new Array(length);
+                for (let j = 0; j < length; j++, k += 2) chain[j] = [points[k], points[k + 1]];
+                chains.push(chain);
+            }});
+            return chains;
+        }}
 
-                    for (let j of cand) {{
-                        if (used[j]) continue;
-                        const s = segs[j];
-                        const k0 = key(s[0]), k1 = key(s[1]);
-                        if (k0 === k) {{ nextIdx = j; flip = false; break; }}
-                        if (k1 === k) {{ nextIdx = j; flip = true; break; }}
+        // One build-time contour layer (see hazard_layers.contour_layers): per
+        // threshold, base64 int32 chain lengths and lat/lon pairs in units of
+        // 1 / layer.scale degrees, each chain's first point as is and the rest as
+        // differences from the point before
+        function decodeContours(layer) {{
+            return layer.features.map(feature => {{
+                const lengths = decodeBase64(feature.lengths, Int32Array);
+                const coords = decodeBase64(feature.coords, Int32Array);
+                const points = new Float64Array(coords.length);
+                let k = 0;
+                lengths.forEach(length => {{
+                    let lat = 0, lon = 0;
+                    for (let j = 0; j < length; j++, k += 2) {{
+                        lat += coords[k];
+                        lon += coords[k + 1];
+                        points[k] = lat / layer.scale;
+                        points[k + 1] = lon / layer.scale;
                     }}
-
-                    if (nextIdx < 0) break;
-                    used[nextIdx] = true;
-                    const s = segs[nextIdx];
-                    const nextPoint = flip ? s[0] : s[1];
-                    chain.push(nextPoint);
-                    cur = nextPoint;
-                    if (key(cur) === key(chain[0])) break; // closed loop
-                }}
-                return chain;
-            }}
-
-            for (let i = 0; i < segs.length; i++) {{
-                if (used[i]) continue;
-                polylines.push(takeChain(i));
-            }}
-            return polylines;
+                }});
+                const labels = Array.from(decodeBase64(feature.labels, Int32Array), v => v / layer.scale);
+                return {{ threshold: feature.threshold, points, lengths, labels }};
+            }});
         }}
 
         function renderContours() {{
-            const thresholds = [30, 40, 45, 50, 55, 60, 70];
-            const colors = ['#4575b4', '#74add1', '#abd9e9', '#fee090', '#fdae61', '#f46d43', '#d73027'];
-
             contourLayer.addTo(map);
 
-            // Generate IDW grid
-            const G = idwGrid(120, 120);
-            if (!G) return;
-
-            thresholds.forEach((threshold, idx) => {{
-                const color = colors[idx];
-
-                // Build segments using marching squares
-                const segments = buildSegments(G.raw, G.valid, G.NX, G.NY, threshold,
-                    G.lonMin, G.latMin, G.dx, G.dy);
-
-                if (segments.length === 0) return;
-
-                // Stitch into continuous polylines
-                const polylines = stitchSegments(segments);
+            // Draw the layer precomputed at build time when there is one
+            if (contourLayers) {{
+                decodeContours(contourLayers[currentRP]).forEach(({{ threshold, points, lengths, labels }}) => {{
+                    const color = contourColor(threshold);
+                    unpackChains(points, lengths).forEach(chain => addContourLine(chain, threshold, color));
+                    for (let k = 0; k < labels.length; k += 2) {{
+                        addContourLabel([labels[k], labels[k + 1]], threshold, color);
+                    }}
+                }});
+                return;
+            }}
+            if (floridaData.length === 0) return;
 
-                // Draw polylines and label all reasonably large ones
+            // Polylines per threshold from the layer worker, as packed [lat, lon] pairs
+            requestLayer('contour', 120, 120, lines => {{
                 const MIN_LABEL_LENGTH = 8; // Minimum points for a contour to get a label
-
-                const mphValue = Math.round(threshold * 2.237); // Convert m/s to mph
-
-                polylines.forEach(chain => {{
-                    if (chain.length >= 2) {{
-                        const line = L.polyline(chain, {{
-                            color: color,
-                            weight: 2.5,
-                            opacity: 0.9
-                        }});
-                        line.bindTooltip(`${{mphValue}} mph (${{threshold}} m/s)`, {{ sticky: true }});
-                        contourLayer.addLayer(line);
-
-                        // Add label on all reasonably large contours
-                        if (chain.length >= MIN_LABEL_LENGTH) {{
-                            const midIdx = Math.floor(chain.length / 2);
-                            const label = L.marker(chain[midIdx], {{
-                                icon: L.divIcon({{
-                                    className: 'contour-label',
-                                    html: `<span style="background:${{color}};color:white;padding:2px 4px;border-radius:3px;font-size:10px;font-weight:bold;">${{mphValue}}</span>`,
-                                    iconSize: [30, 15]
-                                }})
-                            }});
-                            contourLayer.addLayer(label);
+                lines.forEach(({{ threshold, points, lengths }}) => {{
+                    const color = contourColor(threshold);
+                    unpackChains(points, lengths).forEach(chain => {{
+                        if (chain.length >= 2) {{
+                            addContourLine(chain, threshold, color);
+
+                            // Add label on all reasonably large contours
+                            if (chain.length >= MIN_LABEL_LENGTH) {{
+                                addContourLabel(chain[Math.floor(chain.length / 2)], threshold, color);
+                            }}
                         }}
-                    }}
+                    }});
                 }});
             }});
-
-            map.off('moveend', onContourMove);
-            map.on('moveend', onContourMove);
-        }}
-
-        function onContourMove() {{
-            if (currentDisplay === 'contour') {{
-                contourLayer.clearLayers();
-                renderContours();
-            }}
+            // Contours depend only on the data, so pans never need a re-render
         }}
 
         // Handle future scenario (SSP) change
         document.getElementById('futureScenario').addEventListener('change', function(e) {{
             currentSSP = e.target.value;
-            floridaData = allModelData[currentSSP][currentModel][currentPeriod];
-            renderVisualization();
+            syncPeriodOptions();
+            syncRPOptions();
+            selectScenario();
         }});
 
         // Handle climate model change
         document.getElementById('climateModel').addEventListener('change', function(e) {{
             currentModel = e.target.value;
-            floridaData = allModelData[currentSSP][currentModel][currentPeriod];
-            renderVisualization();
+            selectScenario();
         }});
 
         // Handle time period change
         document.getElementById('timePeriod').addEventListener('change', function(e) {{
             currentPeriod = e.target.value;
-            floridaData = allModelData[currentSSP][currentModel][currentPeriod];
-            renderVisualization();
+            syncRPOptions();
+            selectScenario();
         }});
 
         // Handle return period change
         document.getElementById('returnPeriod').addEventListener('change', function(e) {{
             currentRP = e.target.value;
+            updateScale();
             renderVisualization();
         }});
 
@@ -818,10 +1565,13 @@ html_content = f'''<!DOCTYPE html>
 </html>
 '''
 
-# Write the output
-with open('index.html', 'w') as f:
-    f.write(html_content)
+# Write the output, with pre-compressed siblings for static hosting
+written = write_streamed('index.html', itertools.chain([html_prefix], iter_json(page_data), [html_suffix]),
+                         precompress=not args.no_precompress, best=args.best_compression)
 
-import os
 file_size = os.path.getsize('index.html') / (1024 * 1024)
 print(f"Generated index.html: {file_size:.1f} MB")
+for path in written[1:]:
+    print(f"  {path}: {os.path.getsize(path) / (1024 * 1024):.1f} MB")
+if not args.no_precompress and brotli is None:
+    print("  (brotli not installed: no .br files)")
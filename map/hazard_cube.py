@@ -0,0 +1,169 @@
+"""Memory-mapped hazard cube: the extracted data as one float32 array.
+
+Layout (three files side by side):
+
+    florida_all_ssp.cube.json    {"format": "chaz-cube", "version": 1,
+                                  "rp_keys": [...], "ssps": [...], "models": [...], "periods": [...],
+                                  "n_points": N, "scenarios": [[ssp, model, period], ...],
+                                  "cube": "florida_all_ssp.cube.npy", "coords": "florida_all_ssp.coords.npy"}
+    florida_all_ssp.cube.npy     float32 (ssp, model, period, point, rp), NaN where a scenario has no point
+    florida_all_ssp.coords.npy   float64 (point, 2) lat, lon
+
+The arrays are .npy files, so open_cube maps them without reading any data
+and each (ssp, model, period) slice is one contiguous block of the file.
+"scenarios" lists the combinations present in the data (pseudo-SSPs and
+change periods do not cover every combination). Points are the union of all
+scenario coordinates in first-seen order, as in the columnar format.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from columnar_format import ENCODINGS, FORMAT_NAME, FORMAT_VERSION, RP_KEYS, _b64, _hundredths
+
+CUBE_FORMAT_NAME = 'chaz-cube'
+CUBE_FORMAT_VERSION = 1
+CUBE_SUFFIX = '.cube.json'
+
+
+def is_cube_path(path):
+    return path.endswith(CUBE_SUFFIX)
+
+
+def _array_paths(path):
+    base = path[:-len(CUBE_SUFFIX)] if is_cube_path(path) else os.path.splitext(path)[0]
+    return base + '.cube.npy', base + '.coords.npy'
+
+
+def _ordered_union(lists):
+    seen = {}
+    for names in lists:
+        seen.update(dict.fromkeys(names))
+    return list(seen)
+
+
+def write_cube(path, all_data):
+    """Write all_data ({ssp: {model: {period: [point dicts]}}}) as a cube at path (<name>.cube.json).
+
+    The cube is filled one scenario at a time through a memory map, so it is
+    never held in memory whole. Returns the paths written.
+    """
+    ssps = list(all_data)
+    models = _ordered_union(all_data[ssp] for ssp in ssps)
+    periods = _ordered_union(by_period for ssp in ssps for by_period in all_data[ssp].values())
+    scenarios = [(ssp, model, period) for ssp in ssps for model in all_data[ssp] for period in all_data[ssp][model]]
+
+    # Shared coordinates: union of all scenario points, in first-seen order,
+    # joined on integer keys (hundredths of a degree)
+    keys, lat_lon = {}, []
+    for ssp, model, period in scenarios:
+        points = all_data[ssp][model][period]
+        table = np.array([[p['lat'], p['lon']] for p in points], dtype=np.float64).reshape(-1, 2)
+        keys[(ssp, model, period)] = (_hundredths(table[:, 0]).astype(np.int64) * 100000
+                                      + _hundredths(table[:, 1]).astype(np.int64))
+        lat_lon.append(table)
+    all_keys = np.concatenate(list(keys.values())) if keys else np.empty(0, dtype=np.int64)
+    unique_keys, first = np.unique(all_keys, return_index=True)
+    order = np.argsort(first)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    coords = np.concatenate(lat_lon)[first[order]] if lat_lon else np.empty((0, 2))
+
+    cube_path, coords_path = _array_paths(path)
+    shape = (len(ssps), len(models), len(periods), len(order), len(RP_KEYS))
+    cube = np.lib.format.open_memmap(cube_path + '.tmp', mode='w+', dtype='<f4', shape=shape)
+    for s, ssp in enumerate(ssps):
+        for m, model in enumerate(models):
+            for p, period in enumerate(periods):
+                block = np.full((len(order), len(RP_KEYS)), np.nan, dtype='<f4')
+                points = all_data[ssp].get(model, {}).get(period)
+                if points:
+                    ids = rank[np.searchsorted(unique_keys, keys[(ssp, model, period)])]
+                    block[ids] = [[point[rp] for rp in RP_KEYS] for point in points]
+                cube[s, m, p] = block
+    cube.flush()
+    del cube
+    with open(coords_path + '.tmp', 'wb') as f:
+        np.save(f, coords.astype('<f8'))
+    index = {
+        'format': CUBE_FORMAT_NAME,
+        'version': CUBE_FORMAT_VERSION,
+        'rp_keys': RP_KEYS,
+        'ssps': ssps,
+        'models': models,
+        'periods': periods,
+        'n_points': len(order),
+        'scenarios': [list(key) for key in scenarios],
+        'cube': os.path.basename(cube_path),
+        'coords': os.path.basename(coords_path),
+    }
+    with open(path + '.tmp', 'w') as f:
+        json.dump(index, f, indent=1)
+    # The index goes last, so a reader never sees it before its arrays
+    os.replace(cube_path + '.tmp', cube_path)
+    os.replace(coords_path + '.tmp', coords_path)
+    os.replace(path + '.tmp', path)
+    return [path, cube_path, coords_path]
+
+
+def open_cube(path):
+    """Open a cube (<name>.cube.json) with its arrays memory-mapped read-only.
+
+    Returns {'index': the JSON index, 'cube': (ssp, model, period, point,
+    rp) float32 memmap, 'coords': (point, 2) lat/lon memmap}.
+    """
+    with open(path, 'r') as f:
+        index = json.load(f)
+    if index.get('format') != CUBE_FORMAT_NAME:
+        raise ValueError(f"{path} is not a {CUBE_FORMAT_NAME} index")
+    folder = os.path.dirname(path)
+    return {
+        'index': index,
+        'cube': np.load(os.path.join(folder, index['cube']), mmap_mode='r'),
+        'coords': np.load(os.path.join(folder, index['coords']), mmap_mode='r'),
+    }
+
+
+def cube_table(cube, ssp, model, period):
+    """(n_points, 6) float64 values of one scenario on the shared points, NaN where it has no point.
+
+    Only this scenario's slice of the file is read. Values are rounded back
+    to the 0.1 m/s of extraction, as columnar_format.decode_scenario does.
+    """
+    index = cube['index']
+    s, m, p = index['ssps'].index(ssp), index['models'].index(model), index['periods'].index(period)
+    return np.floor(np.asarray(cube['cube'][s, m, p], dtype=np.float64) * 10 + 0.5) / 10
+
+
+def cube_to_columnar(cube, encoding='int16'):
+    """The columnar document (see columnar_format) of a cube, for tools that read that format."""
+    dtype, scale = ENCODINGS[encoding]
+    index = cube['index']
+    coords = np.asarray(cube['coords'])
+    data = {}
+    for ssp, model, period in index['scenarios']:
+        table = cube_table(cube, ssp, model, period)
+        ids = np.flatnonzero(~np.isnan(table).all(axis=1)).astype(np.int32)
+        columns = table[ids].T
+        if encoding == 'int16':
+            columns = np.rint(columns * 10)
+        entry = {'n': len(ids), 'values': _b64(columns, dtype)}
+        if len(ids) != len(coords):
+            entry['index'] = _b64(ids, '<i4')
+        data.setdefault(ssp, {}).setdefault(model, {})[period] = entry
+    return {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'rp_keys': RP_KEYS,
+        'ssps': index['ssps'],
+        'models': index['models'],
+        'periods': index['periods'],
+        'encoding': encoding,
+        'scale': scale,
+        'n_points': len(coords),
+        'lat': _b64(_hundredths(coords[:, 0]), '<i4'),
+        'lon': _b64(_hundredths(coords[:, 1]), '<i4'),
+        'data': data,
+    }
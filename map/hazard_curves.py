@@ -0,0 +1,137 @@
+"""Hazard curves through the six return-period winds of every point.
+
+    from hazard_curves import fit_curves, return_period_of, wind_at
+    curves = fit_curves(lookup(lats, lons, 'ssp585', 'CESM2', 'fut2'))
+    winds = wind_at(curves, [200, 500])       # m/s at the 200- and 500-year return periods
+    years = return_period_of(curves, [50])    # return period of a 50 m/s wind
+
+fit_curves takes any (..., 6) array of rp10..rp1000 winds, e.g. a
+hazard_query table or a stacked table reshaped to (n, scenarios, 6), and
+fits every curve at once:
+
+    loglinear  wind linear in log(return period) between the six values and
+               along the end segments beyond them (default). Exact at the six
+               return periods.
+    gumbel     least-squares Gumbel fit, wind = loc + scale * y, with y the
+               reduced variate -log(-log(1 - 1/T)).
+    gev        least-squares GEV fit; the shape is picked from GEV_SHAPES and
+               loc and scale are solved in closed form for each shape.
+
+Return periods are in years (exceedance probability 1/T per year). Inverse
+answers are at least RP_MIN and inf where a curve never reaches the wind;
+curves and answers are NaN where a point has no values.
+"""
+
+import numpy as np
+
+from columnar_format import RP_KEYS
+
+CURVE_METHODS = ('loglinear', 'gumbel', 'gev')
+RP_YEARS = np.array([float(rp[2:]) for rp in RP_KEYS])
+RP_MIN = 1.0
+# Shape parameters tried by the GEV fit (0 is the Gumbel case)
+GEV_SHAPES = np.linspace(-0.5, 0.5, 101)
+# Curves fitted per GEV batch, bounding the (curves, shapes) arrays
+GEV_BATCH = 1 << 16
+
+_LOG_RP = np.log(RP_YEARS)
+
+
+def return_period_years(rps):
+    """Return periods given as 'rp200', 200 or '200', as floats."""
+    return np.array([float(str(rp)[2:] if str(rp).startswith('rp') else rp) for rp in np.atleast_1d(rps)])
+
+
+def _reduced_variate(years, shape=0.0):
+    """GEV reduced variate of return periods (Gumbel for shape 0); broadcasts years and shape."""
+    t = -np.log1p(-1 / np.asarray(years, dtype=np.float64))
+    shape = np.asarray(shape, dtype=np.float64)
+    gumbel = np.abs(shape) < 1e-9
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(gumbel, -np.log(t), (t ** -np.where(gumbel, 1.0, shape) - 1) / np.where(gumbel, 1.0, shape))
+
+
+def fit_curves(values, method='loglinear'):
+    """Fit hazard curves to an (..., 6) array of rp10..rp1000 winds.
+
+    Returns {'method', ...}: the values themselves for loglinear, or 'loc',
+    'scale' (and 'shape' for gev) arrays of shape values.shape[:-1].
+    """
+    if method not in CURVE_METHODS:
+        raise ValueError(f"method must be one of {CURVE_METHODS}, not {method!r}")
+    values = np.asarray(values, dtype=np.float64)
+    if values.shape[-1] != len(RP_KEYS):
+        raise ValueError(f"expected {len(RP_KEYS)} return-period values per curve, got {values.shape[-1]}")
+    if method == 'loglinear':
+        return {'method': method, 'values': values}
+
+    flat = values.reshape(-1, len(RP_KEYS))
+    centred = flat - flat.mean(axis=1, keepdims=True)
+    if method == 'gumbel':
+        shape = np.zeros(len(flat))
+    else:
+        # Least squares for every shape at once: the residual is Svv - Szv^2 / Szz
+        z = _reduced_variate(RP_YEARS, GEV_SHAPES[:, None])
+        zc = z - z.mean(axis=1, keepdims=True)
+        shape = np.empty(len(flat))
+        for start in range(0, len(flat), GEV_BATCH):
+            szv = centred[start:start + GEV_BATCH] @ zc.T
+            best = np.argmax(szv * szv / (zc * zc).sum(axis=1), axis=1)
+            shape[start:start + GEV_BATCH] = GEV_SHAPES[best]
+    z = _reduced_variate(RP_YEARS, shape[:, None])
+    zc = z - z.mean(axis=1, keepdims=True)
+    scale = (centred * zc).sum(axis=1) / (zc * zc).sum(axis=1)
+    loc = flat.mean(axis=1) - scale * z.mean(axis=1)
+    curves = {'method': method, 'loc': loc.reshape(values.shape[:-1]), 'scale': scale.reshape(values.shape[:-1])}
+    if method == 'gev':
+        curves['shape'] = shape.reshape(values.shape[:-1])
+    return curves
+
+
+def wind_at(curves, rps):
+    """Winds at return periods ('rp200', 200 or '200'); an (..., len(rps)) array."""
+    years = return_period_years(rps)
+    if curves['method'] == 'loglinear':
+        values = curves['values']
+        x = np.log(years)
+        seg = np.clip(np.searchsorted(_LOG_RP, x, side='right') - 1, 0, len(RP_KEYS) - 2)
+        frac = (x - _LOG_RP[seg]) / (_LOG_RP[seg + 1] - _LOG_RP[seg])
+        return values[..., seg] + frac * (values[..., seg + 1] - values[..., seg])
+    shape = curves.get('shape', np.zeros_like(curves['loc']))[..., None]
+    return curves['loc'][..., None] + curves['scale'][..., None] * _reduced_variate(years, shape)
+
+
+def return_period_of(curves, winds):
+    """Return periods (years) at which the curves reach winds; an (..., len(winds)) array."""
+    winds = np.atleast_1d(np.asarray(winds, dtype=np.float64))
+    if curves['method'] == 'loglinear':
+        # On the running maximum, the segment where the curve first reaches the wind
+        values = np.maximum.accumulate(curves['values'], axis=-1)[..., None, :]
+        seg = np.clip((values < winds[:, None]).sum(axis=-1) - 1, 0, len(RP_KEYS) - 2)
+        v0 = np.take_along_axis(values, seg[..., None], axis=-1)[..., 0]
+        v1 = np.take_along_axis(values, seg[..., None] + 1, axis=-1)[..., 0]
+        x0, x1 = _LOG_RP[seg], _LOG_RP[seg + 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = x0 + (winds - v0) * (x1 - x0) / (v1 - v0)
+        # Flat end segments: beyond them the wind is never (or always) reached
+        x = np.where(v1 == v0, np.where(winds > v0, np.inf, np.where(winds < v0, -np.inf, x0)), x)
+        x = np.where(np.isnan(v0), np.nan, x)
+        with np.errstate(over='ignore'):
+            return np.maximum(np.exp(x), RP_MIN)
+
+    loc, scale = curves['loc'][..., None], curves['scale'][..., None]
+    shape = curves.get('shape', np.zeros_like(curves['loc']))[..., None]
+    gumbel = np.abs(shape) < 1e-9
+    safe_shape = np.where(gumbel, 1.0, shape)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        z = (winds - loc) / scale
+        base = 1 + shape * z
+        # t = -log(1 - 1/T); outside a bounded GEV tail the wind is never (or always) reached
+        t = np.where(gumbel, np.exp(-z), np.where(base > 0, base ** (-1 / safe_shape), np.nan))
+        outside = ~gumbel & (base <= 0)
+        t = np.where(outside & (shape < 0), 0.0, np.where(outside, np.inf, t))
+        years = 1 / -np.expm1(-t)
+    # Flat or falling fits: reached everywhere at or below loc, never above it
+    years = np.where(scale > 0, years, np.where(winds > loc, np.inf, RP_MIN))
+    years = np.where(np.isnan(loc) | np.isnan(scale), np.nan, years)
+    return np.maximum(years, RP_MIN)
@@ -0,0 +1,522 @@
+"""Build-time map layers for the generated page.
+
+Ports the page's IDW gridding to vectorized NumPy so heatmaps can be rendered
+once per scenario and return period instead of in the browser.
+"""
+
+import base64
+import struct
+import zlib
+
+import numpy as np
+
+# IDW settings shared with the page's idwGrid()
+IDW_POWER = 2
+IDW_MAX_DIST = 0.15   # degrees - tight constraint to data
+IDW_PADDING = 0.05    # degrees around the data bounds
+IDW_EXACT_DIST = 0.001
+HEATMAP_GRID = 150
+
+# Spatial index bucket size (degrees); just over IDW_MAX_DIST so the 3x3
+# buckets around a query hold every point within maxDist
+SPATIAL_CELL = 0.16
+
+# Wind speed colour bins (m/s), as in the page's getColorRGB()
+COLOR_THRESHOLDS = [20, 30, 40, 45, 50, 55, 60, 70, 80]
+COLOR_RGB = [
+    (49, 54, 149), (69, 117, 180), (116, 173, 209), (171, 217, 233), (255, 255, 191),
+    (254, 224, 144), (253, 174, 97), (244, 109, 67), (215, 48, 39), (165, 0, 38),
+]
+HEATMAP_ALPHA = 180
+
+
+def grid_geometry(lats, lons, nx, ny):
+    """Grid origin and spacing covering the data bounds, as in getDataBounds()/idwGrid()."""
+    lat_min = float(np.min(lats)) - IDW_PADDING
+    lat_max = float(np.max(lats)) + IDW_PADDING
+    lon_min = float(np.min(lons)) - IDW_PADDING
+    lon_max = float(np.max(lons)) + IDW_PADDING
+    return {
+        'nx': nx, 'ny': ny, 'lon_min': lon_min, 'lat_min': lat_min,
+        'dx': (lon_max - lon_min) / (nx - 1), 'dy': (lat_max - lat_min) / (ny - 1),
+    }
+
+
+def idw_grid(lats, lons, values, nx=HEATMAP_GRID, ny=HEATMAP_GRID):
+    """Inverse-distance-weighted grid of one or more value columns.
+
+    values is (n,) or (n, k); returns (geometry, raw, valid) with raw shaped
+    (k, ny, nx) (or (ny, nx) for 1-D values) and valid shaped (ny, nx).
+
+    Each point only visits the grid cells inside its maxDist window, and
+    contributions reach each cell in point order, so the result matches the
+    page's all-pairs loop exactly - including its early exit on a point
+    closer than IDW_EXACT_DIST, where nearCount only includes the points
+    seen before it.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    squeeze = values.ndim == 1
+    if squeeze:
+        values = values[:, None]
+    n = len(lats)
+    g = grid_geometry(lats, lons, nx, ny)
+    dx, dy = g['dx'], g['dy']
+
+    # Candidate (point, cell) pairs in a window around each point, point-major
+    kx = int(np.ceil(IDW_MAX_DIST / dx)) + 1
+    ky = int(np.ceil(IDW_MAX_DIST / dy)) + 1
+    ix0 = np.floor((lons - g['lon_min']) / dx).astype(np.int64)
+    iy0 = np.floor((lats - g['lat_min']) / dy).astype(np.int64)
+    oy, ox = np.meshgrid(np.arange(-ky, ky + 2), np.arange(-kx, kx + 2), indexing='ij')
+    ix = (ix0[:, None] + ox.ravel()[None, :]).ravel()
+    iy = (iy0[:, None] + oy.ravel()[None, :]).ravel()
+    pj = np.repeat(np.arange(n), ox.size)
+    inside = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+    ix, iy, pj = ix[inside], iy[inside], pj[inside]
+
+    d_lat = (g['lat_min'] + iy * dy) - lats[pj]
+    d_lon = (g['lon_min'] + ix * dx) - lons[pj]
+    dist = np.sqrt(d_lat * d_lat + d_lon * d_lon)
+    near = dist < IDW_MAX_DIST
+    cell, pj, dist = (iy * nx + ix)[near], pj[near], dist[near]
+    n_cells = nx * ny
+
+    # First exact hit per cell (in point order) ends that cell's loop
+    hit_point = np.full(n_cells, n, dtype=np.int64)
+    exact = dist < IDW_EXACT_DIST
+    np.minimum.at(hit_point, cell[exact], pj[exact])
+    has_hit = hit_point < n
+    counted = pj <= hit_point[cell]
+    near_count = np.bincount(cell[counted], minlength=n_cells)
+
+    with np.errstate(divide='ignore'):
+        weights = 1 / dist ** IDW_POWER
+    weight_sum = np.bincount(cell, weights, minlength=n_cells)
+    weight_sum[has_hit] = 1
+    raw = np.empty((values.shape[1], n_cells))
+    for k in range(values.shape[1]):
+        value_sum = np.bincount(cell, weights * values[pj, k], minlength=n_cells)
+        value_sum[has_hit] = values[hit_point[has_hit], k]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            raw[k] = value_sum / weight_sum
+
+    valid = (near_count >= 2) & (weight_sum > 0)
+    raw[:, ~valid] = 0
+    raw = raw.reshape(-1, ny, nx)
+    return g, (raw[0] if squeeze else raw), valid.reshape(ny, nx)
+
+
+def bucket_index(lats, lons, cell=SPATIAL_CELL):
+    """Uniform-bucket index over point coordinates, as NumPy arrays.
+
+    Point ids are sorted by bucket (ascending within a bucket) and
+    offsets[b]:offsets[b + 1] slices the ids in bucket b = by * nx + bx, with
+    bx = floor((lon - lon0) / cell) and by = floor((lat - lat0) / cell).
+    Returns None when there are no points.
+    """
+    if len(lats) == 0:
+        return None
+    lat0, lon0 = float(np.min(lats)), float(np.min(lons))
+    bx = np.floor((lons - lon0) / cell).astype(np.int64)
+    by = np.floor((lats - lat0) / cell).astype(np.int64)
+    nx, ny = int(bx.max()) + 1, int(by.max()) + 1
+    bucket = by * nx + bx
+    return {
+        'cell': cell, 'lat0': lat0, 'lon0': lon0, 'nx': nx, 'ny': ny,
+        'offsets': np.concatenate([[0], np.cumsum(np.bincount(bucket, minlength=nx * ny))]),
+        'ids': np.argsort(bucket, kind='stable'),
+    }
+
+
+def spatial_index(lats, lons, cell=SPATIAL_CELL):
+    """bucket_index for the page's neighbour searches, with offsets and ids as base64 int32."""
+    index = bucket_index(lats, lons, cell)
+    if index is None:
+        return None
+    for key in ('offsets', 'ids'):
+        index[key] = base64.b64encode(index[key].astype('<i4').tobytes()).decode('ascii')
+    return index
+
+
+def grid_bounds(g):
+    """Leaflet image bounds for a grid, as renderHeatmap() computes them."""
+    return [[g['lat_min'], g['lon_min']],
+            [g['lat_min'] + g['ny'] * g['dy'], g['lon_min'] + g['nx'] * g['dx']]]
+
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+
+def palette_png(indices, palette, alpha):
+    """Encode an (h, w) uint8 index image as a palette PNG with per-entry alpha."""
+    h, w = indices.shape
+    rows = np.hstack([np.zeros((h, 1), dtype=np.uint8), indices.astype(np.uint8)])
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 3, 0, 0, 0)),
+        _png_chunk(b'PLTE', b''.join(bytes(rgb) for rgb in palette)),
+        _png_chunk(b'tRNS', bytes(alpha)),
+        _png_chunk(b'IDAT', zlib.compress(rows.tobytes(), 9)),
+        _png_chunk(b'IEND', b''),
+    ])
+
+
+def heatmap_png(raw, valid, scale='wind'):
+    """Colour one IDW grid into a PNG, north-up, with invalid cells transparent."""
+    thresholds, rgb = LAYER_SCALES[scale]['thresholds'], LAYER_SCALES[scale]['rgb']
+    transparent = len(rgb)
+    indices = np.searchsorted(thresholds, raw, side='right')
+    indices[~valid] = transparent
+    palette = rgb + [(0, 0, 0)]
+    alpha = [HEATMAP_ALPHA] * len(rgb) + [0]
+    return palette_png(indices[::-1], palette, alpha)
+
+
+def heatmap_layers(lats, lons, values, rp_keys, nx=HEATMAP_GRID, ny=HEATMAP_GRID, scale='wind'):
+    """Heatmap overlays for every return period of one scenario, coloured on a LAYER_SCALES scale.
+
+    Returns {'bounds': [[s, w], [n, e]], 'images': {rp: base64 PNG}}, or None
+    for a scenario without points.
+    """
+    if len(lats) == 0:
+        return None
+    g, raw, valid = idw_grid(lats, lons, values, nx, ny)
+    images = {}
+    for k, rp in enumerate(rp_keys):
+        images[rp] = base64.b64encode(heatmap_png(raw[k], valid, scale)).decode('ascii')
+    return {'bounds': grid_bounds(g), 'images': images}
+
+
+# Contour settings shared with the page's renderContours()
+CONTOUR_GRID = 120
+CONTOUR_THRESHOLDS = [30, 40, 45, 50, 55, 60, 70]
+CONTOUR_RGB = [(69, 117, 180), (116, 173, 209), (171, 217, 233), (254, 224, 144), (253, 174, 97),
+               (244, 109, 67), (215, 48, 39)]
+CONTOUR_MIN_LABEL_LENGTH = 8  # minimum points for a contour to get a label
+# Contour coordinates are stored as integers in units of 1 / CONTOUR_SCALE degrees
+CONTOUR_SCALE = 10000
+
+# Diverging colour bins for the change layers (extract_all_ssp.derived_layers),
+# blue for weaker and red for stronger winds
+CHANGE_RGB = [
+    (33, 102, 172), (67, 147, 195), (146, 197, 222), (209, 229, 240), (247, 247, 247),
+    (253, 219, 199), (244, 165, 130), (214, 96, 77), (178, 24, 43),
+]
+
+# Colour and contour scales by layer kind, shared with the page's LAYER_SCALES
+LAYER_SCALES = {
+    'wind': {'unit': 'm/s', 'thresholds': COLOR_THRESHOLDS, 'rgb': COLOR_RGB,
+             'contours': CONTOUR_THRESHOLDS, 'contour_rgb': CONTOUR_RGB},
+    'delta': {'unit': 'm/s', 'thresholds': [-10, -6, -3, -1, 1, 3, 6, 10], 'rgb': CHANGE_RGB,
+              'contours': [-6, -3, 3, 6], 'contour_rgb': [CHANGE_RGB[0], CHANGE_RGB[1], CHANGE_RGB[7], CHANGE_RGB[8]]},
+    'pct': {'unit': '%', 'thresholds': [-20, -10, -5, -2, 2, 5, 10, 20], 'rgb': CHANGE_RGB,
+            'contours': [-10, -5, 5, 10], 'contour_rgb': [CHANGE_RGB[0], CHANGE_RGB[1], CHANGE_RGB[7], CHANGE_RGB[8]]},
+    # Return periods of a wind speed (hazard_curves.return_period_of): short is red
+    'rp': {'unit': 'years', 'thresholds': [10, 25, 50, 100, 250, 500, 1000, 2500, 10000], 'rgb': COLOR_RGB[::-1],
+           'contours': [50, 100, 250, 1000], 'contour_rgb': [(215, 48, 39), (244, 109, 67), (116, 173, 209), (69, 117, 180)]},
+}
+# Return periods above this are stored and drawn as this (years)
+RP_LAYER_LIMIT = 100000
+
+
+def layer_scale(ssp, period, rp=None):
+    """LAYER_SCALES key for a scenario: '<period>_pct' is 'pct', other '_delta' layers 'delta'.
+
+    Return-period columns ('rp_of_<wind>') are 'rp' whatever the scenario.
+    """
+    if rp is not None and rp.startswith('rp_of_'):
+        return 'rp'
+    if period.endswith('_pct'):
+        return 'pct'
+    if period.endswith('_delta') or ssp.endswith('_delta'):
+        return 'delta'
+    return 'wind'
+
+# Marching-squares segments per case as pairs of cell edges, in buildSegments() order.
+# Saddles (5, 10) pick their pair by the cell-centre value.
+_TOP, _RIGHT, _BOTTOM, _LEFT = range(4)
+_CASE_SEGMENTS = {
+    1: [(_LEFT, _TOP)], 14: [(_LEFT, _TOP)],
+    2: [(_TOP, _RIGHT)], 13: [(_TOP, _RIGHT)],
+    3: [(_LEFT, _RIGHT)], 12: [(_LEFT, _RIGHT)],
+    4: [(_RIGHT, _BOTTOM)], 11: [(_RIGHT, _BOTTOM)],
+    6: [(_TOP, _BOTTOM)], 9: [(_TOP, _BOTTOM)],
+    7: [(_BOTTOM, _LEFT)], 8: [(_BOTTOM, _LEFT)],
+}
+_SADDLE_SEGMENTS = {
+    (5, True): [(_TOP, _RIGHT), (_BOTTOM, _LEFT)], (5, False): [(_LEFT, _TOP), (_RIGHT, _BOTTOM)],
+    (10, True): [(_LEFT, _TOP), (_RIGHT, _BOTTOM)], (10, False): [(_TOP, _RIGHT), (_BOTTOM, _LEFT)],
+}
+
+
+def _edge_crossings(raw, t):
+    """Grid-space crossing of threshold t on every horizontal and vertical edge.
+
+    Returns (hx, vy): hx[iy, ix] is the x of the crossing between corners
+    (ix, iy) and (ix + 1, iy); vy[iy, ix] the y between (ix, iy) and (ix, iy + 1).
+    Same arithmetic as contourInterpolate().
+    """
+    ny, nx = raw.shape
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dh = raw[:, 1:] - raw[:, :-1]
+        sh = np.where(np.abs(dh) < 1e-12, 0.5, (t - raw[:, :-1]) / dh)
+        dv = raw[1:, :] - raw[:-1, :]
+        sv = np.where(np.abs(dv) < 1e-12, 0.5, (t - raw[:-1, :]) / dv)
+    hx = np.arange(nx - 1)[None, :] + sh
+    vy = np.arange(ny - 1)[:, None] + sv
+    return hx, vy
+
+
+def contour_segments(raw, valid, t):
+    """Marching-squares segments for threshold t as pairs of integer edge IDs.
+
+    Edge IDs are 2 * (iy * nx + ix) for the horizontal edge leaving corner
+    (ix, iy) eastwards and 2 * (iy * nx + ix) + 1 for the vertical edge leaving
+    it northwards, so neighbouring cells share endpoint IDs exactly.
+    Returns (seg_a, seg_b) arrays in the page's cell order.
+    """
+    ny, nx = raw.shape
+    tl, tr = raw[:-1, :-1], raw[:-1, 1:]
+    bl, br = raw[1:, :-1], raw[1:, 1:]
+    all_valid = valid[:-1, :-1] & valid[:-1, 1:] & valid[1:, :-1] & valid[1:, 1:]
+    case = ((tl >= t) * 1 + (tr >= t) * 2 + (br >= t) * 4 + (bl >= t) * 8)
+    case[~all_valid] = 0
+    centre_high = (tl + tr + br + bl) / 4 >= t
+
+    iy, ix = np.mgrid[0:ny - 1, 0:nx - 1]
+    corner = iy * nx + ix
+    edges = np.stack([2 * corner, 2 * (corner + 1) + 1, 2 * (corner + nx), 2 * corner + 1])
+
+    cells, slots, seg_a, seg_b = [], [], [], []
+    tables = [(case == c, pairs) for c, pairs in _CASE_SEGMENTS.items()]
+    tables += [((case == c) & (centre_high == high), pairs) for (c, high), pairs in _SADDLE_SEGMENTS.items()]
+    for mask, pairs in tables:
+        flat = np.flatnonzero(mask)
+        for slot, (ea, eb) in enumerate(pairs):
+            cells.append(flat)
+            slots.append(np.full(len(flat), slot))
+            seg_a.append(edges[ea].ravel()[flat])
+            seg_b.append(edges[eb].ravel()[flat])
+    if not cells:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    order = np.lexsort((np.concatenate(slots), np.concatenate(cells)))
+    return np.concatenate(seg_a)[order], np.concatenate(seg_b)[order]
+
+
+def _edge_points(edge_ids, hx, vy, nx):
+    """Grid-space (x, y) of the crossing on each edge ID."""
+    corner, vertical = np.divmod(edge_ids, 2)
+    iy, ix = np.divmod(corner, nx)
+    x = np.where(vertical == 1, ix, hx[iy, np.minimum(ix, nx - 2)])
+    y = np.where(vertical == 1, vy[np.minimum(iy, vy.shape[0] - 1), ix], iy)
+    return x.astype(np.float64), y.astype(np.float64)
+
+
+def stitch_segments(seg_a, seg_b):
+    """Join segments sharing an edge ID into polylines of edge IDs.
+
+    Every edge carries at most one crossing and belongs to at most two
+    cells, so each ID joins at most two segments; chains are walked in both
+    directions and closed loops end on their starting ID.
+    """
+    n = len(seg_a)
+    ends = np.concatenate([seg_a, seg_b])
+    owner = np.concatenate([np.arange(n), np.arange(n)])
+    order = np.argsort(ends, kind='stable')
+    ends, owner = ends[order], owner[order]
+    # partner[k]: the other segment on the same edge as segment-end k
+    partner = np.full(2 * n, -1)
+    same = ends[1:] == ends[:-1]
+    partner[order[1:][same]] = owner[:-1][same]
+    partner[order[:-1][same]] = owner[1:][same]
+    seg_a, seg_b = seg_a.tolist(), seg_b.tolist()
+    partner_a, partner_b = partner[:n].tolist(), partner[n:].tolist()
+
+    def walk(seg, node):
+        """Follow segments from seg leaving via node; returns the IDs passed."""
+        path = []
+        while True:
+            nxt = partner_a[seg] if node == seg_a[seg] else partner_b[seg]
+            if nxt < 0 or used[nxt]:
+                return path
+            used[nxt] = True
+            node = seg_b[nxt] if seg_a[nxt] == node else seg_a[nxt]
+            path.append(node)
+            seg = nxt
+
+    used = [False] * n
+    polylines = []
+    for i in range(n):
+        if used[i]:
+            continue
+        used[i] = True
+        forward = walk(i, seg_b[i])
+        if forward and forward[-1] == seg_a[i]:
+            polylines.append([seg_a[i], seg_b[i]] + forward)  # closed loop
+            continue
+        backward = walk(i, seg_a[i])
+        polylines.append(backward[::-1] + [seg_a[i], seg_b[i]] + forward)
+    return polylines
+
+
+def simplify_polyline(points, tolerance):
+    """Douglas-Peucker simplification of an (n, 2) array; keeps both ends."""
+    n = len(points)
+    if tolerance <= 0 or n < 3:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = points[start], points[end]
+        inner = points[start + 1:end]
+        ab = b - a
+        length = np.hypot(ab[0], ab[1])
+        if length == 0:
+            dist = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+        else:
+            dist = np.abs(ab[0] * (inner[:, 1] - a[1]) - ab[1] * (inner[:, 0] - a[0])) / length
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            mid = start + 1 + k
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return points[keep]
+
+
+def contour_lines(raw, valid, g, t, land_mask=None, tolerance=0.0):
+    """Iso-lines of threshold t as (lat, lon) arrays plus label anchors.
+
+    Segments whose midpoint fails land_mask(lons, lats) are dropped before
+    stitching, as in buildSegments(). Labels sit at the middle point of
+    chains with at least CONTOUR_MIN_LABEL_LENGTH points, before simplification.
+    """
+    ny, nx = raw.shape
+    seg_a, seg_b = contour_segments(raw, valid, t)
+    if len(seg_a) == 0:
+        return [], []
+    hx, vy = _edge_crossings(raw, t)
+    node_ids = np.unique(np.concatenate([seg_a, seg_b]))
+    x, y = _edge_points(node_ids, hx, vy, nx)
+    node_lat = g['lat_min'] + y * g['dy']
+    node_lon = g['lon_min'] + x * g['dx']
+
+    if land_mask is not None:
+        ia, ib = np.searchsorted(node_ids, seg_a), np.searchsorted(node_ids, seg_b)
+        keep = land_mask((node_lon[ia] + node_lon[ib]) / 2, (node_lat[ia] + node_lat[ib]) / 2)
+        seg_a, seg_b = seg_a[keep], seg_b[keep]
+
+    lines, labels = [], []
+    for chain in stitch_segments(seg_a, seg_b):
+        k = np.searchsorted(node_ids, chain)
+        latlon = np.column_stack([node_lat[k], node_lon[k]])
+        if len(latlon) >= CONTOUR_MIN_LABEL_LENGTH:
+            labels.append(latlon[len(latlon) // 2])
+        lines.append(simplify_polyline(latlon, tolerance))
+    return lines, labels
+
+
+def encode_chains(chains, scale=CONTOUR_SCALE):
+    """Pack (n, 2) lat/lon chains as base64 int32 columns.
+
+    Returns {'lengths': points per chain, 'coords': lat/lon pairs in units of
+    1 / scale degrees, each chain's first point as is and the rest as
+    differences from the point before}. Quantizing before differencing keeps
+    the running sums on the page exact.
+    """
+    lengths = np.array([len(chain) for chain in chains], dtype=np.int64)
+    coords = np.rint(np.concatenate(chains) * scale).astype(np.int64) if chains else np.empty((0, 2), np.int64)
+    deltas = coords.copy()
+    deltas[1:] -= coords[:-1]
+    starts = np.cumsum(lengths) - lengths
+    deltas[starts[lengths > 0]] = coords[starts[lengths > 0]]
+    return {
+        'lengths': base64.b64encode(lengths.astype('<i4').tobytes()).decode('ascii'),
+        'coords': base64.b64encode(deltas.astype('<i4').tobytes()).decode('ascii'),
+    }
+
+
+def contour_layers(lats, lons, values, rp_keys, land_mask=None, tolerance=0.0,
+                   nx=CONTOUR_GRID, ny=CONTOUR_GRID, thresholds=CONTOUR_THRESHOLDS):
+    """Packed contour layers for every return period of one scenario.
+
+    Returns {rp: {'scale': CONTOUR_SCALE, 'features': [...]}} with one feature
+    per threshold that has lines: {'threshold', 'lengths', 'coords' (see
+    encode_chains), 'labels': base64 int32 lat/lon label anchors in the same
+    units}, or None for a scenario without points.
+    """
+    if len(lats) == 0:
+        return None
+    g, raw, valid = idw_grid(lats, lons, values, nx, ny)
+    layers = {}
+    for k, rp in enumerate(rp_keys):
+        features = []
+        for t in thresholds:
+            lines, labels = contour_lines(raw[k], valid, g, t, land_mask, tolerance)
+            if not lines:
+                continue
+            anchors = np.rint(np.reshape(labels, (-1, 2)) * CONTOUR_SCALE).astype('<i4')
+            features.append({'threshold': t, **encode_chains(lines),
+                             'labels': base64.b64encode(anchors.tobytes()).decode('ascii')})
+        layers[rp] = {'scale': CONTOUR_SCALE, 'features': features}
+    return layers
+
+
+# Level-of-detail settings for the page's circle view: a cell is this many
+# screen pixels wide at its zoom, and levels stop once aggregation would keep
+# more than this fraction of the points (the page then draws them all)
+LOD_CELL_PIXELS = 16
+LOD_FULL_FRACTION = 0.5
+LOD_MAX_ZOOM = 18
+
+
+def lod_cell(zoom, cell_pixels=LOD_CELL_PIXELS):
+    """Cell size in degrees covering cell_pixels at a Leaflet zoom level (256 px tiles)."""
+    return cell_pixels * 360 / (256 * 2 ** zoom)
+
+
+def lod_pyramid(lats, lons, values, rp_keys, cell_pixels=LOD_CELL_PIXELS, magnitude=False):
+    """Point pyramid for drawing one scenario's circles at each zoom level.
+
+    Level z covers zoom z with a global grid of lod_cell(z) cells and keeps
+    the strongest point of each cell for each return period (the first one
+    on ties), so a zoomed-out map shows the peak winds rather than whichever
+    markers land on top. Returns {'full_zoom': z, 'dtype': 'uint16' or
+    'int32', 'levels': [...]}, where levels[z] = {'cell': degrees, 'points':
+    {rp: base64 point indices, ascending}} for zooms 0 .. full_zoom - 1; from
+    full_zoom on every point is drawn. Indices are uint16 when every point
+    index fits. With magnitude set (change layers) the largest absolute value
+    wins instead. None for a scenario without points.
+    """
+    n = len(lats)
+    if n == 0:
+        return None
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    order_ids = np.arange(n)
+    strength = np.abs(values) if magnitude else values
+    dtype, dtype_name = ('<u2', 'uint16') if n <= 1 << 16 else ('<i4', 'int32')
+    levels = []
+    for zoom in range(LOD_MAX_ZOOM + 1):
+        cell = lod_cell(zoom, cell_pixels)
+        cx = np.floor((lons + 180) / cell).astype(np.int64)
+        cy = np.floor((lats + 90) / cell).astype(np.int64)
+        _, cells = np.unique(cy * (int(360 / cell) + 2) + cx, return_inverse=True)
+        if cells.max() + 1 > LOD_FULL_FRACTION * n:
+            break
+        points = {}
+        for k, rp in enumerate(rp_keys):
+            # Sort by cell, strongest first, then index; the first of each cell wins
+            order = np.lexsort((order_ids, -strength[:, k], cells))
+            first = np.flatnonzero(np.diff(cells[order], prepend=-1))
+            ids = np.sort(order[first]).astype(dtype)
+            points[rp] = base64.b64encode(ids.tobytes()).decode('ascii')
+        levels.append({'cell': cell, 'points': points})
+    return {'full_zoom': len(levels), 'dtype': dtype_name, 'levels': levels}
@@ -0,0 +1,205 @@
+"""Point queries against the extracted hazard data.
+
+    from hazard_query import lookup
+    winds = lookup(lats, lons, 'ssp585', 'CESM2', 'fut2', rps=[100, 250])
+
+The shared coordinates are bucketed once (hazard_layers.bucket_index), and
+batches of query locations are answered with vectorized interpolation that
+follows the page's rules:
+
+    idw      inverse-distance weights (power 2) over points within 0.15
+             degrees, needing at least two of them, as in idwGrid(). A
+             point within 0.001 degrees ends the page's loop: its value is
+             returned if it and the points before it make at least two.
+    nearest  the closest point within 0.1 degrees, as in findNearestPoint().
+
+Locations with no answer get NaN. interpolate() works on any table of
+columns over the shared coordinates, so many scenarios can be answered in
+one pass over the same neighbours.
+"""
+
+import numpy as np
+
+from columnar_format import RP_KEYS, decode_coordinates, decode_scenario, load_hazard_data, scenario_coordinate_ids
+from hazard_cube import cube_table, is_cube_path, open_cube
+from hazard_layers import IDW_EXACT_DIST, IDW_MAX_DIST, IDW_POWER, bucket_index
+
+# findNearestPoint() accepts squared distances below this (0.1 degrees)
+NEAREST_MAX_DIST2 = 0.01
+# Query locations per vectorized batch for a six-column table; wider tables
+# get proportionally smaller batches, bounding the (pairs, columns) arrays
+QUERY_BATCH = 1 << 14
+DEFAULT_INPUT = 'florida_all_ssp.col.json'
+METHODS = ('idw', 'nearest')
+
+_default_hazard = None
+
+
+def open_hazard(path=DEFAULT_INPUT):
+    """Load extracted data and index its coordinates.
+
+    A hazard cube (.cube.json, see hazard_cube) is memory-mapped, and each
+    scenario table is read from its slice on first use; columnar and legacy
+    JSON files are parsed whole.
+    """
+    if is_cube_path(path):
+        cube = open_cube(path)
+        lats, lons = np.array(cube['coords'][:, 0]), np.array(cube['coords'][:, 1])
+        return {'cube': cube, 'lats': lats, 'lons': lons, 'index': bucket_index(lats, lons), 'tables': {}}
+    doc = load_hazard_data(path)
+    lats, lons = decode_coordinates(doc)
+    return {'doc': doc, 'lats': lats, 'lons': lons, 'index': bucket_index(lats, lons), 'tables': {}}
+
+
+def scenario_table(hazard, ssp, model, period):
+    """(n_coords, 6) rp10..rp1000 values on the shared coordinates, NaN where the scenario has no point.
+
+    Tables are cached on the hazard dict.
+    """
+    key = (ssp, model, period)
+    if key not in hazard['tables'] and 'cube' in hazard:
+        hazard['tables'][key] = cube_table(hazard['cube'], ssp, model, period)
+    if key not in hazard['tables']:
+        table = np.full((len(hazard['lats']), len(RP_KEYS)), np.nan)
+        _, _, values = decode_scenario(hazard['doc'], ssp, model, period)
+        ids = scenario_coordinate_ids(hazard['doc'], ssp, model, period)
+        table[slice(None) if ids is None else ids] = values
+        hazard['tables'][key] = table
+    return hazard['tables'][key]
+
+
+def scenario_keys(hazard):
+    """Every (ssp, model, period) in the data, in document order."""
+    if 'cube' in hazard:
+        return [tuple(key) for key in hazard['cube']['index']['scenarios']]
+    return [(ssp, model, period) for ssp, by_model in hazard['doc']['data'].items()
+            for model, by_period in by_model.items() for period in by_period]
+
+
+def stacked_table(hazard, scenarios, rps=None):
+    """(n_coords, len(scenarios) * len(rps)) table: each scenario's rps columns side by side."""
+    columns = rp_columns(rps)
+    return np.hstack([scenario_table(hazard, *key)[:, columns] for key in scenarios])
+
+
+def rp_columns(rps):
+    """Column numbers of return periods given as 'rp100', 100 or '100'; all six when rps is None."""
+    if rps is None:
+        return list(range(len(RP_KEYS)))
+    return [RP_KEYS.index(rp if str(rp).startswith('rp') else f'rp{rp}') for rp in rps]
+
+
+def _ranges(starts, counts):
+    """Concatenated ranges [starts[i], starts[i] + counts[i])."""
+    return np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+def neighbour_pairs(hazard, lats, lons, max_dist):
+    """(query, coordinate, squared distance) pairs from the 3x3 buckets around each query.
+
+    Pairs farther than max_dist (with a little slack for rounding) are
+    dropped; the rest are sorted by query, then coordinate, which is the
+    page's candidate order.
+    """
+    index = hazard['index']
+    cell, nx, ny = index['cell'], index['nx'], index['ny']
+    bx = np.floor((lons - index['lon0']) / cell).astype(np.int64)
+    by = np.floor((lats - index['lat0']) / cell).astype(np.int64)
+    queries, coords = [], []
+    for oy in (-1, 0, 1):
+        for ox in (-1, 0, 1):
+            x, y = bx + ox, by + oy
+            ok = np.flatnonzero((x >= 0) & (x < nx) & (y >= 0) & (y < ny))
+            bucket = y[ok] * nx + x[ok]
+            starts = index['offsets'][bucket]
+            counts = index['offsets'][bucket + 1] - starts
+            queries.append(np.repeat(ok, counts))
+            coords.append(index['ids'][_ranges(starts, counts)])
+    q, c = np.concatenate(queries), np.concatenate(coords)
+    d_lat = lats[q] - hazard['lats'][c]
+    d_lon = lons[q] - hazard['lons'][c]
+    d2 = d_lat * d_lat + d_lon * d_lon
+    keep = np.flatnonzero(d2 < (max_dist * 1.001) ** 2)
+    order = keep[np.lexsort((c[keep], q[keep]))]
+    return q[order], c[order], d2[order]
+
+
+def _interpolate_batch(hazard, lats, lons, table, method):
+    k = table.shape[1]
+    result = np.full((len(lats), k), np.nan)
+    max_dist = IDW_MAX_DIST if method == 'idw' else np.sqrt(NEAREST_MAX_DIST2)
+    q, c, d2 = neighbour_pairs(hazard, lats, lons, max_dist)
+    if not len(q):
+        return result
+    # One segment of consecutive pairs per query that has candidates
+    queries, starts = np.unique(q, return_index=True)
+    values = table[c]
+    present = ~np.isnan(values)
+    pos = np.arange(len(q))[:, None]
+    none = len(q)
+
+    if method == 'nearest':
+        # First candidate (in page order) at the minimum distance, per column
+        d = np.where(present & (d2 < NEAREST_MAX_DIST2)[:, None], d2[:, None], np.inf)
+        best = np.minimum.reduceat(d, starts, axis=0)
+        segment = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, none)))
+        is_best = (d == best[segment]) & np.isfinite(d)
+        pick = np.minimum.reduceat(np.where(is_best, pos, none), starts, axis=0)
+        found = pick < none
+        picked = values[np.minimum(pick, none - 1), np.arange(k)]
+        result[queries] = np.where(found, picked, np.nan)
+        return result
+
+    dist = np.sqrt(d2)[:, None]
+    near = present & (dist < IDW_MAX_DIST)
+    exact = near & (dist < IDW_EXACT_DIST)
+    with np.errstate(divide='ignore'):
+        weights = np.where(near & ~exact, 1 / dist ** IDW_POWER, 0.0)
+    weight_sum = np.add.reduceat(weights, starts, axis=0)
+    value_sum = np.add.reduceat(weights * np.where(present, values, 0.0), starts, axis=0)
+    # The first exact hit ends the page's loop, so only it and the points
+    # before it count towards the two it needs
+    hit = np.minimum.reduceat(np.where(exact, pos, none), starts, axis=0)
+    segment = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, none)))
+    near_count = np.add.reduceat((near & (pos <= hit[segment])).astype(np.int64), starts, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        idw = np.where(weight_sum > 0, value_sum / weight_sum, np.nan)
+    exact_value = values[np.minimum(hit, none - 1), np.arange(k)]
+    result[queries] = np.where(near_count >= 2, np.where(hit < none, exact_value, idw), np.nan)
+    return result
+
+
+def interpolate(hazard, lats, lons, table, method='idw'):
+    """Interpolate the columns of table ((n_coords, k), NaN = no point) at query locations.
+
+    Returns an (n, k) array, NaN where the method finds no answer.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}, not {method!r}")
+    lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+    lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+    out = np.full((len(lats), table.shape[1]), np.nan)
+    if hazard['index'] is None:
+        return out
+    step = max(1, QUERY_BATCH * len(RP_KEYS) // max(table.shape[1], 1))
+    for start in range(0, len(lats), step):
+        batch = slice(start, start + step)
+        out[batch] = _interpolate_batch(hazard, lats[batch], lons[batch], table, method)
+    return out
+
+
+def lookup(lats, lons, ssp, model, period, rps=None, method='idw', hazard=None):
+    """Wind speeds (m/s) at query locations for one scenario.
+
+    Returns an (n, len(rps)) array with columns in rps order; rps are
+    'rp100'-style keys or plain years and default to all six. hazard (see
+    open_hazard) defaults to florida_all_ssp.col.json in the working
+    directory, loaded on first use.
+    """
+    global _default_hazard
+    if hazard is None:
+        if _default_hazard is None:
+            _default_hazard = open_hazard()
+        hazard = _default_hazard
+    table = scenario_table(hazard, ssp, model, period)[:, rp_columns(rps)]
+    return interpolate(hazard, lats, lons, table, method)
@@ -0,0 +1,105 @@
+"""Streamed output for the generated page and its data shards.
+
+write_streamed writes a sequence of text pieces to a file and, in the same
+pass, to .gz and .br siblings. Static hosts can then serve the
+pre-compressed files without compressing on the fly. iter_json yields a
+document's compact JSON text piece by piece, so the full text never exists
+in memory at once; callables in the document are called as they are
+reached, so large parts can be built on demand and dropped once written.
+Brotli output needs the optional brotli package and is skipped without it.
+
+Output goes to .tmp files renamed into place once complete, so a failed
+build never leaves a half-written page or sibling behind.
+"""
+
+import contextlib
+import gzip
+import json
+import os
+
+try:
+    import brotli
+except ImportError:  # optional: .br siblings are skipped without it
+    brotli = None
+
+# Text is encoded and handed to the file and compressors in blocks of this size
+WRITE_BLOCK = 1 << 20
+# Default levels: most of the size gain at a fraction of the time of the maximum
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Levels for best=True (smallest files; several times slower on large pages)
+GZIP_LEVEL_BEST = 9
+BROTLI_QUALITY_BEST = 11
+
+
+def iter_json(value):
+    """Yield the compact JSON text of value in pieces.
+
+    Dicts are walked, callables are replaced by what they return, and every
+    other value is dumped whole, so the largest piece is the largest non-dict
+    value. The concatenation equals json.dumps(value, separators=(',', ':'))
+    with each callable already called.
+    """
+    if callable(value):
+        yield from iter_json(value())
+    elif isinstance(value, dict):
+        yield '{'
+        for i, (key, item) in enumerate(value.items()):
+            yield (',' if i else '') + json.dumps(str(key)) + ':'
+            yield from iter_json(item)
+        yield '}'
+    else:
+        yield json.dumps(value, separators=(',', ':'))
+
+
+def write_streamed(path, pieces, precompress=True, best=False):
+    """Write text pieces to path, plus path.gz and path.br when precompress is set.
+
+    best uses the maximum compression levels. Returns the paths written. The
+    gzip member carries no timestamp, so identical input gives identical .gz
+    bytes. If pieces raises, the temporary files are removed and existing
+    outputs are left as they were.
+    """
+    written = [path]
+    if precompress:
+        written.append(path + '.gz')
+        if brotli is not None:
+            written.append(path + '.br')
+    temps = [name + '.tmp' for name in written]
+    try:
+        with contextlib.ExitStack() as stack:
+            files = [stack.enter_context(open(name, 'wb')) for name in temps]
+            out = files[0]
+            gz = br = None
+            if precompress:
+                gz = stack.enter_context(gzip.GzipFile(filename='', mode='wb', fileobj=files[1], mtime=0,
+                                                       compresslevel=GZIP_LEVEL_BEST if best else GZIP_LEVEL))
+                if brotli is not None:
+                    br = brotli.Compressor(quality=BROTLI_QUALITY_BEST if best else BROTLI_QUALITY)
+
+            def flush(text):
+                data = text.encode('utf-8')
+                out.write(data)
+                if gz is not None:
+                    gz.write(data)
+                if br is not None:
+                    files[2].write(br.process(data))
+
+            block, size = [], 0
+            for piece in pieces:
+                block.append(piece)
+                size += len(piece)
+                if size >= WRITE_BLOCK:
+                    flush(''.join(block))
+                    block, size = [], 0
+            flush(''.join(block))
+            if br is not None:
+                files[2].write(br.finish())
+    except BaseException:
+        for name in temps:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(name)
+        raise
+    for temp, name in zip(temps, written):
+        os.replace(temp, name)
+    return written
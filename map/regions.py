@@ -0,0 +1,208 @@
+"""Region registry for single-pass multi-region extraction.
+
+A region is one or more polygons (lon/lat rings) with a bbox. Each polygon
+is prepared once into an edge table sorted into latitude slabs, so a point
+is only tested against the edges spanning its latitude. The registry adds
+a coarse cell grid over the region bboxes, so classify_regions tests each
+row only against the regions near it. Rows far from every region are
+dropped after a single cell lookup.
+
+Regions are loaded from GeoJSON files (Polygon / MultiPolygon geometries, a
+Feature or a FeatureCollection); the region name is the file name stem.
+"""
+
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Cell size (degrees) of the grid mapping locations to nearby regions
+REGION_CELL = 1.0
+
+
+def _expand(starts, counts):
+    """Concatenated ranges [starts[i], starts[i] + counts[i])."""
+    total = counts.sum()
+    return np.repeat(starts, counts) + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+def prepare_polygon(rings):
+    """Prepare one polygon (a list of rings) for point-in-polygon tests.
+
+    Latitude slabs run (ys[k], ys[k+1]] between consecutive distinct vertex
+    latitudes. The edges active in slab k are edges[offsets[k]:offsets[k+1]].
+    An edge is active exactly where points_in_polygon would let it toggle
+    (min y < y <= max y), and the crossing uses the same arithmetic, so
+    membership matches it point for point. Holes are just extra rings under
+    the even-odd rule.
+    """
+    p1 = []
+    p2 = []
+    for ring in rings:
+        ring = np.asarray(ring, dtype=np.float64)[:, :2]
+        p1.append(ring)
+        p2.append(np.roll(ring, -1, axis=0))
+    p1, p2 = np.concatenate(p1), np.concatenate(p2)
+    # Horizontal edges never toggle
+    sloped = p1[:, 1] != p2[:, 1]
+    p1, p2 = p1[sloped], p2[sloped]
+
+    ys = np.unique(np.concatenate([p1[:, 1], p2[:, 1]]))
+    lo = np.searchsorted(ys, np.minimum(p1[:, 1], p2[:, 1]))
+    hi = np.searchsorted(ys, np.maximum(p1[:, 1], p2[:, 1]))
+    counts = hi - lo
+    slab = _expand(lo, counts)
+    edge = np.repeat(np.arange(len(p1)), counts)
+    order = np.argsort(slab, kind='stable')
+    return {
+        'ys': ys,
+        'offsets': np.concatenate([[0], np.cumsum(np.bincount(slab, minlength=max(len(ys) - 1, 0)))]),
+        'edges': edge[order],
+        'p1': p1,
+        'p2': p2,
+    }
+
+
+def points_in_prepared(xs, ys, prepared):
+    """Membership of arrays of points in a prepared polygon."""
+    slab_ys = prepared['ys']
+    slab = np.searchsorted(slab_ys, ys, side='left') - 1
+    rows = np.flatnonzero((slab >= 0) & (slab < len(slab_ys) - 1))
+    offsets = prepared['offsets']
+    starts = offsets[slab[rows]]
+    counts = offsets[slab[rows] + 1] - starts
+    pair_row = np.repeat(rows, counts)
+    edge = prepared['edges'][_expand(starts, counts)]
+
+    x, y = xs[pair_row], ys[pair_row]
+    p1x, p1y = prepared['p1'][edge, 0], prepared['p1'][edge, 1]
+    p2x, p2y = prepared['p2'][edge, 0], prepared['p2'][edge, 1]
+    xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
+    crosses = (x <= np.maximum(p1x, p2x)) & ((p1x == p2x) | (x <= xinters))
+    return np.bincount(pair_row[crosses], minlength=len(xs)) % 2 == 1
+
+
+def make_region(name, polygons, bbox=None):
+    """Build a region from a list of polygons, each a list of (lon, lat) rings.
+
+    bbox (lon_min, lat_min, lon_max, lat_max) defaults to the polygons' extent.
+    """
+    rings = [np.asarray(ring, dtype=np.float64)[:, :2] for polygon in polygons for ring in polygon]
+    if bbox is None:
+        points = np.concatenate(rings)
+        bbox = (points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max())
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(np.asarray(bbox, dtype=np.float64).tobytes())
+    for ring in rings:
+        hasher.update(ring.tobytes())
+    return {
+        'name': name,
+        'bbox': tuple(float(v) for v in bbox),
+        'polygons': [prepare_polygon(polygon) for polygon in polygons],
+        'digest': hasher.hexdigest(),
+    }
+
+
+def region_mask(region, lons, lats):
+    """Membership of arrays of points in a region (bbox and any of its polygons)."""
+    lon_min, lat_min, lon_max, lat_max = region['bbox']
+    inside = (lats >= lat_min) & (lats <= lat_max) & (lons >= lon_min) & (lons <= lon_max)
+    candidates = np.flatnonzero(inside)
+    hit = np.zeros(len(candidates), dtype=bool)
+    for prepared in region['polygons']:
+        hit |= points_in_prepared(lons[candidates], lats[candidates], prepared)
+    inside[candidates] = hit
+    return inside
+
+
+def _geojson_polygons(geometry):
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return list(geometry['coordinates'])
+    if geometry['type'] == 'GeometryCollection':
+        return [p for g in geometry['geometries'] for p in _geojson_polygons(g)]
+    raise ValueError(f"unsupported geometry type {geometry['type']}")
+
+
+def load_region(path):
+    """Load a region from a GeoJSON file, named after the file."""
+    with open(path, 'r') as f:
+        doc = json.load(f)
+    if doc.get('type') == 'FeatureCollection':
+        geometries = [feature['geometry'] for feature in doc['features']]
+    elif doc.get('type') == 'Feature':
+        geometries = [doc['geometry']]
+    else:
+        geometries = [doc]
+    polygons = [p for geometry in geometries for p in _geojson_polygons(geometry)]
+    name = os.path.basename(path).split('.')[0].lower()
+    return make_region(name, polygons)
+
+
+def load_regions(paths):
+    """Load regions from GeoJSON files and/or directories of *.geojson / *.json files."""
+    regions = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, '*.geojson')) + glob.glob(os.path.join(path, '*.json')))
+        else:
+            files = [path]
+        regions.extend(load_region(f) for f in files)
+    return regions
+
+
+def region_registry(regions, cell=REGION_CELL):
+    """Index regions on a global cell grid; cells list the regions whose bbox touches them."""
+    nx, ny = int(np.ceil(360 / cell)), int(np.ceil(180 / cell))
+    cell_ids, region_ids = [], []
+    for r, region in enumerate(regions):
+        lon_min, lat_min, lon_max, lat_max = region['bbox']
+        ix = np.arange(_cell(lon_min + 180, cell, nx), _cell(lon_max + 180, cell, nx) + 1)
+        iy = np.arange(_cell(lat_min + 90, cell, ny), _cell(lat_max + 90, cell, ny) + 1)
+        cells = (iy[:, None] * nx + ix[None, :]).ravel()
+        cell_ids.append(cells)
+        region_ids.append(np.full(len(cells), r))
+    cell_ids = np.concatenate(cell_ids) if regions else np.empty(0, dtype=np.int64)
+    region_ids = np.concatenate(region_ids) if regions else np.empty(0, dtype=np.int64)
+    order = np.argsort(cell_ids, kind='stable')
+    return {
+        'regions': regions,
+        'cell': cell,
+        'nx': nx,
+        'ny': ny,
+        'offsets': np.concatenate([[0], np.cumsum(np.bincount(cell_ids, minlength=nx * ny))]),
+        'ids': region_ids[order],
+    }
+
+
+def _cell(offset, cell, n):
+    return np.clip(np.floor(np.asarray(offset) / cell).astype(np.int64), 0, n - 1)
+
+
+def classify_regions(lons, lats, registry):
+    """Assign points to every region in one pass.
+
+    Returns one array of member row indices (ascending) per registry region.
+    Each row costs one cell lookup plus a test per region near it.
+    """
+    cell = registry['cell']
+    cells = _cell(lats + 90, cell, registry['ny']) * registry['nx'] + _cell(lons + 180, cell, registry['nx'])
+    offsets = registry['offsets']
+    starts = offsets[cells]
+    counts = offsets[cells + 1] - starts
+    rows = np.flatnonzero(counts)
+    pair_row = np.repeat(rows, counts[rows])
+    pair_region = registry['ids'][_expand(starts[rows], counts[rows])]
+    # Group (row, region) pairs by region; the stable sort keeps rows ascending
+    order = np.argsort(pair_region, kind='stable')
+    pair_row, pair_region = pair_row[order], pair_region[order]
+    bounds = np.searchsorted(pair_region, np.arange(len(registry['regions']) + 1))
+
+    members = []
+    for r, region in enumerate(registry['regions']):
+        candidates = pair_row[bounds[r]:bounds[r + 1]]
+        members.append(candidates[region_mask(region, lons[candidates], lats[candidates])])
+    return members
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""Score a portfolio CSV against every scenario in the extracted hazard data.
+
+Reads a CSV of locations (lat and lon columns, plus an optional id column)
+in chunks of rows and writes one output row per input row: the id, lat and
+lon fields as given, then a wind speed for every ssp/model/period and
+return period, in columns named <ssp>_<model>_<period>_<rp>. All scenario
+columns are stacked into one table, so each chunk needs a single neighbour
+search (hazard_query.interpolate). Chunks are scored across a process pool
+and written in input order; at most a few chunks per worker are in flight,
+so memory stays bounded whatever the portfolio size. Locations with no
+answer, or whose lat/lon do not parse, get 'nan'. Quoted fields (an id or
+address holding commas, quotes or newlines) are parsed with the csv module
+and quoted again in the output.
+"""
+
+import argparse
+import collections
+import csv
+import io
+import itertools
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from columnar_format import RP_KEYS
+from extract_all_ssp import peak_rss_mb
+from hazard_query import DEFAULT_INPUT, METHODS, interpolate, open_hazard, rp_columns, scenario_keys, stacked_table
+
+# Portfolio rows per chunk handed to a worker
+CHUNK_ROWS = 10000
+# Chunks queued or being written per worker
+CHUNKS_IN_FLIGHT = 2
+# Rows formatted at a time, bounding the formatter's scratch arrays
+FORMAT_ROWS = 1024
+
+# Set in each process by _init_scorer: {'hazard', 'table', 'lat', 'lon', 'keep', 'method'}
+_scorer = None
+
+
+def _init_scorer(input_file, scenarios, rps, lat_col, lon_col, keep_cols, method):
+    global _scorer
+    hazard = open_hazard(input_file)
+    table = stacked_table(hazard, scenarios, rps)
+    hazard['tables'].clear()
+    _scorer = {
+        'hazard': hazard,
+        'table': table,
+        'lat': lat_col,
+        'lon': lon_col,
+        'keep': keep_cols,
+        'method': method,
+    }
+
+
+def _parse_float(field):
+    try:
+        return float(field)
+    except ValueError:
+        return np.nan
+
+
+def parse_rows(data):
+    """Split a block of complete CSV lines (bytes) into rows of byte fields.
+
+    Blocks without quotes are split on commas directly; blocks with quoted
+    fields go through the csv module.
+    """
+    if b'"' not in data:
+        return [line.split(b',') for line in data.splitlines() if line.strip()]
+    rows = csv.reader(io.StringIO(data.decode('utf-8'), newline=''))
+    return [[field.encode('utf-8') for field in row] for row in rows if row]
+
+
+def quote_field(field):
+    """A CSV field (bytes), quoted when it holds a comma, quote or newline."""
+    if any(c in field for c in b',"\r\n'):
+        return b'"' + field.replace(b'"', b'""') + b'"'
+    return field
+
+
+def score_chunk(data):
+    """Score a block of complete CSV lines (bytes); return (output bytes, rows, rows with a score)."""
+    rows = parse_rows(data)
+    width = max(_scorer['lat'], _scorer['lon']) + 1
+    lats = np.array([_parse_float(r[_scorer['lat']]) if len(r) >= width else np.nan for r in rows])
+    lons = np.array([_parse_float(r[_scorer['lon']]) if len(r) >= width else np.nan for r in rows])
+    scores = np.full((len(rows), _scorer['table'].shape[1]), np.nan)
+    valid = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons))
+    scores[valid] = interpolate(_scorer['hazard'], lats[valid], lons[valid], _scorer['table'], _scorer['method'])
+
+    text, ends = format_tenths(scores)
+    out = io.BytesIO()
+    keep = _scorer['keep']
+    start = 0
+    for fields, end in zip(rows, ends.tolist()):
+        kept = b','.join(quote_field(fields[i].strip()) if i < len(fields) else b'' for i in keep)
+        out.write(kept + b',' + text[start:end])
+        start = end
+    return out.getvalue(), len(rows), int(np.isfinite(scores).any(axis=1).sum())
+
+
+def format_tenths(values):
+    """Format an (n, k) array as n comma-separated lines of values to 0.1, NaN as 'nan'.
+
+    Values are rounded as the page does (Math.round(v * 10) / 10). Returns the
+    text of all lines and the end offset of each. Every value is laid out in
+    a fixed-width byte slot (sign, digits, '.', tenth, separator) and unused
+    bytes are dropped, so no per-value Python formatting is needed.
+    """
+    texts, ends, offset = [], [], 0
+    for start in range(0, len(values), FORMAT_ROWS):
+        text, block_ends = _format_tenths_block(values[start:start + FORMAT_ROWS])
+        texts.append(text)
+        ends.append(block_ends + offset)
+        offset += len(text)
+    return b''.join(texts), np.concatenate(ends) if ends else np.empty(0, dtype=np.int64)
+
+
+def _format_tenths_block(values):
+    n, k = values.shape
+    missing = np.isnan(values)
+    tenths = np.where(missing, 0, np.floor(values * 10 + 0.5)).astype(np.int32)
+    negative = tenths < 0
+    whole, tenth = np.divmod(np.abs(tenths), 10)
+    digits = len(str(int(whole.max()))) if whole.size else 1
+    slots = np.zeros((n, k, digits + 4), dtype=np.uint8)
+    slots[:, :, 0][negative] = ord('-')
+    for j in range(digits):
+        scale = 10 ** (digits - 1 - j)
+        digit = (whole // scale % 10 + ord('0')).astype(np.uint8)
+        if j < digits - 1:
+            digit[whole < scale] = 0
+        slots[:, :, 1 + j] = digit
+    slots[:, :, digits + 1] = ord('.')
+    slots[:, :, digits + 2] = tenth + ord('0')
+    slots[missing, digits:digits + 3] = np.frombuffer(b'nan', dtype=np.uint8)
+    slots[:, :, digits + 3] = ord(',')
+    slots[:, -1, digits + 3] = ord('\n')
+    slots = slots.reshape(n, -1)
+    used = slots != 0
+    return slots[used].tobytes(), np.cumsum(used.sum(axis=1))
+
+
+def iter_line_blocks(f, chunk_rows):
+    """Yield blocks of about chunk_rows complete CSV rows (bytes) from a binary file.
+
+    A block holding an odd number of quotes ends inside a quoted field, so
+    lines are added until the quotes balance.
+    """
+    while True:
+        block = b''.join(itertools.islice(f, chunk_rows))
+        if not block:
+            return
+        while block.count(b'"') % 2:
+            line = f.readline()
+            if not line:
+                break
+            block += line
+        yield block
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('portfolio', help='Portfolio CSV with a header row')
+    parser.add_argument('--output', default=None, help='Scores CSV (default: <portfolio>_scores.csv)')
+    parser.add_argument('--input', default=DEFAULT_INPUT, help=f'Extracted data (default: {DEFAULT_INPUT})')
+    parser.add_argument('--lat-column', default='lat', help='Latitude column name (default: lat)')
+    parser.add_argument('--lon-column', default='lon', help='Longitude column name (default: lon)')
+    parser.add_argument('--id-column', default=None,
+                        help='Column copied to the output ahead of lat/lon (default: "id" if present)')
+    parser.add_argument('--method', choices=METHODS, default='idw', help='Interpolation (default: idw)')
+    parser.add_argument('--rps', nargs='+', default=None, help='Return periods to score, e.g. 100 250 (default: all six)')
+    parser.add_argument('--ssps', nargs='+', default=None, help='SSPs to score (default: all in the data)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Scoring processes (default: CPU count; 1 scores in this process)')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+                        help=f'Portfolio rows per chunk (default: {CHUNK_ROWS})')
+    args = parser.parse_args()
+    output = args.output or os.path.splitext(args.portfolio)[0] + '_scores.csv'
+    start = time.perf_counter()
+
+    with open(args.portfolio, 'rb') as f:
+        header = [name.strip() for name in next(csv.reader([f.readline().decode('utf-8')]), [])]
+    for name in (args.lat_column, args.lon_column) + ((args.id_column,) if args.id_column else ()):
+        if name not in header:
+            parser.error(f"column {name!r} not in the portfolio header ({', '.join(header)})")
+    id_column = args.id_column or ('id' if 'id' in header else None)
+    keep = [header.index(name) for name in ([id_column] if id_column else []) + [args.lat_column, args.lon_column]]
+
+    hazard = open_hazard(args.input)
+    scenarios = [key for key in scenario_keys(hazard) if args.ssps is None or key[0] in args.ssps]
+    rps = [RP_KEYS[i] for i in rp_columns(args.rps)]
+    del hazard
+    columns = [f'{ssp}_{model}_{period}_{rp}' for ssp, model, period in scenarios for rp in rps]
+    print(f"Scoring {args.portfolio} against {len(scenarios)} scenarios x {len(rps)} return periods "
+          f"({len(columns)} columns), {args.workers} worker(s)")
+
+    init_args = (args.input, scenarios, rps, header.index(args.lat_column), header.index(args.lon_column),
+                 keep, args.method)
+    executor = None
+    if args.workers > 1:
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_scorer, initargs=init_args)
+    else:
+        _init_scorer(*init_args)
+
+    rows = scored = 0
+    with open(args.portfolio, 'rb') as f, open(output + '.tmp', 'wb') as out:
+        f.readline()
+        out.write(b','.join([quote_field(header[i].encode('utf-8')) for i in keep]
+                            + [column.encode('utf-8') for column in columns]) + b'\n')
+
+        def write(result):
+            nonlocal rows, scored
+            data, n, n_scored = result
+            out.write(data)
+            rows += n
+            scored += n_scored
+            print(f"\r  {rows:,} rows", end='', flush=True)
+
+        # Results are written in submission order; the queue bound keeps memory flat
+        pending = collections.deque()
+        for block in iter_line_blocks(f, args.chunk_rows):
+            if executor is None:
+                write(score_chunk(block))
+                continue
+            pending.append(executor.submit(score_chunk, block))
+            if len(pending) >= CHUNKS_IN_FLIGHT * args.workers:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+    if executor:
+        executor.shutdown()
+    os.replace(output + '.tmp', output)
+
+    wall = time.perf_counter() - start
+    rss = peak_rss_mb()
+    if executor:
+        rss = max(rss, peak_rss_mb(resource.RUSAGE_CHILDREN))
+    print(f"\r  {rows:,} rows, {scored:,} with scores")
+    print(f"Wrote {output} in {wall:.1f} s ({rows / wall:,.0f} rows/s, peak RSS {rss:.0f} MB per process)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""Serve the map build (index.html, shards, hazard cube arrays) over HTTP.
+
+    python serve_map.py --root . --port 8000
+
+A small asyncio HTTP/1.1 server with keep-alive, using only the standard
+library (brotli is optional, as in page_output):
+
+    compression    the .br / .gz siblings written by page_output are sent as
+                   they are when the client accepts them. Other text files
+                   (HTML, JSON, JS, CSS, SVG) of COMPRESS_MIN bytes or more are
+                   compressed on the fly, once, into an in-memory LRU cache.
+    ETags          strong: a hash of the bytes sent, cached per file size and
+                   mtime. If-None-Match answers 304.
+    Cache-Control  names with a content hash (name.<8+ hex digits>.ext) are
+                   immutable for a year; everything else is no-cache, i.e.
+                   reused after an ETag revalidation.
+    ranges         one bytes range of the uncompressed file (206, or 416 when
+                   unsatisfiable), honouring If-Range, e.g. for slices of the
+                   cube .npy arrays. Multiple ranges get the whole file.
+
+File bodies go out through loop.sendfile.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import email.utils
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import urllib.parse
+from collections import OrderedDict
+from http import HTTPStatus
+
+from page_output import brotli
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+COMPRESS_MIN = 1024
+# On-the-fly output is cached, so favour speed over the build's maximum levels
+ON_THE_FLY_GZIP_LEVEL = 6
+ON_THE_FLY_BROTLI_QUALITY = 5
+# Total bytes of on-the-fly compressed bodies kept in memory
+COMPRESS_CACHE_BYTES = 64 << 20
+# Client preference order when several encodings are accepted
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+HASHED_NAME = re.compile(r'\.[0-9a-f]{8,}\.[^./]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+HEADER_LIMIT = 64 << 10
+KEEPALIVE_TIMEOUT = 15
+HASH_BLOCK = 1 << 20
+
+
+def content_type(path):
+    kind, encoding = mimetypes.guess_type(path)
+    if encoding is not None:
+        return 'application/gzip' if encoding == 'gzip' else 'application/octet-stream'
+    if kind is None:
+        return 'application/octet-stream'
+    return kind + '; charset=utf-8' if kind.startswith('text/') or kind == 'application/json' else kind
+
+
+def is_compressible(kind):
+    return kind.startswith(COMPRESSIBLE_TYPES)
+
+
+def cache_control(path):
+    return IMMUTABLE if HASHED_NAME.search(os.path.basename(path)) else REVALIDATE
+
+
+def resolve(root, target):
+    """File path of a request target under root, a redirect target ending in '/', or None."""
+    url_path = urllib.parse.unquote(urllib.parse.urlsplit(target).path)
+    parts = [part for part in url_path.split('/') if part not in ('', '.')]
+    if '..' in parts or any('\0' in part or os.sep in part for part in parts):
+        return None
+    path = os.path.join(root, *parts)
+    if os.path.isdir(path):
+        if not url_path.endswith('/'):
+            return ('redirect', urllib.parse.quote(url_path) + '/')
+        path = os.path.join(path, 'index.html')
+    real_root = os.path.realpath(root)
+    if not os.path.realpath(path).startswith(real_root + os.sep):
+        return None
+    return path if os.path.isfile(path) else None
+
+
+def accepted_encodings(header):
+    """Encodings from ENCODINGS the Accept-Encoding header allows, in preference order."""
+    weights = {}
+    for item in header.split(','):
+        name, *params = [part.strip() for part in item.split(';')]
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                with contextlib.suppress(ValueError):
+                    q = float(param[2:])
+        if name:
+            weights[name.lower()] = q
+    wildcard = weights.get('*', 0.0)
+    return [name for name in ENCODINGS if weights.get(name, wildcard) > 0]
+
+
+def parse_range(header, size):
+    """(start, stop) of a single 'bytes=' range, or None to send the whole file.
+
+    Raises ValueError when the range cannot be satisfied. Malformed and
+    multi-range headers are ignored (None), which RFC 9110 allows.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash or not (first or last) or not (first.isdigit() or not first) or not (last.isdigit() or not last):
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError(header)
+        return max(size - int(last), 0), size
+    start = int(first)
+    stop = min(int(last) + 1, size) if last else size
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    return start, stop
+
+
+def etag_matches(header, etag):
+    """If-None-Match comparison (weak, as RFC 9110 specifies for it)."""
+    if header.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(','))
+
+
+def file_etag(site, path, stat):
+    """Strong ETag of a file's bytes, cached until its size or mtime changes."""
+    key = (stat.st_size, stat.st_mtime_ns)
+    cached = site['etags'].get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+    etag = f'"{digest.hexdigest()[:32]}"'
+    site['etags'][path] = (key, etag)
+    return etag
+
+
+async def etag_of(site, path, stat):
+    """file_etag, hashing in a worker thread only when the cached tag is stale."""
+    cached = site['etags'].get(path)
+    if cached is not None and cached[0] == (stat.st_size, stat.st_mtime_ns):
+        return cached[1]
+    return await asyncio.get_running_loop().run_in_executor(None, file_etag, site, path, stat)
+
+
+def compress(path, encoding):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if encoding == 'br':
+        return brotli.compress(data, quality=ON_THE_FLY_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=ON_THE_FLY_GZIP_LEVEL, mtime=0)
+
+
+async def compressed_body(site, path, stat, encoding):
+    """On-the-fly compressed bytes of a file, computed once per (file version, encoding)."""
+    key = (path, stat.st_size, stat.st_mtime_ns, encoding)
+    cache = site['compressed']
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    # Concurrent requests for the same body wait on one compression
+    pending = site['pending'].get(key)
+    if pending is None:
+        pending = asyncio.get_running_loop().run_in_executor(None, compress, path, encoding)
+        site['pending'][key] = pending
+        try:
+            body = await pending
+        finally:
+            del site['pending'][key]
+        cache[key] = body
+        site['compressed_bytes'] += len(body)
+        while site['compressed_bytes'] > COMPRESS_CACHE_BYTES and len(cache) > 1:
+            _, old = cache.popitem(last=False)
+            site['compressed_bytes'] -= len(old)
+        return body
+    return await asyncio.shield(pending)
+
+
+async def representation(site, path, stat, kind, headers):
+    """What to send for a file: {'encoding', 'path' or 'body', 'size', 'etag'}."""
+    compressible = is_compressible(kind)
+    # A range applies to the file's own bytes, so range requests get identity
+    if 'range' not in headers:
+        for encoding in accepted_encodings(headers.get('accept-encoding', '')):
+            sibling = path + ENCODINGS[encoding]
+            with contextlib.suppress(OSError):
+                sibling_stat = os.stat(sibling)
+                etag = await etag_of(site, sibling, sibling_stat)
+                return {'encoding': encoding, 'path': sibling, 'size': sibling_stat.st_size, 'etag': etag}
+            if not compressible or not COMPRESS_MIN <= stat.st_size <= COMPRESS_CACHE_BYTES:
+                continue
+            if encoding == 'br' and brotli is None:
+                continue
+            body = await compressed_body(site, path, stat, encoding)
+            etag = await etag_of(site, path, stat)
+            # Same compressor settings give the same bytes, so the source hash plus the coding stays strong
+            return {'encoding': encoding, 'body': body, 'size': len(body),
+                    'etag': f'{etag[:-1]}-{encoding}"'}
+    etag = await etag_of(site, path, stat)
+    return {'encoding': None, 'path': path, 'size': stat.st_size, 'etag': etag}
+
+
+def response_head(status, headers):
+    lines = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}',
+             f'Date: {email.utils.formatdate(usegmt=True)}', 'Server: serve_map']
+    lines += [f'{name}: {value}' for name, value in headers.items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def send_status(writer, status, keep_alive, headers=None):
+    body = f'{status} {HTTPStatus(status).phrase}\n'.encode()
+    headers = {'Content-Type': 'text/plain; charset=utf-8', 'Content-Length': len(body),
+               'Connection': 'keep-alive' if keep_alive else 'close', **(headers or {})}
+    writer.write(response_head(status, headers) + body)
+    await writer.drain()
+    return keep_alive
+
+
+async def respond(site, writer, method, target, headers, keep_alive):
+    """Answer one request; returns whether the connection stays open."""
+    if method not in ('GET', 'HEAD'):
+        return await send_status(writer, 405, keep_alive, {'Allow': 'GET, HEAD'})
+    path = resolve(site['root'], target)
+    if isinstance(path, tuple):
+        return await send_status(writer, 301, keep_alive, {'Location': path[1]})
+    if path is None:
+        return await send_status(writer, 404, keep_alive)
+    stat = os.stat(path)
+    kind = content_type(path)
+    rep = await representation(site, path, stat, kind, headers)
+    out = {'Content-Type': kind, 'ETag': rep['etag'], 'Cache-Control': cache_control(path),
+           'Connection': 'keep-alive' if keep_alive else 'close'}
+    if is_compressible(kind):
+        out['Vary'] = 'Accept-Encoding'
+    if rep['encoding'] is None:
+        out['Accept-Ranges'] = 'bytes'
+    else:
+        out['Content-Encoding'] = rep['encoding']
+
+    if etag_matches(headers.get('if-none-match', ''), rep['etag']):
+        # No body and no Content-Length on a 304
+        del out['Content-Type']
+        writer.write(response_head(304, out))
+        await writer.drain()
+        return keep_alive
+
+    status, start, stop = 200, 0, rep['size']
+    if rep['encoding'] is None and 'range' in headers and headers.get('if-range', rep['etag']) == rep['etag']:
+        try:
+            span = parse_range(headers['range'], rep['size'])
+        except ValueError:
+            return await send_status(writer, 416, keep_alive, {'Content-Range': f"bytes */{rep['size']}"})
+        if span is not None:
+            status, (start, stop) = 206, span
+            out['Content-Range'] = f"bytes {start}-{stop - 1}/{rep['size']}"
+    out['Content-Length'] = stop - start
+    writer.write(response_head(status, out))
+    if method == 'GET' and stop > start:
+        if 'body' in rep:
+            writer.write(rep['body'][start:stop])
+        else:
+            with open(rep['path'], 'rb') as f:
+                await asyncio.get_running_loop().sendfile(writer.transport, f, start, stop - start)
+    await writer.drain()
+    if site['log']:
+        print(f"{method} {target} {status} {rep['encoding'] or 'identity'} {stop - start}")
+    return keep_alive
+
+
+async def handle_connection(site, reader, writer):
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+            except asyncio.LimitOverrunError:
+                await send_status(writer, 431, False)
+                break
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                break
+            request_line, *lines = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+            headers = {}
+            for line in lines:
+                name, colon, value = line.partition(':')
+                if colon:
+                    headers[name.strip().lower()] = value.strip()
+            parts = request_line.split()
+            if len(parts) != 3 or not parts[2].startswith('HTTP/1.'):
+                await send_status(writer, 400, False)
+                break
+            method, target, version = parts
+            connection = headers.get('connection', '').lower()
+            keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+            # Only GET and HEAD are served, so request bodies are refused rather than read
+            if headers.get('content-length', '0') != '0' or 'transfer-encoding' in headers:
+                await send_status(writer, 400, False)
+                break
+            if not await respond(site, writer, method, target, headers, keep_alive):
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+        with contextlib.suppress(ConnectionError):
+            await writer.wait_closed()
+
+
+async def serve(root, host, port, log=False):
+    site = {'root': root, 'log': log, 'etags': {}, 'compressed': OrderedDict(), 'compressed_bytes': 0,
+            'pending': {}}
+    server = await asyncio.start_server(lambda r, w: handle_connection(site, r, w), host, port,
+                                        limit=HEADER_LIMIT)
+    print(f"Serving {os.path.abspath(root)} at http://{host}:{port}/ "
+          f"(brotli {'available' if brotli is not None else 'not installed: gzip only'})")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root', default='.', help='Build directory holding index.html (default: .)')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to bind (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='Port (default: 8000)')
+    parser.add_argument('--log', action='store_true', help='Print one line per request')
+    args = parser.parse_args()
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(serve(args.root, args.host, args.port, args.log))
+
+
+if __name__ == '__main__':
+    main()
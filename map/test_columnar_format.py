@@ -0,0 +1,32 @@
+"""Columnar encoding round trips on synthetic extracted data."""
+
+import numpy as np
+import pytest
+
+from columnar_format import RP_KEYS, decode_columnar, encode_columnar
+
+
+def synthetic_all_data(seed=2):
+    """all_data with a shared grid, a scenario on a subset of it and an empty one."""
+    rng = np.random.default_rng(seed)
+    lats = np.round(rng.uniform(24.5, 31, 300), 2)
+    lons = np.round(rng.uniform(-87.5, -80, 300), 2)
+
+    def points(ids):
+        values = np.round(np.sort(rng.uniform(15, 90, (len(ids), len(RP_KEYS))), axis=1), 1)
+        return [dict(lat=float(lats[i]), lon=float(lons[i]), **dict(zip(RP_KEYS, row.tolist())))
+                for i, row in zip(ids, values)]
+
+    subset = rng.permutation(300)[:120]
+    return {
+        'ssp245': {'CESM2': {'base': points(range(300)), 'fut1': points(subset)}},
+        'ssp585': {'CESM2': {'base': points(range(300)), 'fut1': []}},
+    }
+
+
+@pytest.mark.parametrize('encoding', ['int16', 'float32'])
+def test_columnar_round_trip(encoding):
+    all_data = synthetic_all_data()
+    doc = encode_columnar(all_data, encoding)
+    assert 'index' in doc['data']['ssp245']['CESM2']['fut1']
+    assert decode_columnar(doc) == all_data
@@ -0,0 +1,198 @@
+"""Checks of the extraction readers, ensemble statistics and caches on small synthetic data."""
+
+import os
+import statistics
+
+import numpy as np
+import pytest
+
+from extract_all_ssp import (ENSEMBLE_STATS, FLORIDA_POLYGON, KEYS_POLYGON, LAT_MAX, LAT_MIN, LON_MAX, LON_MIN,
+                             RP_KEYS, cached_file_points, ensemble_cache_key, ensemble_statistics, extract_file,
+                             extract_model_data, file_digest, florida_land_mask, florida_region, is_florida_land,
+                             load_grid_index, load_manifest, read_region_arrays, read_regions_arrays,
+                             region_points, save_grid_index, save_manifest, store_file_points)
+from regions import region_registry
+
+CSV_HEADER = 'lon,lat,rp_10,rp_25,rp_50,rp_100,rp_250,rp_1000\n'
+
+
+def florida_points(n=20000, seed=0):
+    """Random points around the Florida bbox plus every polygon vertex and edge midpoint."""
+    rng = np.random.default_rng(seed)
+    lons = rng.uniform(LON_MIN - 1, LON_MAX + 1, n)
+    lats = rng.uniform(LAT_MIN - 1, LAT_MAX + 1, n)
+    # On a 0.1 degree lattice many points share vertex latitudes and longitudes
+    lons[:n // 4] = np.round(lons[:n // 4], 1)
+    lats[:n // 4] = np.round(lats[:n // 4], 1)
+    vertices = np.array(FLORIDA_POLYGON + KEYS_POLYGON)
+    midpoints = (vertices[:-1] + vertices[1:]) / 2
+    extra = np.concatenate([vertices, midpoints])
+    return np.concatenate([lons, extra[:, 0]]), np.concatenate([lats, extra[:, 1]])
+
+
+def test_florida_land_mask_matches_scalar():
+    lons, lats = florida_points()
+    expected = np.array([is_florida_land(lon, lat) for lon, lat in zip(lons, lats)])
+    assert expected.any()
+    np.testing.assert_array_equal(florida_land_mask(lons, lats), expected)
+
+
+def synthetic_rows(seed=0, step=0.1):
+    """lon, lat and six increasing values on a grid around Florida and beyond its bbox."""
+    rng = np.random.default_rng(seed)
+    lons, lats = np.meshgrid(np.arange(-90, -78, step), np.arange(22, 33, step))
+    lons, lats = lons.ravel(), lats.ravel()
+    values = np.sort(rng.uniform(15, 90, (len(lons), 6)), axis=1)
+    return np.column_stack([lons, lats, values])
+
+
+def write_csv(path, rows, extra_lines=()):
+    """Write rows in the CHAZ layout; extra_lines (index, text) are inserted as is."""
+    lines = [','.join([f'{row[0]:.6f}', f'{row[1]:.6f}'] + [f'{v:.4f}' for v in row[2:]]) for row in rows]
+    for index, text in sorted(extra_lines, reverse=True):
+        lines.insert(index, text)
+    with open(path, 'w') as f:
+        f.write(CSV_HEADER + '\n'.join(lines) + '\n')
+    return str(path)
+
+
+@pytest.mark.parametrize('chunk_size', [1 << 10, 1 << 24])
+def test_chunked_reader_matches_line_reader(tmp_path, chunk_size):
+    path = write_csv(tmp_path / 'a.csv', synthetic_rows())
+    expected = extract_model_data(path, reader='lines')
+    lons, lats, values, stats = read_region_arrays(path, chunk_size=chunk_size)
+    assert len(expected) > 100
+    assert region_points(lons, lats, values) == expected
+    assert stats['rows'] == len(synthetic_rows())
+    arrays, _ = read_regions_arrays(path, region_registry([florida_region()]), chunk_size=chunk_size)
+    assert region_points(*arrays['florida']) == expected
+
+
+def test_chunked_reader_matches_line_reader_on_ragged_rows(tmp_path):
+    rows = synthetic_rows(seed=1)
+    florida = np.flatnonzero((np.abs(rows[:, 0] + 81.5) < 0.05) & (np.abs(rows[:, 1] - 28) < 0.05))[0]
+    # A short row (dropped by both readers) and a row with an extra column
+    # (its first eight fields kept), inside Florida
+    extra = [(10, '-85.000000,28.000000,1.0,2.0'),
+             (int(florida), '-81.450000,28.050000,30.0,31.0,32.0,33.0,34.0,35.0,99.0')]
+    path = write_csv(tmp_path / 'a.csv', rows, extra)
+    expected = extract_model_data(path, reader='lines')
+    assert {'lat': 28.05, 'lon': -81.45, 'rp10': 30.0, 'rp25': 31.0, 'rp50': 32.0, 'rp100': 33.0,
+            'rp250': 34.0, 'rp1000': 35.0} in expected
+    for chunk_size in (1 << 10, 1 << 24):
+        lons, lats, values, _ = read_region_arrays(path, chunk_size=chunk_size)
+        assert region_points(lons, lats, values) == expected
+
+
+def test_grid_index_hit_and_miss(tmp_path):
+    rows = synthetic_rows()
+    path = write_csv(tmp_path / 'a.csv', rows)
+    *_, stats = read_region_arrays(path, chunk_size=1 << 12)
+    assert stats['grid_index'] == 'built'
+    save_grid_index(str(tmp_path / 'index.npz'), stats['membership'])
+    grid_index = load_grid_index(str(tmp_path / 'index.npz'))
+
+    # Same grid, other values: the cached rows are parsed, nothing else
+    other = rows.copy()
+    other[:, 2:] += 1.5
+    path = write_csv(tmp_path / 'b.csv', other)
+    lons, lats, values, stats = read_region_arrays(path, chunk_size=1 << 12, grid_index=grid_index)
+    assert stats['grid_index'] == 'hit'
+    assert 'membership' not in stats
+    assert region_points(lons, lats, values) == extract_model_data(path, reader='lines')
+
+    # A different grid (one row fewer, or member coordinates moved) is rebuilt
+    shifted = rows.copy()
+    shifted[:, 1] += 0.05
+    for changed in (rows[1:], shifted):
+        path = write_csv(tmp_path / 'c.csv', changed)
+        lons, lats, values, stats = read_region_arrays(path, chunk_size=1 << 12, grid_index=grid_index)
+        assert stats['grid_index'] == 'built'
+        assert 'membership' in stats
+        assert region_points(lons, lats, values) == extract_model_data(path, reader='lines')
+
+
+def test_grid_index_without_coordinates_is_ignored(tmp_path):
+    path = str(tmp_path / 'index.npz')
+    np.savez(path, fingerprint='0' * 32, rows=10, indices=np.arange(3))
+    assert load_grid_index(path) is None
+
+
+def model_point_lists(seed=3, n=200):
+    """Per-model point lists over one grid: each drops some points and is shuffled; one is empty."""
+    rng = np.random.default_rng(seed)
+    lats = np.round(rng.uniform(24.5, 31, n), 2)
+    lons = np.round(rng.uniform(-87.5, -80, n), 2)
+    lists = []
+    for keep in (1.0, 0.9, 0.7, 0.0, 0.5):
+        ids = rng.permutation(n)[:int(n * keep)]
+        lists.append([dict(lat=float(lats[i]), lon=float(lons[i]),
+                           **dict(zip(RP_KEYS, np.sort(rng.uniform(15, 90, len(RP_KEYS))).tolist())))
+                      for i in ids])
+    return lists
+
+
+def test_ensemble_statistics_join_on_coordinates():
+    model_points = model_point_lists()
+    # Per coordinate, the values of the models that have it, in first-seen order
+    joined = {}
+    for points in model_points:
+        for p in points:
+            joined.setdefault((p['lat'], p['lon']), []).append([p[rp] for rp in RP_KEYS])
+    reducers = {
+        'MultiModelMean': statistics.fmean, 'MultiModelMedian': statistics.median,
+        'MultiModelMin': min, 'MultiModelMax': max, 'MultiModelStd': statistics.pstdev,
+        'MultiModelSpread': lambda v: max(v) - min(v),
+    }
+    results = ensemble_statistics(model_points)
+    assert list(results) == ENSEMBLE_STATS
+    assert min(len(rows) for rows in joined.values()) < 3
+    for name, reduce in reducers.items():
+        expected = [dict(lat=lat, lon=lon, **{rp: round(reduce([row[k] for row in rows]), 1)
+                                              for k, rp in enumerate(RP_KEYS)})
+                    for (lat, lon), rows in joined.items()]
+        assert results[name] == expected, name
+
+
+def test_ensemble_statistics_of_no_models():
+    assert ensemble_statistics([[], []]) == {name: [] for name in ENSEMBLE_STATS}
+
+
+def test_file_cache_invalidation(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    os.makedirs(cache_dir)
+    rows = synthetic_rows(step=0.2)
+    path = write_csv(tmp_path / 'a.csv', rows)
+    regions = {'florida': florida_region()['digest']}
+    found, stats = extract_file(path, digest=True)
+    assert stats['digest'] == file_digest(path)
+    manifest = load_manifest(cache_dir)
+    store_file_points(manifest, cache_dir, path, found, stats['digest'], stats['stat'], regions)
+    save_manifest(cache_dir, manifest)
+
+    manifest = load_manifest(cache_dir)
+    assert cached_file_points(manifest, cache_dir, path, regions) == found
+    assert cached_file_points(manifest, cache_dir, path, {'other': 'x'}) is None
+    key = ensemble_cache_key(manifest, [path, str(tmp_path / 'missing.csv')], regions['florida'])
+
+    # Touched but unchanged: still a hit, and the new mtime is recorded
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert cached_file_points(manifest, cache_dir, path, regions) == found
+    assert manifest['files'][path]['mtime_ns'] == st.st_mtime_ns + 10 ** 9
+
+    # Same size, other values; then a different size
+    changed = rows.copy()
+    changed[:, 2:] = np.round(changed[:, 2:] + 1.0, 4)
+    for new_rows in (changed, rows[:-1]):
+        size = os.path.getsize(path)
+        write_csv(tmp_path / 'a.csv', new_rows)
+        assert (os.path.getsize(path) == size) == (new_rows is changed)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 2 * 10 ** 9))
+        assert cached_file_points(manifest, cache_dir, path, regions) is None
+
+    # Re-extracting updates the digest, which changes the ensemble key
+    found, stats = extract_file(path, digest=True)
+    store_file_points(manifest, cache_dir, path, found, stats['digest'], stats['stat'], regions)
+    assert cached_file_points(manifest, cache_dir, path, regions) == found
+    assert ensemble_cache_key(manifest, [path, str(tmp_path / 'missing.csv')], regions['florida']) != key
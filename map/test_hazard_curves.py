@@ -0,0 +1,39 @@
+"""Fitted hazard curves: wind_at and return_period_of invert each other."""
+
+import numpy as np
+import pytest
+
+from hazard_curves import CURVE_METHODS, RP_YEARS, fit_curves, return_period_of, wind_at
+
+
+def synthetic_curves(n=200, seed=4):
+    """Increasing rp10..rp1000 winds: a Gumbel-like rise plus noise."""
+    rng = np.random.default_rng(seed)
+    loc = rng.uniform(20, 40, (n, 1))
+    scale = rng.uniform(3, 8, (n, 1))
+    variate = -np.log(-np.log1p(-1 / RP_YEARS))
+    values = loc + scale * variate + np.cumsum(rng.uniform(0, 1, (n, len(RP_YEARS))), axis=1)
+    return np.round(values, 1)
+
+
+def single(curves, i):
+    return {key: value if isinstance(value, str) else value[i] for key, value in curves.items()}
+
+
+@pytest.mark.parametrize('method', CURVE_METHODS)
+def test_return_period_of_inverts_wind_at(method):
+    curves = fit_curves(synthetic_curves(), method)
+    years = np.array([10, 37, 100, 200, 500, 1000])
+    winds = wind_at(curves, years)
+    for i in range(len(winds)):
+        np.testing.assert_allclose(return_period_of(single(curves, i), winds[i]), years, rtol=1e-6)
+
+
+@pytest.mark.parametrize('method', CURVE_METHODS)
+def test_wind_at_inverts_return_period_of(method):
+    values = synthetic_curves()
+    curves = fit_curves(values, method)
+    for i in range(len(values)):
+        curve = single(curves, i)
+        winds = np.linspace(*wind_at(curve, [20, 800]), 5)
+        np.testing.assert_allclose(wind_at(curve, return_period_of(curve, winds)), winds, rtol=1e-9)
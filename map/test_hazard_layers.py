@@ -0,0 +1,56 @@
+"""Build-time layer grids against the page's per-cell loops, on synthetic points."""
+
+import math
+
+import numpy as np
+
+from hazard_layers import IDW_EXACT_DIST, IDW_MAX_DIST, IDW_POWER, grid_geometry, idw_grid
+
+
+def brute_force_idw(lats, lons, values, nx, ny):
+    """The page's idwGrid() loop over every point for every cell."""
+    g = grid_geometry(lats, lons, nx, ny)
+    raw = np.zeros((ny, nx))
+    valid = np.zeros((ny, nx), dtype=bool)
+    for iy in range(ny):
+        lat = g['lat_min'] + iy * g['dy']
+        for ix in range(nx):
+            lon = g['lon_min'] + ix * g['dx']
+            weight_sum = value_sum = 0.0
+            near_count = 0
+            for i in range(len(lats)):
+                dist = math.sqrt((lat - lats[i]) ** 2 + (lon - lons[i]) ** 2)
+                if dist < IDW_MAX_DIST:
+                    near_count += 1
+                    if dist < IDW_EXACT_DIST:
+                        weight_sum, value_sum = 1, values[i]
+                        break
+                    weight = 1 / dist ** IDW_POWER
+                    weight_sum += weight
+                    value_sum += weight * values[i]
+            if near_count >= 2 and weight_sum > 0:
+                raw[iy, ix] = value_sum / weight_sum
+                valid[iy, ix] = True
+    return raw, valid
+
+
+def test_idw_grid_matches_brute_force():
+    rng = np.random.default_rng(3)
+    nx = ny = 24
+    lats = rng.uniform(27, 28, 80)
+    lons = rng.uniform(-82, -81, 80)
+    # Points within IDW_EXACT_DIST of grid nodes take the page's early exit;
+    # sparse and shuffled, so the points counted before it decide validity
+    g = grid_geometry(lats, lons, nx, ny)
+    nodes = rng.integers(2, nx - 2, (40, 2))
+    lons = np.concatenate([lons, g['lon_min'] + nodes[:, 0] * g['dx'] + 2e-4])
+    lats = np.concatenate([lats, g['lat_min'] + nodes[:, 1] * g['dy'] - 3e-4])
+    order = rng.permutation(len(lats))
+    lats, lons = lats[order], lons[order]
+    values = rng.uniform(20, 80, len(lats))
+
+    geometry, raw, valid = idw_grid(lats, lons, values, nx, ny)
+    expected_raw, expected_valid = brute_force_idw(lats, lons, values, nx, ny)
+    assert geometry == g
+    np.testing.assert_array_equal(valid, expected_valid)
+    np.testing.assert_allclose(raw, expected_raw, rtol=1e-12)
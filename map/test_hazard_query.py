@@ -0,0 +1,78 @@
+"""hazard_query.lookup against the page's per-location loops, on synthetic data."""
+
+import math
+
+import numpy as np
+import pytest
+
+from columnar_format import RP_KEYS, write_columnar
+from hazard_layers import IDW_EXACT_DIST, IDW_MAX_DIST, IDW_POWER
+from hazard_query import NEAREST_MAX_DIST2, lookup, open_hazard
+
+
+def page_idw(lat, lon, points, k):
+    """idwGrid()'s loop for one location, points in page order."""
+    weight_sum = value_sum = 0.0
+    near_count = 0
+    for p_lat, p_lon, row in points:
+        dist = math.sqrt((lat - p_lat) ** 2 + (lon - p_lon) ** 2)
+        if dist < IDW_MAX_DIST:
+            near_count += 1
+            if dist < IDW_EXACT_DIST:
+                weight_sum, value_sum = 1, row[k]
+                break
+            weight = 1 / dist ** IDW_POWER
+            weight_sum += weight
+            value_sum += weight * row[k]
+    return value_sum / weight_sum if near_count >= 2 and weight_sum > 0 else math.nan
+
+
+def page_nearest(lat, lon, points, k):
+    """findNearestPoint()'s loop for one location."""
+    nearest, min_dist = None, math.inf
+    for p_lat, p_lon, row in points:
+        dist = (lat - p_lat) ** 2 + (lon - p_lon) ** 2
+        if dist < min_dist:
+            min_dist, nearest = dist, row
+    return nearest[k] if min_dist < NEAREST_MAX_DIST2 else math.nan
+
+
+@pytest.fixture(scope='module')
+def scenario(tmp_path_factory):
+    """A grid of points plus isolated points and pairs, written as a columnar file."""
+    rng = np.random.default_rng(5)
+    lons, lats = np.meshgrid(np.arange(-82, -81, 0.08), np.arange(27, 28, 0.08))
+    lats = np.concatenate([lats.ravel(), [29.0, 29.5, 29.55, 30.0, 30.04, 30.09]])
+    lons = np.concatenate([lons.ravel(), [-84.0, -84.0, -84.0, -83.0, -83.0, -83.0]])
+    points = []
+    for lat, lon in zip(np.round(lats, 2), np.round(lons, 2)):
+        values = np.round(np.sort(rng.uniform(15, 90, len(RP_KEYS))), 1)
+        points.append(dict(lat=float(lat), lon=float(lon), **dict(zip(RP_KEYS, values.tolist()))))
+    path = str(tmp_path_factory.mktemp('hazard') / 'data.col.json')
+    write_columnar(path, {'ssp585': {'CESM2': {'base': points}}})
+    page_points = [(p['lat'], p['lon'], [p[rp] for rp in RP_KEYS]) for p in points]
+    return open_hazard(path), page_points
+
+
+@pytest.mark.parametrize('method, port', [('idw', page_idw), ('nearest', page_nearest)])
+def test_lookup_matches_page(scenario, method, port):
+    hazard, points = scenario
+    rng = np.random.default_rng(6)
+    lats = rng.uniform(26.8, 30.3, 400)
+    lons = rng.uniform(-84.3, -80.8, 400)
+    # On every point (exact hits, isolated ones included) and just off them
+    on = np.array([(lat, lon) for lat, lon, _ in points])
+    lats = np.concatenate([lats, on[:, 0], on[:, 0] + 0.0004, on[:, 0] + 0.05])
+    lons = np.concatenate([lons, on[:, 1], on[:, 1] - 0.0003, on[:, 1]])
+    got = lookup(lats, lons, 'ssp585', 'CESM2', 'base', method=method, hazard=hazard)
+    want = np.array([[port(lat, lon, points, k) for k in range(len(RP_KEYS))]
+                     for lat, lon in zip(lats.tolist(), lons.tolist())])
+    np.testing.assert_allclose(got, want, rtol=1e-12, equal_nan=True)
+
+
+def test_isolated_exact_hit_has_no_idw_answer(scenario):
+    hazard, _ = scenario
+    # A lone point, and the second of a pair 0.05 degrees apart
+    got = lookup([29.0, 29.55], [-84.0, -84.0], 'ssp585', 'CESM2', 'base', rps=[100], hazard=hazard)
+    assert np.isnan(got[0, 0])
+    assert np.isfinite(got[1, 0])
@@ -0,0 +1,49 @@
+"""Streamed page output against json.dumps and gzip."""
+
+import gzip
+import json
+
+import pytest
+
+from page_output import iter_json, write_streamed
+
+DOC = {'a': [1, 2.5, None], 'b': {'c': 'x"y', 'd': {}, 3: True}, 'e': 'é'}
+
+
+def test_iter_json_matches_json_dumps():
+    assert ''.join(iter_json(DOC)) == json.dumps(DOC, separators=(',', ':'))
+
+
+def test_iter_json_calls_callables_when_reached():
+    calls = []
+
+    def entry(name):
+        calls.append(name)
+        return {'name': name, 'values': [1, 2]}
+
+    pieces = iter_json({'first': lambda: entry('first'), 'second': lambda: entry('second')})
+    assert next(pieces) == '{' and calls == []
+    text = ''.join(pieces)
+    assert calls == ['first', 'second']
+    assert json.loads('{' + text) == {'first': entry('first'), 'second': entry('second')}
+
+
+def test_write_streamed_siblings_and_failed_write(tmp_path):
+    path = str(tmp_path / 'page.json')
+    written = write_streamed(path, iter_json(DOC))
+    assert written[:2] == [path, path + '.gz']
+    with open(path, 'rb') as f:
+        text = f.read()
+    with gzip.open(path + '.gz', 'rb') as f:
+        assert f.read() == text
+    assert json.loads(text) == json.loads(json.dumps(DOC))
+
+    def failing():
+        yield '{"partial":'
+        raise RuntimeError('build failed')
+
+    with pytest.raises(RuntimeError):
+        write_streamed(path, failing())
+    with open(path, 'rb') as f:
+        assert f.read() == text
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(name.rsplit('/', 1)[-1] for name in written)
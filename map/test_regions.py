@@ -0,0 +1,53 @@
+"""Region masks and the one-pass registry, on synthetic points."""
+
+import json
+
+import numpy as np
+
+from extract_all_ssp import LAT_MAX, LAT_MIN, LON_MAX, LON_MIN, florida_land_mask, florida_region
+from regions import classify_regions, load_region, make_region, region_mask, region_registry
+from test_extract_all_ssp import florida_points
+
+
+def test_florida_region_matches_land_mask():
+    lons, lats = florida_points(seed=1)
+    in_bbox = (lats >= LAT_MIN) & (lats <= LAT_MAX) & (lons >= LON_MIN) & (lons <= LON_MAX)
+    expected = in_bbox & florida_land_mask(lons, lats)
+    np.testing.assert_array_equal(region_mask(florida_region(), lons, lats), expected)
+
+
+def square(lon, lat, size):
+    return [[lon, lat], [lon + size, lat], [lon + size, lat + size], [lon, lat + size], [lon, lat]]
+
+
+def test_geojson_square_with_hole(tmp_path):
+    path = tmp_path / 'Ring.geojson'
+    geometry = {'type': 'Polygon', 'coordinates': [square(-80, 20, 4), square(-79, 21, 2)]}
+    path.write_text(json.dumps({'type': 'Feature', 'properties': {}, 'geometry': geometry}))
+    region = load_region(str(path))
+    assert region['name'] == 'ring'
+    assert region['bbox'] == (-80.0, 20.0, -76.0, 24.0)
+
+    rng = np.random.default_rng(7)
+    lons, lats = rng.uniform(-81, -75, 5000), rng.uniform(19, 25, 5000)
+    outer = (lons > -80) & (lons < -76) & (lats > 20) & (lats < 24)
+    hole = (lons > -79) & (lons < -77) & (lats > 21) & (lats < 23)
+    np.testing.assert_array_equal(region_mask(region, lons, lats), outer & ~hole)
+
+
+def test_classify_regions_matches_region_mask():
+    regions = [
+        florida_region(),
+        # Overlaps Florida and spans several registry cells
+        make_region('box', [[square(-83.5, 26.5, 3)]]),
+        # Two parts, one at the western edge of the registry grid
+        make_region('parts', [[square(-179.9, -10, 2)], [square(-81.2, 25.2, 0.5)]]),
+    ]
+    rng = np.random.default_rng(8)
+    lons = np.concatenate([rng.uniform(-88, -78, 20000), rng.uniform(-180, -176, 2000)])
+    lats = np.concatenate([rng.uniform(23, 32, 20000), rng.uniform(-12, -6, 2000)])
+    members = classify_regions(lons, lats, region_registry(regions))
+    for region, rows in zip(regions, members):
+        expected = np.flatnonzero(region_mask(region, lons, lats))
+        assert len(expected) > 0
+        np.testing.assert_array_equal(rows, expected)
@@ -0,0 +1,99 @@
+"""Portfolio scoring: CSV quoting, value formatting and an end-to-end run on synthetic data."""
+
+import csv
+import io
+import math
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from columnar_format import RP_KEYS, write_columnar
+from hazard_query import lookup, open_hazard
+from score_portfolio import FORMAT_ROWS, format_tenths, iter_line_blocks, parse_rows, quote_field
+
+FIELDS = [b'plain', b'a,b', b'say "hi"', b'two\nlines', b'"', b'', b'caf\xc3\xa9, ltd']
+
+
+def page_tenths(v):
+    """Math.round(v * 10) / 10 written with one decimal, NaN as 'nan'."""
+    if math.isnan(v):
+        return 'nan'
+    t = math.floor(v * 10 + 0.5)
+    return f"{'-' if t < 0 else ''}{abs(t) // 10}.{abs(t) % 10}"
+
+
+def test_format_tenths_matches_page_rounding():
+    rng = np.random.default_rng(9)
+    values = rng.uniform(-50, 150, (FORMAT_ROWS + 300, 5))
+    values[:40] = np.array([0.05, 0.15, -0.05, -0.04, 2.25])
+    values[50, 1] = 12345.67
+    values[rng.random(values.shape) < 0.1] = np.nan
+    text, ends = format_tenths(values)
+    lines = text.decode('ascii').split('\n')
+    assert lines[-1] == '' and len(lines) == len(values) + 1
+    assert ends.tolist() == np.cumsum([len(line) + 1 for line in lines[:-1]]).tolist()
+    assert lines[:-1] == [','.join(page_tenths(v) for v in row) for row in values.tolist()]
+
+
+def test_quoted_fields_round_trip():
+    line = b','.join(quote_field(field) for field in FIELDS)
+    assert parse_rows(line + b'\r\n' + line + b'\n') == [FIELDS, FIELDS]
+    assert next(csv.reader(io.StringIO(line.decode('utf-8'), newline=''))) == [f.decode('utf-8') for f in FIELDS]
+    # Fields that need no quotes are written as is and take the split fast path
+    assert quote_field(b'12.5') == b'12.5'
+    assert parse_rows(b'1,2,3\n\n4,5,6\n') == [[b'1', b'2', b'3'], [b'4', b'5', b'6']]
+
+
+def test_line_blocks_keep_quoted_newlines_together():
+    rows = [[b'id%d' % i, b'27.5', b'-81.5'] for i in range(20)]
+    rows[4][0] = b'multi\nline\nid'
+    rows[9][0] = b'x,"y"\nz'
+    data = b''.join(b','.join(quote_field(f) for f in row) + b'\n' for row in rows)
+    for chunk_rows in (1, 2, 3, 100):
+        blocks = list(iter_line_blocks(io.BytesIO(data), chunk_rows))
+        assert b''.join(blocks) == data
+        assert [row for block in blocks for row in parse_rows(block)] == rows
+
+
+def test_score_portfolio_end_to_end(tmp_path):
+    rng = np.random.default_rng(10)
+    lons, lats = np.meshgrid(np.arange(-82, -81, 0.05), np.arange(27, 28, 0.05))
+    points = [dict(lat=round(float(lat), 2), lon=round(float(lon), 2),
+                   **dict(zip(RP_KEYS, np.round(np.sort(rng.uniform(15, 90, len(RP_KEYS))), 1).tolist())))
+              for lat, lon in zip(lats.ravel(), lons.ravel())]
+    data_file = str(tmp_path / 'data.col.json')
+    write_columnar(data_file, {'ssp245': {'CESM2': {'base': points, 'fut1': points[::2]}},
+                               'ssp585': {'CESM2': {'base': points[1::2], 'fut1': []}}})
+
+    ids = ['a', 'b,c', 'd "e"', 'f\ng', 'h']
+    locations = [(27.31, -81.52), (27.5, -81.5), (27.62, -81.21), (40.0, -81.5), (27.44, -81.77)]
+    portfolio = tmp_path / 'portfolio.csv'
+    with open(portfolio, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['name', 'lat', 'lon', 'id'])
+        for i, (id_, (lat, lon)) in enumerate(zip(ids, locations)):
+            writer.writerow([f'site {i}', lat, lon, id_])
+        writer.writerow(['bad', 'north', '-81.5', 'z'])
+
+    output = str(tmp_path / 'scores.csv')
+    subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'score_portfolio.py'),
+                    str(portfolio), '--input', data_file, '--output', output, '--workers', '1',
+                    '--chunk-rows', '2', '--rps', '100', '250'], check=True, stdout=subprocess.DEVNULL)
+    with open(output, newline='') as f:
+        header, *rows = list(csv.reader(f))
+
+    hazard = open_hazard(data_file)
+    scenarios = [('ssp245', 'CESM2', 'base'), ('ssp245', 'CESM2', 'fut1'), ('ssp585', 'CESM2', 'base'),
+                 ('ssp585', 'CESM2', 'fut1')]
+    assert header == ['id', 'lat', 'lon'] + [f'{ssp}_{model}_{period}_{rp}' for ssp, model, period in scenarios
+                                             for rp in ('rp100', 'rp250')]
+    assert [row[0] for row in rows] == ids + ['z']
+    assert rows[-1][1:] == ['north', '-81.5'] + ['nan'] * 8
+    lats, lons = np.array(locations).T
+    expected = np.hstack([lookup(lats, lons, *scenario, rps=[100, 250], hazard=hazard) for scenario in scenarios])
+    assert np.isfinite(expected[0]).sum() > 2 and np.isnan(expected[3]).all()
+    for row, want, (lat, lon) in zip(rows, expected.tolist(), locations):
+        assert row[1:3] == [str(lat), str(lon)]
+        assert row[3:] == [page_tenths(v) for v in want]